@@ -0,0 +1,290 @@
+"""Benchmark a client against a fake Mumble server and a generated clip directory.
+
+Reports the throughput and p50/p99 latency of chat clip playback, search, list, join storms and
+reloads, and saves the results as JSON to compare later runs against.
+
+Run from the project directory with: python -m benchmarks.bench_client [--clips N] [--compare BASELINE]
+"""
+import argparse
+import json
+from os import link, makedirs
+from os.path import join
+from random import choice, seed
+from shutil import copyfile, which
+import subprocess as sp
+from tempfile import TemporaryDirectory
+from time import monotonic, sleep
+from unittest.mock import patch
+
+from chumbot.backend import client as client_module
+from chumbot.backend import constants
+from chumbot.backend.event_loop import EventLoop
+from chumbot.backend.text_sender import pack_lines
+from chumbot.config import CONFIG
+from tests.fake_mumble import MAX_MESSAGE_LENGTH, FakeMumble
+
+# pylint: disable=protected-access
+
+MIN_CLIPS = 10
+MAX_CLIPS = 100000
+WORDS = ('horn', 'bell', 'beep', 'laugh', 'drum', 'whistle', 'cheer', 'boo')
+TONE_FREQUENCIES = (220, 330, 440, 550, 660, 770, 880, 990)
+TONE_DURATION = 0.2
+SEARCH_QUERIES = ('horn', 'bell_00', 'laugh_0', '0001')
+JOIN_STORM_USERS = 50
+TIMEOUT = 10.0
+POLL_INTERVAL = 0.001
+
+_CONFIG_TEMPLATE = """[clips]
+ClipDir = {clip_directory}
+LinkPostedClipName = {event_clip}
+UserJoinedClipName = {event_clip}
+UserLeftClipName = {event_clip}
+
+[messages]
+QueueSize = 100000
+SendRate = 100000
+SendBurst = 100000
+
+[playback]
+MaxQueuedClips = 100000
+MaxQueuedSeconds = 100000
+ClipsPerMinute = 1000000
+Burst = 1000
+"""
+
+
+def _generate_tones(directory):
+    """Generate an mp3 sine tone of each frequency, returning their paths."""
+    paths = []
+    for frequency in TONE_FREQUENCIES:
+        path = join(directory, 'tone_{}.mp3'.format(frequency))
+        sp.run(['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i',
+                'sine=frequency={}:duration={}'.format(frequency, TONE_DURATION), path], check=True)
+        paths.append(path)
+    return paths
+
+
+def _generate_clips(directory, tones, count):
+    """Fill a clip directory with a number of clips, each a link to or copy of a generated tone.
+
+    :return: the extensionless names of the clips
+    """
+    makedirs(directory)
+    names = []
+    for i in range(count):
+        name = '{}_{:06d}'.format(WORDS[i % len(WORDS)], i)
+        path = join(directory, name + constants.SOUND_FILE_EXTENSION)
+        try:
+            link(tones[i % len(tones)], path)
+        except OSError:
+            copyfile(tones[i % len(tones)], path)
+        names.append(name)
+    return names
+
+
+def _wait_until(condition, timeout=TIMEOUT):
+    """Wait until a condition is true, returning whether it became true before the timeout."""
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() > deadline:
+            return False
+        sleep(POLL_INTERVAL)
+    return True
+
+
+def _percentile(values, fraction):
+    """Return the nearest-rank percentile of a list of values, or 0 if it is empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def _result(latencies, elapsed, operations, failures):
+    """Return the throughput and latency percentiles of a scenario."""
+    return {
+        'operations': operations,
+        'failures': failures,
+        'elapsed': elapsed,
+        'throughput': operations / elapsed if elapsed else 0.0,
+        'p50': _percentile(latencies, 0.5),
+        'p99': _percentile(latencies, 0.99),
+    }
+
+
+def _wait_for_silence(mumble):
+    """Wait until the client has stopped sending audio."""
+    sound_output = mumble.sound_output
+    _wait_until(lambda: not sound_output.get_buffer_size()
+                and (not sound_output.sounds or monotonic() - sound_output.sounds[-1][0] > 0.1))
+
+
+def _bench_chat_playback(mumble, names, iterations):
+    """Time from a chat message naming a clip to the first frame of audio."""
+    latencies = []
+    failures = 0
+    start_time = monotonic()
+    for i in range(iterations):
+        _wait_for_silence(mumble)
+        sent_time = monotonic()
+        mumble.receive_message(100 + i, choice(names))
+        if _wait_until(lambda: mumble.sound_output.first_sound_since(sent_time) is not None):
+            latencies.append(mumble.sound_output.first_sound_since(sent_time) - sent_time)
+        else:
+            failures += 1
+    return _result(latencies, monotonic() - start_time, iterations, failures)
+
+
+def _bench_search(mumble, iterations):
+    """Time from a chat search to the first message of results."""
+    latencies = []
+    failures = 0
+    start_time = monotonic()
+    for i in range(iterations):
+        sent_count = len(mumble.text_messages)
+        sent_time = monotonic()
+        mumble.receive_message(100 + i, '?' + SEARCH_QUERIES[i % len(SEARCH_QUERIES)])
+        if _wait_until(lambda: len(mumble.text_messages) > sent_count):
+            latencies.append(mumble.text_messages[sent_count][0] - sent_time)
+        else:
+            failures += 1
+    return _result(latencies, monotonic() - start_time, iterations, failures)
+
+
+def _bench_list(mumble, client, iterations):
+    """Time from a chat list request to the last message of the listing."""
+    message_count = len(pack_lines(client._clips.index.names, MAX_MESSAGE_LENGTH))
+    latencies = []
+    failures = 0
+    start_time = monotonic()
+    for i in range(iterations):
+        sent_count = len(mumble.text_messages)
+        sent_time = monotonic()
+        mumble.receive_message(100 + i, 'list')
+        if _wait_until(lambda: len(mumble.text_messages) >= sent_count + message_count):
+            latencies.append(mumble.text_messages[sent_count + message_count - 1][0] - sent_time)
+        else:
+            failures += 1
+    return _result(latencies, monotonic() - start_time, iterations, failures)
+
+
+def _bench_join_storm(mumble, iterations):
+    """Time the pymumble thread spends telling the client about each of a burst of users joining and leaving."""
+    latencies = []
+    start_time = monotonic()
+    for i in range(iterations):
+        sessions = range(1000 + i * JOIN_STORM_USERS, 1000 + (i + 1) * JOIN_STORM_USERS)
+        for session in sessions:
+            callback_time = monotonic()
+            mumble.add_user(session, 'user{}'.format(session))
+            latencies.append(monotonic() - callback_time)
+        for session in sessions:
+            callback_time = monotonic()
+            mumble.remove_user(session)
+            latencies.append(monotonic() - callback_time)
+    return _result(latencies, monotonic() - start_time, len(latencies), 0)
+
+
+def _bench_reload(client, iterations):
+    """Time reloading the clip directory."""
+    latencies = []
+    start_time = monotonic()
+    for _ in range(iterations):
+        reload_time = monotonic()
+        client.reload_clips()
+        latencies.append(monotonic() - reload_time)
+    return _result(latencies, monotonic() - start_time, iterations, 0)
+
+
+def run(clip_count, iterations):
+    """Run every scenario against a client with a generated clip directory, returning the results."""
+    seed(clip_count)
+    with TemporaryDirectory() as directory:
+        tones = _generate_tones(directory)
+        clip_directory = join(directory, 'clips')
+        names = _generate_clips(clip_directory, tones, clip_count)
+        config_path = join(directory, 'chumbot.ini')
+        with open(config_path, 'w') as config_file:
+            config_file.write(_CONFIG_TEMPLATE.format(clip_directory=clip_directory, event_clip=names[0]))
+
+        CONFIG.load(config_path)
+
+        loop = EventLoop()
+        loop.start()
+        library = client_module.create_library()
+        with patch.object(client_module.pymumble, 'Mumble', FakeMumble), \
+                patch.object(client_module, 'PacketMumble', FakeMumble):
+            client = client_module.Client('chumbot', 'localhost', 64738, '', False, library, loop)
+        client.connect()
+        mumble = client._mumble
+        try:
+            results = {
+                'chat_playback': _bench_chat_playback(mumble, names, iterations),
+                'search': _bench_search(mumble, iterations),
+                'list': _bench_list(mumble, client, iterations),
+                'join_storm': _bench_join_storm(mumble, iterations),
+                'reload': _bench_reload(client, iterations),
+            }
+        finally:
+            client.close()
+            library.close()
+            loop.stop()
+    return results
+
+
+def _print_results(results, baseline=None):
+    """Print the results of each scenario, with the change from a baseline if given."""
+    print('{:>14} {:>8} {:>9} {:>14} {:>10} {:>10}'.format('scenario', 'ops', 'failures', 'throughput/s',
+                                                           'p50 (ms)', 'p99 (ms)'))
+    for scenario, result in results.items():
+        print('{:>14} {:>8} {:>9} {:>14.1f} {:>10.3f} {:>10.3f}'.format(
+            scenario, result['operations'], result['failures'], result['throughput'],
+            result['p50'] * 1000, result['p99'] * 1000))
+        if baseline is not None and scenario in baseline:
+            before = baseline[scenario]
+            print('{:>14} {:>8} {:>9} {:>14} {:>10} {:>10}'.format(
+                'vs baseline', '', '', _change(before['throughput'], result['throughput']),
+                _change(before['p50'], result['p50']), _change(before['p99'], result['p99'])))
+
+
+def _change(before, after):
+    """Return the relative change between two values as a signed percentage."""
+    return '{:+.1f}%'.format((after - before) / before * 100) if before else 'n/a'
+
+
+def _clip_count(value):
+    """Parse the number of clips to generate."""
+    count = int(value)
+    if not MIN_CLIPS <= count <= MAX_CLIPS:
+        raise argparse.ArgumentTypeError('must be between {} and {}'.format(MIN_CLIPS, MAX_CLIPS))
+    return count
+
+
+def main():
+    """Run the benchmarks, print and save the results, and compare them with a baseline if given."""
+    parser = argparse.ArgumentParser(description='Benchmark a client against a fake Mumble server')
+    parser.add_argument('--clips', type=_clip_count, default=1000, help='number of clips to generate')
+    parser.add_argument('--iterations', type=int, default=50, help='number of operations per scenario')
+    parser.add_argument('--output', default='bench_client.json', help='file to save the results to')
+    parser.add_argument('--compare', help='results file of an earlier run to compare with')
+    args = parser.parse_args()
+
+    if not which('ffmpeg'):
+        print('ffmpeg is required to generate the benchmark clips')
+        return
+
+    results = run(args.clips, args.iterations)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['scenarios']
+    _print_results(results, baseline)
+
+    with open(args.output, 'w') as output_file:
+        json.dump({'clips': args.clips, 'iterations': args.iterations, 'scenarios': results}, output_file, indent=2)
+    print('Results saved to ' + args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Compare clip search latency of the clip name index against a linear scan.
+
+Run from the project directory with: python -m benchmarks.bench_clip_search
+"""
+from random import choice, randint, seed
+from string import ascii_lowercase
+from timeit import timeit
+
+from chumbot.backend.clip_index import ClipIndex
+
+LIBRARY_SIZES = (1000, 10000, 100000)
+QUERIES = ('horn', 'ab', 'xyzzy', 'the_best')
+REPEATS = 20
+
+
+def _random_names(count):
+    """Return a number of random clip names."""
+    seed(count)
+    return ['_'.join(''.join(choice(ascii_lowercase) for _ in range(randint(2, 7)))
+                     for _ in range(randint(1, 3)))
+            for _ in range(count)]
+
+
+def _linear_search(names, query):
+    """Search the names the way the client did before the index."""
+    return sorted(name for name in names if name.find(query) != -1)
+
+
+def main():
+    """Print the mean search latency for each library size."""
+    print('{:>8} {:>10} {:>12} {:>12}'.format('clips', 'query', 'linear (ms)', 'index (ms)'))
+    for size in LIBRARY_SIZES:
+        names = _random_names(size)
+        index = ClipIndex(names)
+        for query in QUERIES:
+            linear = timeit(lambda: _linear_search(names, query), number=REPEATS) / REPEATS * 1000
+            indexed = timeit(lambda: index.search(query), number=REPEATS) / REPEATS * 1000
+            print('{:>8} {:>10} {:>12.3f} {:>12.3f}'.format(size, query, linear, indexed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Compare the time taken to decode a clip with each decoder backend.
+
+Run from the project directory with: python -m benchmarks.bench_decoders
+"""
+from os.path import join
+from shutil import which
+import subprocess as sp
+from tempfile import TemporaryDirectory
+from timeit import timeit
+
+from chumbot.backend.decoders import FFmpegDecoder, MiniaudioDecoder
+
+CLIP_DURATIONS = (1, 2, 10)
+REPEATS = 20
+
+
+def _generate_clip(directory, duration):
+    """Generate an mp3 clip of a sine tone, returning its path."""
+    path = join(directory, 'tone_{}.mp3'.format(duration))
+    sp.run(['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i',
+            'sine=frequency=440:duration={}'.format(duration), path], check=True)
+    return path
+
+
+def _decoders():
+    """Return the available decoders."""
+    decoders = [FFmpegDecoder()]
+    try:
+        decoders.append(MiniaudioDecoder())
+    except ImportError:
+        print('miniaudio is not installed, skipping')
+    return decoders
+
+
+def main():
+    """Print the mean time to decode clips of several durations with each decoder."""
+    if not which('ffmpeg'):
+        print('ffmpeg is required to generate the benchmark clips')
+        return
+
+    decoders = _decoders()
+    print('{:>12} {:>12} {:>12}'.format('duration (s)', 'decoder', 'decode (ms)'))
+    with TemporaryDirectory() as directory:
+        for duration in CLIP_DURATIONS:
+            path = _generate_clip(directory, duration)
+            for decoder in decoders:
+                elapsed = timeit(lambda: decoder.decode(path), number=REPEATS) / REPEATS * 1000
+                print('{:>12} {:>12} {:>12.2f}'.format(duration, decoder.name, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""Space out retries with exponentially growing, jittered delays."""
+from random import uniform
+
+
+class Backoff:
+    """Delays between retries that double after each attempt, up to a maximum.
+
+    Each delay is drawn at random from the upper half of its range, so that several clients
+    retrying against the same server do not retry in lockstep.
+    """
+
+    def __init__(self, initial_delay, maximum_delay):
+        """Create a new backoff.
+
+        :param initial_delay: the delay before the first retry, in seconds
+        :type initial_delay: float
+        :param maximum_delay: the longest delay between retries, in seconds
+        :type maximum_delay: float
+        """
+        self._initial_delay = initial_delay
+        self._maximum_delay = maximum_delay
+
+        self.attempts = 0
+
+    def next_delay(self):
+        """Return the delay before the next attempt, in seconds, and count the attempt."""
+        delay = min(self._maximum_delay, self._initial_delay * 2 ** min(self.attempts, 32))
+        self.attempts += 1
+        return uniform(delay / 2, delay)
@@ -0,0 +1,76 @@
+"""Persist a snapshot of the clip directory, so a large clip directory is usable before it is scanned."""
+from contextlib import closing
+from os import makedirs, remove, replace
+from os.path import dirname, isfile
+import sqlite3
+from threading import Lock
+
+_SCHEMA_VERSION = 1
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER);
+CREATE TABLE clips (name TEXT PRIMARY KEY, filename TEXT NOT NULL, mtime INTEGER, size INTEGER, duration REAL);
+"""
+
+
+class ClipCatalog:
+    """An SQLite file holding the name and filename of each sound clip in a clip directory.
+
+    Each clip's modification time, size and duration are also kept once they are known. The snapshot
+    is tagged with the modification time of the clip directory when it was scanned, which changes
+    whenever a clip is added, removed or renamed.
+    """
+
+    def __init__(self, path):
+        """Create a new clip catalog.
+
+        :param path: the path of the catalog file
+        :type path: str
+        """
+        self._path = path
+        self._lock = Lock()
+
+    def load(self):
+        """Return the saved snapshot, or None if there is none or it cannot be read.
+
+        :return: the directory modification time and, by clip name, the (filename, mtime, size, duration)
+                 of each clip, with None for those not known
+        """
+        if not isfile(self._path):
+            return None
+
+        try:
+            with closing(sqlite3.connect(self._path)) as connection:
+                meta = dict(connection.execute('SELECT key, value FROM meta'))
+                if meta.get('version') != _SCHEMA_VERSION:
+                    return None
+                entries = {name: tuple(entry) for name, *entry
+                           in connection.execute('SELECT name, filename, mtime, size, duration FROM clips')}
+        except sqlite3.Error:
+            return None
+
+        return meta.get('directory_mtime'), entries
+
+    def save(self, directory_mtime, entries):
+        """Replace the saved snapshot.
+
+        :param directory_mtime: the modification time of the clip directory when it was scanned
+        :type directory_mtime: int
+        :param entries: by clip name, the (filename, mtime, size, duration) of each clip
+        :type entries: dict
+        """
+        temporary_path = self._path + '.tmp'
+        with self._lock:
+            try:
+                makedirs(dirname(self._path), exist_ok=True)
+                if isfile(temporary_path):
+                    remove(temporary_path)
+                with closing(sqlite3.connect(temporary_path)) as connection:
+                    connection.executescript(_SCHEMA)
+                    connection.executemany('INSERT INTO meta VALUES (?, ?)',
+                                           (('version', _SCHEMA_VERSION), ('directory_mtime', directory_mtime)))
+                    connection.executemany('INSERT INTO clips VALUES (?, ?, ?, ?, ?)',
+                                           ((name, *entry) for name, entry in entries.items()))
+                    connection.commit()
+                replace(temporary_path, self._path)
+            except (OSError, sqlite3.Error):
+                pass
@@ -11,9 +11,27 @@ from chumbot import client_interface
 class ChumShell(Cmd):
     """Implementation of interactive shell for Chumbot."""
 
-    intro = "Type 'help' to display commands."
+    intro = "Type 'help' to display commands. Prefix a command with '@<instance>' to run it on one instance."
     prompt = 'chumbot> '
 
+    def onecmd(self, line):
+        """Run a command, on a single instance if the command is prefixed with '@<instance>'."""
+        if line.startswith('@'):
+            name, _, line = line[1:].partition(' ')
+            with client_interface.targeting(name) as found:
+                return super().onecmd(line) if found else False
+        return super().onecmd(line)
+
+    def do_use(self, arg):
+        """Run the following commands on one instance given its name, or on every instance given 'all'."""
+        if client_interface.target(arg.strip()):
+            target = client_interface.current_target()
+            self.prompt = 'chumbot[{}]> '.format(target) if target else 'chumbot> '
+
+    def do_instances(self, arg):
+        """List the names of the instances hosted by Chumbot."""
+        print('\n'.join(client_interface.instance_names()))
+
     def do_connect(self, arg):
         """Connect the Chumbot to the server."""
         client_interface.connect()
@@ -50,6 +68,26 @@ class ChumShell(Cmd):
         """Play a random sound clip in Mumble and list its name."""
         client_interface.play_random()
 
+    def do_skip(self, arg):
+        """Stop the sound clips playing and move on to the next queued clips."""
+        client_interface.skip_playback()
+
+    def do_stop(self, arg):
+        """Stop the sound clips playing and discard every queued clip."""
+        client_interface.stop_playback()
+
+    def do_queue(self, arg):
+        """List the requested sound clips playing or waiting to play."""
+        client_interface.print_queue()
+
+    def do_voices(self, arg):
+        """List the voices playing or waiting to play."""
+        client_interface.print_voices()
+
+    def do_cancel(self, arg):
+        """Stop a voice playing or waiting to play given its ID."""
+        client_interface.cancel_voice(arg)
+
     def do_list(self, arg):
         """List all clips loaded into Chumbot."""
         client_interface.list_clips()
@@ -62,6 +100,26 @@ class ChumShell(Cmd):
         """Reload the stored sound clips."""
         client_interface.reload_clips()
 
+    def do_warm(self, arg):
+        """Decode every sound clip ahead of time into the on-disk clip store."""
+        client_interface.warm_cache()
+
+    def do_cache(self, arg):
+        """Print the decoded audio cache usage and hit ratio."""
+        client_interface.print_cache_stats()
+
+    def do_messages(self, arg):
+        """Print the chat message queue depth and handling latency."""
+        client_interface.print_message_stats()
+
+    def do_connection(self, arg):
+        """Print the state of the connection and how often it dropped and was restored."""
+        client_interface.print_connection_stats()
+
+    def do_stats(self, arg):
+        """Print the stage latencies, counters and gauges of Chumbot."""
+        client_interface.print_stats()
+
     def do_automove(self, arg):
         """Enable or disable auto-move into most populous Mumble channel."""
         client_interface.automove(arg)
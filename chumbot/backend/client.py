@@ -1,38 +1,49 @@
 """Defines a data structure for a Mumble client."""
-import configparser
-from os.path import expanduser, join
-from random import choice
-import subprocess as sp
-from threading import Thread
+import asyncio
+from collections import deque
+from functools import partial
+from threading import Lock
+from time import monotonic
 
 import pymumble_py3 as pymumble
-
-from chumbot.backend.clips import Clips
+from pymumble_py3.messages import MoveCmd, TextMessage
+
+from chumbot.backend.backoff import Backoff
+from chumbot.backend.clips import normalize_name
+from chumbot.backend.decoders import create_decoder
+from chumbot.backend.dispatcher import Dispatcher
+from chumbot.backend.event_loop import EventLoop
+from chumbot.backend.library import ClipLibrary
+from chumbot.backend import metrics
+from chumbot.backend import mixer
+from chumbot.backend import opus
+from chumbot.backend.packet_output import PacketMumble
+from chumbot.backend.playback_queue import PlaybackQueue
+from chumbot.backend.population import ChannelPopulation
+from chumbot.backend.random_clips import ClipPicker
+from chumbot.backend.rate_limiter import RateLimiter
+from chumbot.backend.text_sender import TextSender
 from chumbot.backend import constants
+from chumbot.config import CONFIG as _CONFIG
 
-_CONFIG = configparser.ConfigParser()
-_CONFIG.read(expanduser(constants.MUMBLE_CONFIG))
-
-_CLIP_DIRECTORY = _CONFIG['clips']['ClipDir']
-_LINK_POSTED_CLIP = _CONFIG['clips']['LinkPostedClipName']
-_USER_JOINED_CLIP_DEFAULT = _CONFIG['clips']['UserJoinedClipName']
-_USER_LEFT_CLIP_DEFAULT = _CONFIG['clips']['UserLeftClipName']
+# Keys coalescing clip listings and stats requested while an earlier one is being sent
+_LIST_KEY = 'list'
+_STATS_KEY = 'stats'
 
-_USER_JOINED_CLIPS_CUSTOM = {}
-if _CONFIG.has_section('join'):
-    _USER_JOINED_CLIPS_CUSTOM = dict(_CONFIG['join'].items())
+# The clip name requesting a random clip, picked once the request is queued
+_RANDOM_CLIP = '*'
 
-_USER_LEFT_CLIPS_CUSTOM = {}
-if _CONFIG.has_section('disconnect'):
-    _USER_LEFT_CLIPS_CUSTOM = dict(_CONFIG['disconnect'].items())
 
 class Client:
     """A class for managing a Mumble client."""
 
-    def __init__(self, username, host, port, password, debug):
+    def __init__(self, username, host, port, password, debug, library=None, loop=None,
+                 name=constants.DEFAULT_INSTANCE):
         """Create a new Mumble client for a given server host.
 
-        The default values of the parameters are read from mumble.cfg.
+        The default values of the parameters are read from mumble.cfg. Clients hosted in the same
+        process can share a clip library, so their clips are loaded and decoded once, and an event loop,
+        on which their chat messages, playback and automove checks run as tasks.
 
         :param username: the client username
         :type username: str
@@ -44,56 +55,110 @@ class Client:
         :type password: str
         :param debug: enable or disable debug mode
         :type debug: bool
+        :param library: the clip library to play clips from, or None to create one
+        :type library: chumbot.backend.library.ClipLibrary
+        :param loop: the running event loop to run tasks on, or None to start one
+        :type loop: chumbot.backend.event_loop.EventLoop
+        :param name: the name of the client's instance, labelling its metrics
+        :type name: str
+        :raises ValueError: if a client setting in the config file is not valid
         """
         self._username = username
         self._host = host
         self._port = port
         self._password = password
         self._debug = debug
+        self._name = name
+        self._settings = _Settings()
 
         self._running = False
         self._connected = False
         self._muted = False
-        self._last_message_time = 0
 
-        self._clips = Clips(_CLIP_DIRECTORY, constants.SOUND_FILE_EXTENSION)
+        self._library = library if library is not None else create_library()
+        self._clips = self._library.clips
+        self._metrics = self._library.metrics
+        if loop is None:
+            loop = EventLoop()
+            loop.start()
+        self._loop = loop
+        self._dispatcher = Dispatcher(_call, constants.MESSAGE_WORKERS,
+                                      self._settings.message_queue_size, self._settings.message_queue_overflow)
+        self._loop.call(self._dispatcher.start)
+        self._mixer = mixer.Mixer(constants.STREAM_FRAME_SIZE, constants.MIXER_BUFFER_AHEAD,
+                                  self._settings.mixer_lane_limits)
+        self._mixer.start()
+        self._rate_limiter = RateLimiter(self._settings.rate_limit / 60, self._settings.rate_limit_burst)
+        self._playback_queue = PlaybackQueue(self._play_request, self._settings.mixer_lane_limits[mixer.NORMAL],
+                                             self._settings.playback_queue_clips,
+                                             self._settings.playback_queue_duration)
+        self._loop.call(self._playback_queue.start)
+        self._text_sender = TextSender(self._send_text_message, self._max_message_length,
+                                       self._settings.text_message_rate, self._settings.text_message_burst)
 
         self._mumble = None
-        self._channel_poll = None
+        self._connection_lock = Lock()
+        self._state_lock = Lock()
+        self._supervisor = None
+        self._channel = None
+        self._connection_drops = 0
+        self._reconnects = 0
+        self._reconnect_attempts = 0
+        self._population = ChannelPopulation()
         self._automove = True
+        self._automove_timer = None
+        self._last_automove_time = float('-inf')
 
+        self._add_gauges()
         self._initialize_client()
 
     def connect(self):
-        """Connect to the Mumble host specified at initialization."""
-        if not self._connected:
-            if not self._running:
-                self._mumble.start()
-                self._running = True
-            else:
-                self._initialize_client()
-                self._mumble.start()
-            self._mumble.is_ready()
-            self._connected = True
-            if self._automove:
-                self._channel_poll.start()
+        """Connect to the Mumble host specified at initialization.
+
+        The clip directory may still be scanned in the background while the connection is made, and
+        connecting waits for the scan to finish once the server is ready. Stops reconnecting, if the
+        client is reconnecting after its connection dropped.
+        """
+        self._loop.call(self._stop_supervisor)
+        with self._connection_lock:
+            if self._connected:
+                return
+            start_time = monotonic()
+            if not self._start_mumble():
+                print('Could not connect to {}:{}'.format(self._host, self._port))
+                return
+            connect_time = monotonic() - start_time
+            self._metrics.observe('connect', connect_time)
+            self._library.wait_for_scan()
+            if self._debug:
+                self._print_startup_times(connect_time)
+            self._finish_connect()
 
     def disconnect(self):
-        """Disconnect from the Mumble host if connected.
+        """Disconnect from the Mumble host if connected, and stop reconnecting if reconnecting.
 
         Kills the Mumble thread. Must be remade to reconnect.
         """
-        if self._connected:
-            self._mumble.connected = pymumble.constants.PYMUMBLE_CONN_STATE_NOT_CONNECTED
-            self._mumble.control_socket.close()
-            self._mumble.join()
-            self._connected = False
-            if self._channel_poll.is_alive():
-                self._channel_poll.join()
+        self._loop.call(self._stop_supervisor)
+        with self._connection_lock:
+            with self._state_lock:
+                connected, self._connected = self._connected, False
+            if connected:
+                self._mumble.connected = pymumble.constants.PYMUMBLE_CONN_STATE_NOT_CONNECTED
+                self._mumble.control_socket.close()
+                self._mumble.join()
+                self._end_session()
+
+    def close(self):
+        """Disconnect from the Mumble host and stop the client's chat message and playback tasks."""
+        self.disconnect()
+        self._loop.run(self._dispatcher.stop()).result()
+        self._loop.run(self._playback_queue.stop()).result()
+        self._metrics.remove_gauges(self._name)
 
     def reconnect(self):
-        """Disconnect and reconnect to the Mumble host."""
-        if self._connected:
+        """Disconnect and reconnect to the Mumble host, or reconnect at once if the connection dropped."""
+        if self._connected or self._supervisor is not None:
             self.disconnect()
             self.connect()
 
@@ -133,160 +198,816 @@ class Client:
             self._mumble.users.myself.unmute()
             self._muted = False
 
-    def play_clips(self, sound_clips):
-        """Play sound clips in the Mumble server.
+    def play_clips(self, sound_clips, user=None):
+        """Queue sound clips to be played in the Mumble server.
 
         Sound files must match the audio file format specified in chumbot.cfg and must be
         located in the clip directory specified in chumbot.cfg.
-        Multiple clips can be played in a row if names separated by commas.
+        Multiple clips can be played in a row if names separated by commas. Clips requested by a
+        user are limited by the user's rate limit, and clips are dropped if the playback queue is full.
 
         :param sound_clips: the extensionless names of the sound clips, separated by commas
         :type sound_clips: str
+        :param user: the session ID of the user requesting the clips, or None if not requested by a user
+        :type user: int
         """
         if self._connected:
-            clip_list = sound_clips.split(',')[:constants.MAXIMUM_CLIP_LIST_SIZE]
-            for sound_clip in clip_list:
-                sound_clip = sound_clip.lower().strip().replace(' ', '_')
-                if sound_clip == '*':
-                    sound_clip = choice(list(self._clips.keys()))
-                if sound_clip in self._clips:
-                    audio_file = self._clips[sound_clip]
-                    pcm = _convert_audio_to_pcm(audio_file)
-                    self._mumble.sound_output.add_sound(pcm)
-
-    def play_random(self):
-        """Play a random sound clip in the Mumble server and list its name."""
-        if self._connected:
-            sound_clip = choice(list(self._clips.keys()))
-            self._mumble.my_channel().send_text_message(sound_clip)
-            audio_file = self._clips[sound_clip]
-            pcm = _convert_audio_to_pcm(audio_file)
-            self._mumble.sound_output.add_sound(pcm)
+            with self._metrics.time('message_parse'):
+                clip_list = [normalize_name(sound_clip)
+                             for sound_clip in sound_clips.split(',')[:constants.MAXIMUM_CLIP_LIST_SIZE]]
+            with self._metrics.time('clip_lookup'):
+                found_clips = [sound_clip for sound_clip in clip_list if sound_clip in self._clips
+                               or (sound_clip == _RANDOM_CLIP and len(self._clips.picker))]
+            self._metrics.increment('clips_not_found', len(clip_list) - len(found_clips))
+
+            if user is not None:
+                found_clips = found_clips[:self._rate_limiter.acquire(user, len(found_clips))]
+            if found_clips:
+                self._loop.call_soon(self._enqueue, user, found_clips)
+
+    def play_random(self, user=None):
+        """Queue a random sound clip to be played in the Mumble server and list its name.
+
+        :param user: the session ID of the user requesting the clip, or None if not requested by a user
+        :type user: int
+        """
+        if self._connected and len(self._clips.picker) and (user is None or self._rate_limiter.acquire(user, 1)):
+            self._loop.call_soon(partial(self._enqueue, user, [_RANDOM_CLIP], announce=True))
+
+    def skip_playback(self):
+        """Stop the sound clips playing, moving on to the next queued clips."""
+        self._loop.call_soon(self._playback_queue.skip)
+
+    def stop_playback(self):
+        """Stop the sound clips playing and discard every queued clip."""
+        self._loop.call_soon(self._playback_queue.clear)
 
     def list_clips(self):
-        """Send a message to the current channel listing all sound clips."""
+        """Send messages to the current channel listing all sound clips.
+
+        A listing requested while an earlier listing is still being sent is dropped.
+        """
         if self._connected:
-            clips = sorted(clip for clip in self._clips if not clip.startswith('_'))
-            for part_clips in _partition(clips, constants.CLIPS_PARTITION_SIZE):
-                self._mumble.my_channel().send_text_message("<br/>" + "<br/>".join(part_clips))
+            self._loop.call_soon(self._text_sender.send_lines, self._clips.index.names, _LIST_KEY)
 
     def search_clips(self, clip_name):
         """Search for clips and send a message to the current channel listing all partial matches.
 
+        Clips starting with the search come first. If nothing matches, the most similarly named
+        clips are suggested instead.
+
         :param clip_name: the name of the clip to search for
         :type clip_name: string
         """
-        clip_name = clip_name.lower().strip().replace(' ', '_')
+        clip_name = normalize_name(clip_name)
         if self._connected:
-            results = sorted(clip for clip in self._clips if not clip.startswith('_')
-                             and clip.find(clip_name) != -1)
-            for part_clips in _partition(results, constants.CLIPS_PARTITION_SIZE):
-                self._mumble.my_channel().send_text_message("<br/>" + "<br/>".join(part_clips))
+            results = self._clips.index.search(clip_name)
+            if not results:
+                suggestions = self._clips.index.suggest(clip_name)
+                if suggestions:
+                    self._loop.call_soon(self._text_sender.send, 'Did you mean: ' + ', '.join(suggestions) + '?')
+            self._loop.call_soon(self._text_sender.send_lines, results)
 
     def reload_clips(self):
         """Reload the stored sound clips."""
+        self._library.wait_for_scan()
         self._clips.reload()
 
+    def warm_cache(self):
+        """Decode every sound clip missing from the on-disk clip store."""
+        self._library.wait_for_scan()
+        decoded = self._library.warm()
+        print('Decoded {} of {} clips'.format(decoded, len(self._clips)))
+
+    def print_queue(self):
+        """Print the requested sound clips playing or waiting to play."""
+        queue = self._playback_queue
+        for request in self._loop.call(queue.requests):
+            state = 'playing' if request.voice is not None else 'queued'
+            print('{:>4}  {:<7}  {}'.format(request.request_id, state, request.label))
+        print('Queued clips: {} ({:.1f}s)'.format(queue.depth, queue.duration))
+        print('Played requests:', queue.played)
+        print('Skipped requests:', queue.skipped)
+        print('Dropped requests:', queue.dropped)
+        print('Rate limited requests:', self._rate_limiter.limited)
+
+    def print_voices(self):
+        """Print the voices playing or waiting to play in the mixer."""
+        for voice in self._mixer.voices():
+            state = 'playing' if voice.active else 'waiting'
+            print('{:>4}  {:<8}  {:<7}  {}'.format(voice.voice_id, voice.lane, state, voice.label))
+
+    def cancel_voice(self, voice_id):
+        """Stop a voice playing or waiting to play in the mixer.
+
+        :param voice_id: the ID of the voice
+        :type voice_id: int
+        """
+        if not self._mixer.cancel(voice_id):
+            print('No such voice: ' + str(voice_id))
+
+    def print_cache_stats(self):
+        """Print the decoded audio cache usage and hit ratio."""
+        cache = self._library.pcm_cache
+        lookups = cache.hits + cache.misses
+        hit_ratio = cache.hits / lookups if lookups else 0.0
+        print('Cached clips:', len(cache))
+        print('Cached bytes:', cache.size)
+        print('Hits:', cache.hits)
+        print('Misses:', cache.misses)
+        print('Hit ratio: {:.1%}'.format(hit_ratio))
+
+    def print_message_stats(self):
+        """Print the chat message queue depth and handling latency."""
+        dispatcher = self._dispatcher
+        average_latency = dispatcher.total_latency / dispatcher.handled if dispatcher.handled else 0.0
+        print('Queued messages:', dispatcher.depth)
+        print('Peak queued messages:', dispatcher.peak_depth)
+        print('Handled messages:', dispatcher.handled)
+        print('Dropped messages:', dispatcher.dropped)
+        print('Average latency: {:.3f}s'.format(average_latency))
+        print('Maximum latency: {:.3f}s'.format(dispatcher.max_latency))
+        print('Outgoing messages waiting:', self._loop.call(lambda: self._text_sender.depth))
+        print('Sent messages:', self._text_sender.sent)
+        print('Coalesced listings:', self._text_sender.coalesced)
+
+    def print_stats(self):
+        """Print the stage latencies, counters and gauges of the client and its clip library."""
+        print('\n'.join(self._loop.call(self._metrics.summary, self._name)))
+
     def enable_automove(self):
         """Enable automove to most populated channel."""
         self._automove = True
-        if self._connected and not self._channel_poll.is_alive():
-            self._channel_poll.start()
+        self._loop.call_soon(self._schedule_automove)
 
     def disable_automove(self):
         """Disable automove to most populated channel."""
         self._automove = False
+        self._loop.call_soon(self._cancel_automove)
+
+    def print_connection_stats(self):
+        """Print the state of the connection and how often it dropped and was restored."""
+        state = 'connected' if self._connected else 'reconnecting' if self._supervisor is not None else 'disconnected'
+        print('Connection:', state)
+        print('Connection drops:', self._connection_drops)
+        print('Reconnects: {} ({} attempts)'.format(self._reconnects, self._reconnect_attempts))
+        reconnect_times = self._metrics.histograms().get('reconnect')
+        if reconnect_times is not None and reconnect_times.count:
+            print('Reconnect time: mean {:.2f}s, max {:.2f}s'.format(reconnect_times.total / reconnect_times.count,
+                                                                      reconnect_times.maximum))
+
+    def _start_mumble(self):
+        """Start a Mumble client thread and wait until it is connected. The connection lock must be held.
+
+        The Mumble thread can exit without ever becoming ready, if the server drops the handshake, so it
+        is waited for at most CONNECT_TIMEOUT seconds and only while it is alive. A thread still connecting
+        after that is stopped.
+
+        :return: whether the client connected
+        """
+        if self._running:
+            self._initialize_client()
+        self._mumble.start()
+        self._running = True
+        deadline = monotonic() + constants.CONNECT_TIMEOUT
+        while not self._mumble.ready_lock.acquire(timeout=constants.CONNECT_POLL_INTERVAL):
+            if not self._mumble.is_alive() or monotonic() > deadline:
+                self._mumble.connected = pymumble.constants.PYMUMBLE_CONN_STATE_NOT_CONNECTED
+                if self._mumble.control_socket is not None:
+                    self._mumble.control_socket.close()
+                return False
+        self._mumble.ready_lock.release()
+        return self._mumble.connected == pymumble.constants.PYMUMBLE_CONN_STATE_CONNECTED
+
+    def _finish_connect(self):
+        """Start playing and handling events on a new connection. The connection lock must be held.
+
+        The clip library is kept across connections, so the clips and their decoded audio are ready at once.
+        """
+        self._library.pin(self._settings.event_clips)
+        if self._muted:
+            self._mumble.users.myself.mute()
+        with self._mumble.users.lock:
+            self._population.rebuild(list(self._mumble.users.values()))
+            with self._state_lock:
+                self._connected = True
+        self._mixer.set_output(self._mumble.sound_output)
+        self._loop.call_soon(self._schedule_automove)
+
+    def _end_session(self):
+        """Stop playing and drop the requests and messages of a connection that has ended."""
+        self._loop.call_soon(self._playback_queue.clear)
+        self._loop.call_soon(self._text_sender.clear)
+        self._loop.call_soon(self._cancel_automove)
+        self._mixer.set_output(None)
+        self._mixer.cancel_all()
+
+    def _connection_lost(self):
+        """Start reconnecting if the connection dropped. Called by the Mumble thread once it disconnects."""
+        with self._state_lock:
+            dropped, self._connected = self._connected, False
+        if not dropped:
+            # The client disconnected on purpose
+            return
+
+        self._connection_drops += 1
+        try:
+            self._channel = self._mumble.my_channel()['name']
+        except (KeyError, TypeError):
+            self._channel = None
+        print('Lost the connection to {}:{}'.format(self._host, self._port))
+        self._end_session()
+        if self._settings.reconnect:
+            self._loop.call_soon(self._start_supervisor)
+
+    def _start_supervisor(self):
+        """Start reconnecting, unless already reconnecting. Must be called on the event loop."""
+        if self._supervisor is None:
+            self._supervisor = asyncio.ensure_future(self._supervise())
+
+    def _stop_supervisor(self):
+        """Stop reconnecting. Must be called on the event loop."""
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+
+    async def _supervise(self):
+        """Reconnect to the server, waiting exponentially longer between failed attempts.
+
+        An attempt is only made once the server accepts connections again, so a server that is down is
+        checked cheaply and the connection is restored within one handshake of it coming back.
+        """
+        backoff = Backoff(self._settings.reconnect_min_delay, self._settings.reconnect_max_delay)
+        lost_time = monotonic()
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(backoff.next_delay())
+            self._reconnect_attempts += 1
+            if await self._server_reachable() and await loop.run_in_executor(None, self._restore_connection):
+                break
+
+        self._reconnects += 1
+        self._metrics.observe('reconnect', monotonic() - lost_time)
+        self._supervisor = None
+        print('Reconnected to {}:{} after {} attempts'.format(self._host, self._port, backoff.attempts))
+
+    async def _server_reachable(self):
+        """Return whether the server accepts TCP connections."""
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(self._host, self._port),
+                                               constants.RECONNECT_PROBE_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    def _restore_connection(self):
+        """Connect to the server again, restoring the client's channel and mute state.
+
+        :return: whether the client connected, or stopped reconnecting meanwhile
+        """
+        with self._connection_lock:
+            if self._supervisor is None or self._connected:
+                return True
+            if not self._start_mumble():
+                return False
+            self._finish_connect()
+            if self._channel is not None:
+                try:
+                    channel = self._mumble.channels.find_by_name(self._channel)
+                    if channel != self._mumble.my_channel():
+                        channel.move_in()
+                except pymumble.errors.UnknownChannelError:
+                    pass
+            return True
 
     def _initialize_client(self):
         """Initialize the mumble client.
 
-        Creates a new Mumble client thread and adds the text message callback.
-        Also creates a thread for channel population polling.
+        Creates a new Mumble client thread and adds the text message and user callbacks.
         """
-        self._mumble = pymumble.Mumble(self._host, self._username, self._port, self._password,
-                                       debug=self._debug)
+        mumble_class = PacketMumble if self._settings.pre_encode else pymumble.Mumble
+        self._mumble = mumble_class(self._host, self._username, self._port, self._password, debug=self._debug)
         # Add 'text received' callback
         self._mumble.callbacks.add_callback(pymumble.constants.PYMUMBLE_CLBK_TEXTMESSAGERECEIVED,
                                             self._read_message)
+        # Add 'disconnected' callback to reconnect if the connection drops
+        self._mumble.callbacks.add_callback(pymumble.constants.PYMUMBLE_CLBK_DISCONNECTED,
+                                            self._connection_lost)
+        # Add user callbacks to track channel population
+        self._mumble.callbacks.add_callback(pymumble.constants.PYMUMBLE_CLBK_USERCREATED,
+                                            self._user_created)
+        self._mumble.callbacks.add_callback(pymumble.constants.PYMUMBLE_CLBK_USERUPDATED,
+                                            self._user_updated)
+        self._mumble.callbacks.add_callback(pymumble.constants.PYMUMBLE_CLBK_USERREMOVED,
+                                            self._user_removed)
+
+    def _print_startup_times(self, connect_time):
+        """Print the time taken to import the client, read the config file, scan the clip directory and connect.
+
+        :param connect_time: the time taken to connect to the server, in seconds
+        :type connect_time: float
+        """
+        stages = self._metrics.histograms()
+        times = (('import', stages['import'].maximum if 'import' in stages else None),
+                 ('config', _CONFIG.load_time),
+                 ('scan', stages['clip_scan'].maximum if 'clip_scan' in stages else None),
+                 ('connect', connect_time))
+        print('Startup times ({}): {}'.format(self._name, ', '.join('{} {:.1f} ms'.format(name, seconds * 1000)
+                                                                     for name, seconds in times
+                                                                     if seconds is not None)))
+
+    def _enqueue(self, user, sound_clips, announce=False):
+        """Queue sound clips to be played. Must be called on the event loop.
+
+        Random clips are picked, and requested clips recorded as played, only once the request fits in the
+        playback queue, so a dropped request leaves the random clip picker as it was.
+
+        :param user: the session ID of the user requesting the clips, or None if not requested by a user
+        :type user: int
+        :param sound_clips: the extensionless names of the sound clips, or '*' for a random clip
+        :type sound_clips: list
+        :param announce: send the names of the clips to the current channel if they are queued
+        :type announce: bool
+        """
+        with self._metrics.time('enqueue'):
+            requested_clips = [sound_clip for sound_clip in sound_clips if sound_clip != _RANDOM_CLIP]
+            if self._playback_queue.admits(len(sound_clips), self._estimate_duration(sound_clips)):
+                sound_clips = [self._clips.picker.pick() if sound_clip == _RANDOM_CLIP else sound_clip
+                               for sound_clip in sound_clips]
+                sound_clips = [sound_clip for sound_clip in sound_clips if sound_clip is not None]
+                if not sound_clips:
+                    return
+            # A request that does not fit is dropped and counted by the queue
+            request = self._playback_queue.enqueue(user, sound_clips, self._estimate_duration(sound_clips))
+            if request is not None:
+                for sound_clip in requested_clips:
+                    self._clips.picker.played(sound_clip)
+        if request is not None and announce and self._connected:
+            self._text_sender.send(request.label)
+
+    def _estimate_duration(self, sound_clips):
+        """Return the estimated duration of sound clips in seconds, counting a random clip as one never decoded."""
+        unknown_clip_duration = self._settings.unknown_clip_duration
+        return sum(self._library.estimated_duration(sound_clip, unknown_clip_duration) for sound_clip in sound_clips)
+
+    def _max_message_length(self):
+        """Return the length of the longest text message the server accepts, in bytes."""
+        return self._mumble.get_max_message_length() or constants.TEXT_MESSAGE_LENGTH
+
+    def _send_text_message(self, message):
+        """Send a text message to the current channel without waiting for the Mumble thread to send it.
+
+        Messages are sent by the text sender, which paces them to stay under the server's flood limits. A message
+        is dropped if the connection is not established.
+
+        :param message: the text of the message
+        :type message: str
+        """
+        if self._connection_ready():
+            command = TextMessage(self._mumble.users.myself_session, self._mumble.users.myself['channel_id'], message)
+            self._mumble.execute_command(command, blocking=False)
+
+    def _connection_ready(self):
+        """Return whether the connection is established, so commands can be executed without blocking.
+
+        pymumble's execute_command waits for the connection to be ready, which would block the event loop
+        while the client reconnects. Each pymumble connection is ready only once, as it does not reconnect
+        by itself, so a command executed once it is ready does not wait.
+        """
+        mumble = self._mumble
+        if not self._connected or mumble.connected != pymumble.constants.PYMUMBLE_CONN_STATE_CONNECTED:
+            return False
+        if not mumble.ready_lock.acquire(blocking=False):
+            return False
+        mumble.ready_lock.release()
+        return True
+
+    async def _play_request(self, request):
+        """Play a queued request's sound clips in order as one voice in the mixer's normal lane.
+
+        The first clip is streamed, and each later clip is decoded PLAYBACK_PREFETCH clips ahead
+        of its turn. Clips already decoded are played as Opus packets encoded ahead of time, if the sound
+        output can send them; each clip is then padded to a whole number of Opus frames, so that the next
+        clip's frames line up with its packets. Clips that cannot be decoded are skipped. Returns once the
+        voice has finished playing, is cancelled, or the client disconnects.
+
+        :param request: the playback request
+        :type request: chumbot.backend.playback_queue.PlaybackRequest
+        """
+        if not self._connected:
+            return
+
+        voice = self._mixer.add_voice(mixer.NORMAL, request.label)
+        request.attach(voice)
+        first_clip, *later_clips = request.clips
+        upcoming_clips = deque(later_clips)
+        encoding = self._output_encoding()
+        decodes = deque()
+        try:
+            while upcoming_clips and len(decodes) < constants.PLAYBACK_PREFETCH:
+                decodes.append(asyncio.ensure_future(self._fetch_clip(upcoming_clips.popleft(), encoding)))
+            if encoding is not None and self._library.decoded(first_clip):
+                pcm, packets = await self._fetch_clip(first_clip, encoding)
+                self._metrics.observe('playback_start', monotonic() - request.queued_time)
+                voice.feed(opus.pad(pcm, encoding), packets, encoding)
+            else:
+                await self._stream_clip(first_clip, voice, request.queued_time, encoding)
+            while decodes:
+                pcm, packets = await decodes.popleft()
+                if upcoming_clips:
+                    decodes.append(asyncio.ensure_future(self._fetch_clip(upcoming_clips.popleft(), encoding)))
+                if pcm is None:
+                    continue
+                await self._wait_for_voice(voice)
+                if not self._connected or voice.cancelled:
+                    break
+                voice.feed(pcm if encoding is None else opus.pad(pcm, encoding), packets, encoding)
+        finally:
+            for decode in decodes:
+                decode.cancel()
+            voice.finish()
 
-        self._channel_poll = Thread(target=self._channel_population_poll)
+        if self._connected:
+            await _wait_for_done(voice)
+
+    async def _fetch_clip(self, sound_clip, encoding):
+        """Return the decoded PCM of a sound clip, and its Opus packets if an encoding is given or None otherwise.
+
+        Both are None if the clip cannot be decoded.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        :param encoding: the (bitrate, frame duration, profile) of the sound output, or None
+        :type encoding: tuple
+        """
+        if encoding is None:
+            return await self._library.get_pcm_async(sound_clip), None
+        return await self._library.get_packets_async(sound_clip, encoding)
+
+    def _output_encoding(self):
+        """Return the encoding of Opus packets the sound output can send as they are, or None if it cannot."""
+        if not self._connected:
+            return None
+        return getattr(self._mumble.sound_output, 'encoding', None)
+
+    async def _wait_for_voice(self, voice):
+        """Wait until a playing voice has at most STREAM_BUFFER_AHEAD seconds of audio left to play.
+
+        Returns immediately if the voice is waiting for its turn, and stops waiting if the voice is
+        cancelled or the client disconnects, which cancels every voice.
+
+        :param voice: the voice to wait for
+        :type voice: chumbot.backend.mixer.Voice
+        """
+        while self._connected and voice.active and not voice.cancelled \
+                and voice.buffered > constants.STREAM_BUFFER_AHEAD:
+            # A playing voice plays in real time, so wait for the excess to play unless the voice ends first
+            await _wait_for_done(voice, voice.buffered - constants.STREAM_BUFFER_AHEAD)
+
+    async def _stream_clip(self, sound_clip, voice, queued_time, encoding=None):
+        """Feed a sound clip to a mixer voice, streaming it while it is decoded if it is not cached or stored.
+
+        Once the voice is playing, decoding stays at most STREAM_BUFFER_AHEAD seconds ahead of playback,
+        and stops if the voice is cancelled or the client disconnects. If an encoding is given, the clip
+        is padded to a whole number of its frames once it has been fed.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        :param voice: the voice to feed
+        :type voice: chumbot.backend.mixer.Voice
+        :param queued_time: the monotonic time the clip was queued, to record the time to its first frame
+        :type queued_time: float
+        :param encoding: the (bitrate, frame duration, profile) of the sound output, or None
+        :type encoding: tuple
+        """
+        stream = self._library.stream_async(sound_clip)
+        fed = 0
+        try:
+            async for pcm in stream:
+                await self._wait_for_voice(voice)
+                if not self._connected or voice.cancelled:
+                    return
+                if queued_time is not None:
+                    self._metrics.observe('playback_start', monotonic() - queued_time)
+                    queued_time = None
+                voice.feed(pcm)
+                fed += len(pcm)
+            if encoding is not None:
+                voice.feed(bytes(-fed % opus.frame_size(encoding)))
+        finally:
+            await stream.aclose()
 
     def _read_message(self, message_obj):
-        """Read a message sent by a user.
+        """Read a message sent by a user, queueing it to be handled on the event loop.
 
         :param message: the message sent by the user
         :type message: pymumble.mumble_pb2.TextMessage
         """
         message = message_obj.message
         if message.startswith('<a href=') or message.startswith('<img src='):
-            self.play_clips(_LINK_POSTED_CLIP)
-        elif message.lower().strip() == 'list':
+            self._play_event_clip(self._settings.link_posted_clip)
+        else:
+            self._loop.call_soon(self._dispatcher.submit, message_obj.actor,
+                                 partial(self._handle_message, message_obj.actor, message, monotonic()))
+
+    def _handle_message(self, user, message, received_time):
+        """Handle a message sent by a user. Called on an executor thread by the dispatcher.
+
+        :param user: the session ID of the user
+        :type user: int
+        :param message: the text of the message
+        :type message: str
+        :param received_time: the monotonic time the message was received
+        :type received_time: float
+        """
+        self._metrics.observe('message_wait', monotonic() - received_time)
+        self._metrics.increment('messages')
+        command = message.lower().strip()
+        if command == 'list':
             self.list_clips()
+        elif command == '!stats':
+            self._loop.call_soon(self._send_stats)
+        elif command == 'skip':
+            self.skip_playback()
+        elif command == 'stop':
+            self.stop_playback()
         elif message == '*':
-            self.play_random()
+            self.play_random(user)
         elif message.startswith('?'):
             self.search_clips(message[1:])
         else:
-            self.play_clips(message)
+            self.play_clips(message, user)
 
-    def _channel_population_poll(self):
-        """Poll Mumble channel population.
-        
-        Automove to most populous channel when automove enabled.
-        Play sound clip when a user joins or leaves a channel.
+    def _send_stats(self):
+        """Send messages to the current channel summarising the client's metrics. Must be called on the event loop."""
+        if self._connected:
+            self._text_sender.send_lines(self._metrics.summary(self._name), _STATS_KEY)
+
+    def _add_gauges(self):
+        """Add gauges reporting the client's queues, rate limits and mixer to the shared metrics."""
+        gauges = {
+            'message_queue_depth': lambda: self._dispatcher.depth,
+            'messages_dropped': lambda: self._dispatcher.dropped,
+            'playback_queue_clips': lambda: self._playback_queue.depth,
+            'playback_queue_seconds': lambda: self._playback_queue.duration,
+            'requests_dropped': lambda: self._playback_queue.dropped,
+            'requests_rate_limited': lambda: self._rate_limiter.limited,
+            'mixer_voices': lambda: len(self._mixer.voices()),
+            'mixer_frames': lambda: self._mixer.frames,
+            'outgoing_messages': lambda: self._text_sender.depth,
+            'opus_packets_sent': lambda: getattr(getattr(self._mumble, 'sound_output', None), 'packets_sent', 0),
+            'opus_frames_encoded': lambda: getattr(getattr(self._mumble, 'sound_output', None), 'frames_encoded', 0),
+            'connected': lambda: int(self._connected),
+            'connection_drops': lambda: self._connection_drops,
+            'reconnects': lambda: self._reconnects,
+            'reconnect_attempts': lambda: self._reconnect_attempts,
+        }
+        for name, gauge in gauges.items():
+            self._metrics.add_gauge(name, gauge, self._name)
+
+    def _user_created(self, user):
+        """Record a user connecting to the server, playing their join clip if they joined this channel.
+
+        :param user: the user that connected
+        :type user: pymumble.users.User
         """
-        def get_channel_users():
-            return {user['name'].lower()
-                    for user in self._mumble.my_channel().get_users()}
+        self._population.move(user['session'], user['channel_id'])
+        if self._connected:
+            if user['channel_id'] == self._mumble.users.myself['channel_id']:
+                self._play_user_clip(user, self._settings.user_joined_clips_custom,
+                                     self._settings.user_joined_clip_default)
+            self._loop.call_soon(self._schedule_automove)
+
+    def _user_updated(self, user, actions):
+        """Record a user moving between channels, playing a clip if they joined or left this channel.
+
+        :param user: the user that was updated
+        :type user: pymumble.users.User
+        :param actions: the updated user fields
+        :type actions: dict
+        """
+        if 'channel_id' not in actions:
+            return
 
+        old_channel_id = self._population.move(user['session'], user['channel_id'])
         if self._connected:
-            old_channel_users = get_channel_users()
+            if user['session'] != self._mumble.users.myself_session:
+                my_channel_id = self._mumble.users.myself['channel_id']
+                if user['channel_id'] == my_channel_id:
+                    self._play_user_clip(user, self._settings.user_joined_clips_custom,
+                                         self._settings.user_joined_clip_default)
+                elif old_channel_id == my_channel_id:
+                    self._play_user_clip(user, self._settings.user_left_clips_custom,
+                                         self._settings.user_left_clip_default)
+            self._loop.call_soon(self._schedule_automove)
+
+    def _user_removed(self, user, message):
+        """Record a user disconnecting from the server, playing their leave clip if they left this channel.
+
+        :param user: the user that disconnected
+        :type user: pymumble.users.User
+        :param message: the user removal message
+        :type message: pymumble.mumble_pb2.UserRemove
+        """
+        old_channel_id = self._population.remove(user['session'])
+        if self._connected:
+            if old_channel_id == self._mumble.users.myself['channel_id']:
+                self._play_user_clip(user, self._settings.user_left_clips_custom,
+                                     self._settings.user_left_clip_default)
+            self._loop.call_soon(self._schedule_automove)
+
+    def _play_user_clip(self, user, custom_clips, default_clip):
+        """Queue a user's custom join or leave clip, or the default clip if they have none.
+
+        :param user: the user that joined or left
+        :type user: pymumble.users.User
+        :param custom_clips: the custom clip names by lowercase user name
+        :type custom_clips: dict
+        :param default_clip: the default clip name
+        :type default_clip: str
+        """
+        self._play_event_clip(custom_clips.get(user['name'].lower(), default_clip))
 
-        while self._connected:
-            try:
-                if self._automove:
-                    most_populous_channel = max(self._mumble.channels.values(),
-                                                key=lambda c: len(c.get_users()))
-
-                    if most_populous_channel != self._mumble.my_channel():
-                        most_populous_channel.move_in()
-                        old_channel_users = get_channel_users()
-
-                # play join clip if user joins channel
-                cur_channel_users = get_channel_users()
-                if len(cur_channel_users) > len(old_channel_users):
-                    channel_diff = list(cur_channel_users - old_channel_users)
-                    joined_user = channel_diff[0]
-                    user_joined_clip = _USER_JOINED_CLIPS_CUSTOM.get(joined_user, _USER_JOINED_CLIP_DEFAULT)
-                    self.play_clips(user_joined_clip)
-                    old_channel_users = cur_channel_users
-                # play leave clip if user leaves channel
-                elif len(cur_channel_users) < len(old_channel_users):
-                    channel_diff = list(old_channel_users - cur_channel_users)
-                    left_user = channel_diff[0]
-                    user_left_clip = _USER_LEFT_CLIPS_CUSTOM.get(left_user, _USER_LEFT_CLIP_DEFAULT)
-                    self.play_clips(user_left_clip)
-                    old_channel_users = cur_channel_users
-            except RuntimeError:
-                # ignore errors when user (dis)connects
-                pass
-
-
-def _partition(lst, size):
-    """Yield successive n-sized chunks from a list."""
-    for i in range(0, len(lst), size):
-        yield lst[i:i + size]
-
-
-def _convert_audio_to_pcm(audio_filename):
-    """Convert an audio file's contents to .PCM format.
-
-    :param audio_filename: the name of the audio file to convert
-    :type audio_filename: string
+    def _play_event_clip(self, event_clip):
+        """Play a link, join or leave clip immediately if it is pinned, or queue it to be played otherwise.
+
+        :param event_clip: the extensionless names of the sound clips, separated by commas
+        :type event_clip: str
+        """
+        if not event_clip:
+            return
+        pcm = self._library.pinned(event_clip)
+        if pcm is not None:
+            encoding = self._output_encoding()
+            packets = self._library.pinned_packets(event_clip, encoding) if encoding is not None else None
+            self._mixer.play(pcm, mixer.PRIORITY, event_clip, packets, encoding)
+        else:
+            self._loop.call_soon(self._dispatcher.submit, None, partial(self.play_clips, event_clip))
+
+    def _schedule_automove(self, delay=None):
+        """Check whether to automove after a delay, unless a check is already scheduled.
+
+        Delaying the check lets the channel population settle, so the client does not move back and forth
+        while users are moving. Must be called on the event loop.
+
+        :param delay: the time to wait before checking, in seconds, or None for the configured delay
+        :type delay: float
+        """
+        if delay is None:
+            delay = self._settings.automove_delay
+        if self._automove and self._automove_timer is None:
+            self._automove_timer = self._loop.loop.call_later(delay, self._update_automove)
+
+    def _cancel_automove(self):
+        """Cancel the scheduled automove check, if any. Must be called on the event loop."""
+        if self._automove_timer is not None:
+            self._automove_timer.cancel()
+            self._automove_timer = None
+
+    def _update_automove(self):
+        """Move to the most populous channel if automove is enabled.
+
+        The most populous channel must have at least AutomoveMargin more users than this channel, and
+        the client moves at most once per AutomoveCooldown seconds.
+        """
+        self._automove_timer = None
+        if not self._automove or not self._connection_ready():
+            return
+
+        my_channel_id = self._mumble.users.myself['channel_id']
+        if self._population.max_count - self._population.count(my_channel_id) < self._settings.automove_margin:
+            return
+
+        cooldown_remaining = self._last_automove_time + self._settings.automove_cooldown - monotonic()
+        if cooldown_remaining > 0:
+            self._schedule_automove(cooldown_remaining)
+            return
+
+        most_populous_channel_id = self._population.most_populous()
+        if most_populous_channel_id is not None and most_populous_channel_id != my_channel_id:
+            self._last_automove_time = monotonic()
+            self._mumble.execute_command(MoveCmd(self._mumble.users.myself_session, most_populous_channel_id),
+                                         blocking=False)
+
+
+class _Settings:
+    """The client and clip library settings, read from the config file when a client or clip library is created.
+
+    Reading the settings raises ValueError naming the section and key of a setting that is not valid.
+    """
+
+    def __init__(self):
+        """Read the settings from the config file."""
+        self.clip_directory = _CONFIG.get('clips', 'ClipDir', fallback=constants.CLIP_DIRECTORY)
+        self.link_posted_clip = _CONFIG.get('clips', 'LinkPostedClipName', fallback='')
+        self.user_joined_clip_default = _CONFIG.get('clips', 'UserJoinedClipName', fallback='')
+        self.user_left_clip_default = _CONFIG.get('clips', 'UserLeftClipName', fallback='')
+        self.cache_size = _CONFIG.getint('clips', 'CacheSize', fallback=constants.PCM_CACHE_SIZE)
+        self.watch_clip_directory = _CONFIG.getboolean('clips', 'WatchClipDir', fallback=False)
+        self.normalize = _CONFIG.getboolean('clips', 'Normalize', fallback=False)
+        self.target_level = _CONFIG.getfloat('clips', 'TargetLevel', fallback=constants.TARGET_LEVEL)
+        self.pre_encode = _CONFIG.getboolean('clips', 'PreEncode', fallback=True)
+        self.mixer_lane_limits = {
+            mixer.PRIORITY: _CONFIG.getint('mixer', 'PriorityVoices', fallback=constants.MIXER_PRIORITY_VOICES),
+            mixer.NORMAL: _CONFIG.getint('mixer', 'NormalVoices', fallback=constants.MIXER_NORMAL_VOICES),
+        }
+        self.decoder = _CONFIG.get('clips', 'Decoder', fallback=constants.DECODER)
+        self.decoder_pool_size = _CONFIG.getint('clips', 'DecoderPoolSize', fallback=constants.DECODER_POOL_SIZE)
+        self.decoder_timeout = _CONFIG.getfloat('clips', 'DecoderTimeout', fallback=constants.DECODER_TIMEOUT)
+        self.playback_queue_clips = _CONFIG.getint('playback', 'MaxQueuedClips',
+                                                   fallback=constants.PLAYBACK_QUEUE_CLIPS)
+        self.playback_queue_duration = _CONFIG.getfloat('playback', 'MaxQueuedSeconds',
+                                                        fallback=constants.PLAYBACK_QUEUE_DURATION)
+        self.unknown_clip_duration = _CONFIG.getfloat('playback', 'UnknownClipSeconds',
+                                                      fallback=constants.UNKNOWN_CLIP_DURATION)
+        self.rate_limit = _CONFIG.getfloat('playback', 'ClipsPerMinute', fallback=constants.RATE_LIMIT)
+        self.rate_limit_burst = _CONFIG.getint('playback', 'Burst', fallback=constants.RATE_LIMIT_BURST)
+        self.message_queue_size = _CONFIG.getint('messages', 'QueueSize', fallback=constants.MESSAGE_QUEUE_SIZE)
+        self.message_queue_overflow = _CONFIG.get('messages', 'DropWhenFull',
+                                                  fallback=constants.MESSAGE_QUEUE_OVERFLOW)
+        self.text_message_rate = _CONFIG.getfloat('messages', 'SendRate', fallback=constants.TEXT_MESSAGE_RATE)
+        self.text_message_burst = _CONFIG.getint('messages', 'SendBurst', fallback=constants.TEXT_MESSAGE_BURST)
+        self.automove_margin = _CONFIG.getint('automove', 'Margin', fallback=constants.AUTOMOVE_MARGIN)
+        self.automove_delay = _CONFIG.getfloat('automove', 'Delay', fallback=constants.AUTOMOVE_DELAY)
+        self.automove_cooldown = _CONFIG.getfloat('automove', 'Cooldown', fallback=constants.AUTOMOVE_COOLDOWN)
+        self.reconnect = _CONFIG.getboolean('reconnect', 'Enabled', fallback=True)
+        self.reconnect_min_delay = _CONFIG.getfloat('reconnect', 'MinDelay', fallback=constants.RECONNECT_MIN_DELAY)
+        self.reconnect_max_delay = _CONFIG.getfloat('reconnect', 'MaxDelay', fallback=constants.RECONNECT_MAX_DELAY)
+
+        self.random_mode = _CONFIG.get('random', 'Mode', fallback=constants.RANDOM_MODE)
+        self.random_play_weight = _CONFIG.getfloat('random', 'PlayWeight', fallback=0.0)
+        self.random_weights = {name: _CONFIG.getfloat('weights', name) for name in _CONFIG.section('weights')}
+
+        self.user_joined_clips_custom = _CONFIG.section('join')
+        self.user_left_clips_custom = _CONFIG.section('disconnect')
+
+    @property
+    def event_clips(self):
+        """Return the clips played on events rather than requested in chat, kept decoded in memory."""
+        return {event_clip for event_clip in (self.link_posted_clip, self.user_joined_clip_default,
+                                              self.user_left_clip_default, *self.user_joined_clips_custom.values(),
+                                              *self.user_left_clips_custom.values())
+                if event_clip}
+
+
+def create_library():
+    """Return a clip library for the clip settings in mumble.cfg, to be shared by clients.
+
+    The clip directory is scanned in the background, while the clients connect.
+
+    :raises ValueError: if a clip setting is not valid
+    """
+    settings = _Settings()
+    decoder = create_decoder(settings.decoder, settings.decoder_pool_size, settings.decoder_timeout)
+    return ClipLibrary(settings.clip_directory, decoder, settings.cache_size * 1024 * 1024,
+                       settings.watch_clip_directory, settings.normalize, settings.target_level, background_scan=True,
+                       picker=ClipPicker(settings.random_mode, settings.random_weights, settings.random_play_weight))
+
+
+def serve_metrics(library, loop):
+    """Serve a clip library's metrics in the Prometheus text format on the port set in mumble.cfg.
+
+    :param library: the clip library shared by the clients
+    :type library: chumbot.backend.library.ClipLibrary
+    :param loop: the running event loop to serve the metrics on
+    :type loop: chumbot.backend.event_loop.EventLoop
+    :return: the server, or None if no port is set
+    """
+    port = _CONFIG.getint('metrics', 'Port', fallback=0)
+    if not port:
+        return None
+    return loop.run(metrics.serve(library.metrics, constants.METRICS_HOST, port)).result()
+
+
+async def _wait_for_done(voice, timeout=None):
+    """Wait until a mixer voice is done, or until a timeout passes.
+
+    :param voice: the voice to wait for
+    :type voice: chumbot.backend.mixer.Voice
+    :param timeout: the maximum time to wait, in seconds, or None to wait until the voice is done
+    :type timeout: float
     """
-    with open(expanduser(join(_CLIP_DIRECTORY, audio_filename)), 'rb') as audio_file:
-        with sp.Popen(constants.CONVERT_COMMAND, stdout=sp.PIPE,
-                      stderr=sp.DEVNULL, stdin=audio_file) as process:
-            pcm = process.stdout.read()
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    callback = partial(loop.call_soon_threadsafe, _set_done, done)
+    voice.add_done_callback(callback)
+    try:
+        await asyncio.wait([done], timeout=timeout)
+    finally:
+        voice.remove_done_callback(callback)
 
-    return pcm
+
+def _set_done(future):
+    """Mark a future as done, unless it was cancelled."""
+    if not future.done():
+        future.set_result(None)
+
+
+async def _call(function):
+    """Call a function queued on the dispatcher on the event loop's default executor.
+
+    Chat messages are parsed and matched against the clips on the executor's threads, so a slow
+    search does not hold up the event loop, and the dispatcher's workers handle messages at once.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, function)
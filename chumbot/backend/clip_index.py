@@ -0,0 +1,154 @@
+"""Index sound clip names for fast prefix, substring and fuzzy searches."""
+from bisect import bisect_left, insort
+from collections import Counter
+from difflib import SequenceMatcher
+from heapq import nlargest
+from threading import RLock
+
+# Length of the longest substrings indexed for each name
+_GRAM_SIZE = 3
+
+
+class ClipIndex:
+    """A sorted list of sound clip names with an n-gram index of their substrings.
+
+    Every substring of up to three characters maps to the names containing it, so a substring
+    search only checks the names sharing the query's rarest n-gram.
+    """
+
+    def __init__(self, names=()):
+        """Create a new clip name index.
+
+        :param names: the sound clip names to index
+        :type names: iterable
+        """
+        self._names = sorted(set(names))
+        self._grams = {}
+        self._lock = RLock()
+        for name in self._names:
+            self._index(name)
+
+    def __contains__(self, name):
+        """Return whether a name is indexed."""
+        i = bisect_left(self._names, name)
+        return i < len(self._names) and self._names[i] == name
+
+    def __len__(self):
+        """Return the number of indexed names."""
+        return len(self._names)
+
+    @property
+    def names(self):
+        """Return a copy of the indexed names in sorted order."""
+        with self._lock:
+            return list(self._names)
+
+    def add(self, name):
+        """Add a name to the index.
+
+        :param name: the sound clip name
+        :type name: str
+        """
+        with self._lock:
+            if name not in self:
+                insort(self._names, name)
+                self._index(name)
+
+    def remove(self, name):
+        """Remove a name from the index.
+
+        :param name: the sound clip name
+        :type name: str
+        """
+        with self._lock:
+            if name in self:
+                del self._names[bisect_left(self._names, name)]
+                for gram in _grams(name):
+                    postings = self._grams[gram]
+                    postings.discard(name)
+                    if not postings:
+                        del self._grams[gram]
+
+    def prefix(self, query):
+        """Return the names starting with a query, in sorted order.
+
+        :param query: the start of the names
+        :type query: str
+        """
+        with self._lock:
+            start = bisect_left(self._names, query)
+            end = start
+            while end < len(self._names) and self._names[end].startswith(query):
+                end += 1
+            return self._names[start:end]
+
+    def search(self, query):
+        """Return the names containing a query, ranked by relevance.
+
+        Names starting with the query come first, then names ranked by how early the query
+        occurs in them and by length.
+
+        :param query: the substring to search for
+        :type query: str
+        """
+        with self._lock:
+            if not query:
+                return list(self._names)
+
+            candidates = self._candidates(query)
+            prefix_matches = self.prefix(query)
+            other_matches = sorted((name for name in candidates if query in name and not name.startswith(query)),
+                                   key=lambda name: (name.find(query), len(name), name))
+            return prefix_matches + other_matches
+
+    def suggest(self, query, limit=5, cutoff=0.6):
+        """Return the names most similar to a query, to suggest when a search finds nothing.
+
+        Candidates are the names sharing the most of the query's longest n-grams. If none of them is
+        similar enough, such as for a query with two letters swapped, shorter n-grams are tried.
+
+        :param query: the misspelled name
+        :type query: str
+        :param limit: the maximum number of suggestions
+        :type limit: int
+        :param cutoff: the minimum similarity, from 0 to 1, of a suggestion
+        :type cutoff: float
+        """
+        for min_size in range(min(_GRAM_SIZE, len(query)), 0, -1):
+            shared_grams = Counter()
+            with self._lock:
+                for gram in _grams(query, min_size=min_size):
+                    shared_grams.update(self._grams.get(gram, ()))
+
+            # Of the names sharing as many n-grams, those closest in length to the query are checked first
+            candidates = nlargest(limit * 10, shared_grams.items(),
+                                  key=lambda item: (item[1], -abs(len(item[0]) - len(query))))
+            scored = []
+            for name, _ in candidates:
+                ratio = SequenceMatcher(None, query, name).ratio()
+                if ratio >= cutoff:
+                    scored.append((-ratio, name))
+            if scored:
+                return [name for _, name in sorted(scored)[:limit]]
+        return []
+
+    def _candidates(self, query):
+        """Return the names sharing the query's rarest n-gram."""
+        if len(query) <= _GRAM_SIZE:
+            return self._grams.get(query, set())
+
+        postings = [self._grams.get(query[i:i + _GRAM_SIZE], set())
+                    for i in range(len(query) - _GRAM_SIZE + 1)]
+        return min(postings, key=len)
+
+    def _index(self, name):
+        """Add a name to the n-gram postings."""
+        for gram in _grams(name):
+            self._grams.setdefault(gram, set()).add(name)
+
+
+def _grams(text, min_size=1):
+    """Return the set of substrings of a text, from min_size up to three characters long."""
+    return {text[i:i + size]
+            for size in range(min_size, _GRAM_SIZE + 1)
+            for i in range(len(text) - size + 1)}
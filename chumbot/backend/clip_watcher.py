@@ -0,0 +1,185 @@
+"""Watch the clip directory and apply added, removed and renamed sound clips as they happen."""
+import ctypes
+import ctypes.util
+from os import close, read, stat
+from os.path import realpath
+import re
+from select import select
+import struct
+import sys
+from threading import Thread
+from time import sleep
+from traceback import print_exc
+
+# inotify event masks, from <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_UPDATE_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO
+_IN_REMOVE_MASK = _IN_DELETE | _IN_MOVED_FROM
+_IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+_EVENT_BUFFER_SIZE = 1 << 16
+
+# The mounted filesystems, listing the mount point and filesystem type of each
+_MOUNTS_PATH = '/proc/self/mounts'
+
+# Network filesystem types, on which inotify does not report changes made by other hosts
+_REMOTE_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ncpfs', 'afs', 'ceph', 'glusterfs', 'lustre', '9p',
+                       'fuse'}
+
+
+class ClipWatcher(Thread):
+    """A thread applying changes to the clip directory to a sound clip dictionary.
+
+    On Linux, inotify reports each added, removed or renamed file, which is applied individually.
+    Elsewhere, on network filesystems, or if inotify is unavailable or stops working, the directory
+    is polled and reloaded when its modification time changes or a clip it has stamped is overwritten.
+    A change that fails to apply is printed, and the watcher carries on.
+    """
+
+    def __init__(self, clips, poll_interval):
+        """Create a new clip directory watcher.
+
+        :param clips: the sound clips to update
+        :type clips: chumbot.backend.clips.Clips
+        :param poll_interval: the time between checks for changes, in seconds
+        :type poll_interval: float
+        """
+        super().__init__(daemon=True)
+        self._clips = clips
+        self._poll_interval = poll_interval
+        self._running = False
+
+    def start(self):
+        """Start watching the clip directory."""
+        self._running = True
+        super().start()
+
+    def stop(self):
+        """Stop watching the clip directory."""
+        self._running = False
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        """Watch the clip directory until stopped."""
+        directory = self._clips.directory
+        inotify_fd = None if _remote_filesystem(directory) else _inotify_watch(directory)
+        last_mtime = _mtime(directory)
+        if inotify_fd is not None:
+            try:
+                self._watch(inotify_fd)
+            except OSError as error:
+                print('Could not watch the clip directory with inotify, polling it instead: {}'.format(error))
+            finally:
+                close(inotify_fd)
+            # Changes may have been missed, so the clips are reloaded once polling starts
+            last_mtime = None
+
+        if self._running:
+            self._poll(last_mtime)
+
+    def _watch(self, inotify_fd):
+        """Apply changes reported by inotify, until stopped or the directory is no longer watched."""
+        while self._running:
+            readable, _, _ = select([inotify_fd], [], [], self._poll_interval)
+            if not readable:
+                continue
+
+            events = read(inotify_fd, _EVENT_BUFFER_SIZE)
+            offset = 0
+            while offset < len(events):
+                _, mask, _, name_length = _EVENT_HEADER.unpack_from(events, offset)
+                offset += _EVENT_HEADER.size
+                filename = events[offset:offset + name_length].rstrip(b'\0').decode(errors='surrogateescape')
+                offset += name_length
+
+                if mask & _IN_Q_OVERFLOW:
+                    # Events were dropped, so the whole directory is reloaded
+                    _apply(self._clips.reload)
+                elif mask & _IN_IGNORED:
+                    print('The clip directory is no longer watched by inotify, polling it instead')
+                    return
+                elif mask & _IN_UPDATE_MASK:
+                    _apply(self._clips.update_file, filename)
+                elif mask & _IN_REMOVE_MASK:
+                    _apply(self._clips.remove_file, filename)
+
+    def _poll(self, last_mtime):
+        """Reload the clips whenever the clip directory's modification time changes or a stamped clip changes.
+
+        Overwriting a file in place does not change the directory's modification time, so the stamped
+        clips are also checked.
+
+        :param last_mtime: the modification time the clips were loaded at, or None to reload them at the first check
+        :type last_mtime: int
+        """
+        while self._running:
+            sleep(self._poll_interval)
+            mtime = _mtime(self._clips.directory)
+            if mtime is None:
+                continue
+            if mtime != last_mtime or _apply(self._clips.stale):
+                last_mtime = mtime
+                _apply(self._clips.reload)
+
+
+def _inotify_watch(directory):
+    """Return an inotify file descriptor watching a directory, or None if inotify is unavailable."""
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        inotify_fd = libc.inotify_init1(_IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if inotify_fd < 0:
+        return None
+
+    if libc.inotify_add_watch(inotify_fd, directory.encode(), _IN_UPDATE_MASK | _IN_REMOVE_MASK) < 0:
+        close(inotify_fd)
+        return None
+
+    return inotify_fd
+
+
+def _apply(change, *args):
+    """Apply a change to the clips, returning its result, or printing its error and returning None."""
+    try:
+        return change(*args)
+    except Exception:  # pylint: disable=broad-except
+        print_exc()
+        return None
+
+
+def _remote_filesystem(directory):
+    """Return whether a directory is on a network filesystem, or False if the mounted filesystems are unknown."""
+    try:
+        with open(_MOUNTS_PATH) as mounts_file:
+            mounts = [line.split()[1:3] for line in mounts_file]
+    except OSError:
+        return False
+
+    path = realpath(directory)
+    best_mount_point, best_type = '', ''
+    for mount_point, filesystem_type in mounts:
+        # Spaces and other special characters in mount points are escaped as octal
+        mount_point = re.sub(r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), mount_point)
+        if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                and len(mount_point) >= len(best_mount_point):
+            best_mount_point, best_type = mount_point, filesystem_type
+    return best_type.split('.')[0] in _REMOTE_FILESYSTEMS
+
+
+def _mtime(directory):
+    """Return the modification time of a directory, or None if it cannot be read."""
+    try:
+        return stat(directory).st_mtime_ns
+    except OSError:
+        return None
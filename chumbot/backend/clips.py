@@ -1,31 +1,303 @@
 """Map sound clip names to sound clip files."""
-from os import listdir
-from os.path import expanduser, splitext
+from os import listdir, stat
+from os.path import expanduser, join, splitext
+from threading import Lock
+
+from chumbot.backend.clip_index import ClipIndex
+from chumbot.backend.random_clips import ClipPicker
+
+# The details of a sound clip whose modification time, size and duration are not known
+_UNKNOWN_DETAILS = (None, None, None)
 
 
 class Clips(dict):
-    """Stores and maps sound clip files by their extensionless names."""
+    """Stores and maps sound clip files by their extensionless names.
+
+    The names of the listed clips (those not starting with '_') are also kept in a search index,
+    and the names of every clip are kept in a picker to choose random clips from.
+    The clips can be saved to and loaded from a catalog, along with the modification time, size and
+    duration of each clip once they are known, so the clip directory need not be scanned at startup.
+    """
 
-    def __init__(self, clip_directory, extension):
-        """Create a new sound clip dictionary."""
+    def __init__(self, clip_directory, extension, load=True, catalog=None, picker=None):
+        """Create a new sound clip dictionary.
+
+        :param clip_directory: the directory containing the sound clips
+        :type clip_directory: str
+        :param extension: the file extension of the sound clips
+        :type extension: str
+        :param load: load the sound clips now, rather than leaving the dictionary empty until loaded
+        :type load: bool
+        :param catalog: the catalog to save the sound clips to, or None
+        :type catalog: chumbot.backend.catalog.ClipCatalog
+        :param picker: the picker to choose random clips with, or None for a uniform picker
+        :type picker: chumbot.backend.random_clips.ClipPicker
+        """
         super().__init__()
 
         self._clip_directory = clip_directory
         self._extension = extension
-        self._load_clips()
+        self._catalog = catalog
+        self._reload_callbacks = []
+        self._lock = Lock()
+        self._details = {}
+        self._longest_duration = None
+        self._directory_mtime = None
+        self.index = ClipIndex()
+        self.picker = picker if picker is not None else ClipPicker()
+        if load:
+            self.load()
 
     def __iter__(self):
         """Return a sound clip iterator."""
         return iter(self.keys())
 
+    @property
+    def directory(self):
+        """Return the expanded path of the clip directory."""
+        return expanduser(self._clip_directory)
+
+    def load(self):
+        """Load the sound clips from the clip directory, replacing any clips already loaded.
+
+        Every reload callback is called with the names of the loaded clips.
+        """
+        directory_mtime = stat(self.directory).st_mtime_ns
+        self._replace(self._scan(), {}, directory_mtime)
+        self.save_catalog()
+
+    def load_catalog(self):
+        """Load the sound clips saved in the catalog, replacing any clips already loaded.
+
+        Every reload callback is called with the names of the loaded clips.
+
+        :return: whether a catalog was loaded
+        """
+        snapshot = self._catalog.load() if self._catalog is not None else None
+        if snapshot is None:
+            return False
+
+        directory_mtime, entries = snapshot
+        self._replace({name: entry[0] for name, entry in entries.items()},
+                      {name: entry[1:] for name, entry in entries.items()}, directory_mtime)
+        return True
+
+    def validate(self):
+        """Reload the sound clips if any were added, removed or renamed since they were scanned.
+
+        The clip directory is only listed if its modification time changed, and the clips are only
+        reloaded if the listed clips differ, so changes to other files, such as the clip store's
+        directory being created, do not reload the clips.
+
+        :return: whether the clips were reloaded
+        """
+        directory_mtime = stat(self.directory).st_mtime_ns
+        if directory_mtime == self._directory_mtime:
+            return False
+
+        clips = self._scan()
+        with self._lock:
+            unchanged = clips == dict(self)
+            if unchanged:
+                self._directory_mtime = directory_mtime
+        if unchanged:
+            self.save_catalog()
+            return False
+        self._reload(directory_mtime, clips)
+        return True
+
+    def save_catalog(self):
+        """Save the sound clips and their known details to the catalog, if there is one."""
+        if self._catalog is not None:
+            with self._lock:
+                entries = {name: (filename, *self._details.get(name, _UNKNOWN_DETAILS))
+                           for name, filename in self.items()}
+                directory_mtime = self._directory_mtime
+            self._catalog.save(directory_mtime, entries)
+
     def reload(self):
-        """Reload the sound clips, loading any new ones if they exist."""
-        self.clear()
-        self._load_clips()
+        """Reload the sound clips, loading any new ones if they exist.
+
+        The clip directory is scanned before any clips are changed, and only the clips that were
+        added, removed, renamed or overwritten are updated, so clips remain playable during a reload.
+        Every reload callback is called with the names of the clips that were removed or changed.
+        """
+        directory_mtime = stat(self.directory).st_mtime_ns
+        self._reload(directory_mtime, self._scan())
+
+    def stale(self):
+        """Return the names of the clips whose files changed since their modification time and size were recorded.
+
+        Only clips that have been stamped, such as those decoded, are checked.
+        """
+        with self._lock:
+            stamps = [(name, details[:2]) for name, details in self._details.items() if details[0] is not None]
+        stale_names = []
+        for name, stamp in stamps:
+            try:
+                stat_result = stat(self.path(name))
+            except (KeyError, OSError):
+                continue
+            if (stat_result.st_mtime_ns, stat_result.st_size) != stamp:
+                stale_names.append(name)
+        return stale_names
+
+    def update_file(self, filename):
+        """Load or reload a single sound clip file.
+
+        :param filename: the name of the sound clip file within the clip directory
+        :type filename: str
+        """
+        name, ext = splitext(filename)
+        if ext == self._extension:
+            with self._lock:
+                self._add(name, filename)
+            self._notify([name])
+
+    def remove_file(self, filename):
+        """Unload a single sound clip file.
 
-    def _load_clips(self):
-        """Load the sound clips from the clip directory."""
-        for filename in listdir(expanduser(self._clip_directory)):
+        :param filename: the name of the sound clip file within the clip directory
+        :type filename: str
+        """
+        name, ext = splitext(filename)
+        if ext == self._extension and self.get(name) == filename:
+            with self._lock:
+                self._remove(name)
+            self._notify([name])
+
+    def add_reload_callback(self, callback):
+        """Add a function to call after sound clips are reloaded.
+
+        :param callback: a function taking an iterable of invalidated clip names
+        :type callback: callable
+        """
+        self._reload_callbacks.append(callback)
+
+    def path(self, name):
+        """Return the full path of a sound clip file.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        """
+        return join(self.directory, self[name])
+
+    def stamp(self, name):
+        """Return the modification time and size of a sound clip file.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        """
+        stat_result = stat(self.path(name))
+        stamp = stat_result.st_mtime_ns, stat_result.st_size
+        if self._details.get(name, _UNKNOWN_DETAILS)[:2] != stamp:
+            with self._lock:
+                self._details[name] = (*stamp, None)
+        return stamp
+
+    def duration(self, name):
+        """Return the duration of a sound clip in seconds, or None if it is not known.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        """
+        return self._details.get(name, _UNKNOWN_DETAILS)[2]
+
+    def longest_duration(self):
+        """Return the longest duration of a sound clip in seconds, or None if no clip's duration is known.
+
+        Clips removed or overwritten since the clips were last loaded still count.
+        """
+        return self._longest_duration
+
+    def set_duration(self, name, stamp, duration):
+        """Record the duration of a sound clip, to be saved to the catalog.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        :param stamp: the (mtime, size) of the clip file the duration was measured from
+        :type stamp: tuple
+        :param duration: the duration of the clip, in seconds
+        :type duration: float
+        """
+        with self._lock:
+            if name in self:
+                self._details[name] = (*stamp, duration)
+                self._longest_duration = max(duration, self._longest_duration or 0.0)
+
+    def _scan(self):
+        """Return the sound clip files in the clip directory by their extensionless names."""
+        clips = {}
+        for filename in listdir(self.directory):
             name, ext = splitext(filename)
             if ext == self._extension:
-                self[name] = filename
+                clips[name] = filename
+        return clips
+
+    def _replace(self, clips, details, directory_mtime):
+        """Replace every sound clip and notify the reload callbacks.
+
+        :param clips: the sound clip files by their extensionless names
+        :type clips: dict
+        :param details: the known (mtime, size, duration) of the sound clips by their extensionless names
+        :type details: dict
+        :param directory_mtime: the modification time of the clip directory when it was scanned
+        :type directory_mtime: int
+        """
+        with self._lock:
+            self.clear()
+            self.update(clips)
+            self._details = details
+            self._longest_duration = max((entry[2] for entry in details.values() if entry[2] is not None),
+                                         default=None)
+            self._directory_mtime = directory_mtime
+            self.index = ClipIndex(name for name in self if not name.startswith('_'))
+            self.picker.reset(self)
+        self._notify(list(clips))
+
+    def _reload(self, directory_mtime, clips):
+        """Apply the differences between the loaded sound clips and the scanned clip directory.
+
+        :param directory_mtime: the modification time of the clip directory when it was scanned
+        :type directory_mtime: int
+        :param clips: the sound clip files in the clip directory by their extensionless names
+        :type clips: dict
+        """
+        stale_names = set(self.stale())
+        with self._lock:
+            changed_names = [name for name, filename in clips.items()
+                             if self.get(name) != filename or name in stale_names]
+            removed_names = [name for name in self if name not in clips]
+            for name in changed_names:
+                self._add(name, clips[name])
+            for name in removed_names:
+                self._remove(name)
+            self._directory_mtime = directory_mtime
+        self._notify(changed_names + removed_names)
+        self.save_catalog()
+
+    def _add(self, name, filename):
+        """Add or replace a sound clip. The clips lock must be held."""
+        self[name] = filename
+        self._details.pop(name, None)
+        if not name.startswith('_'):
+            self.index.add(name)
+        self.picker.add(name)
+
+    def _remove(self, name):
+        """Remove a sound clip. The clips lock must be held."""
+        del self[name]
+        self._details.pop(name, None)
+        self.index.remove(name)
+        self.picker.remove(name)
+
+    def _notify(self, names):
+        """Call every reload callback with the names of the removed or changed clips."""
+        if names:
+            for callback in self._reload_callbacks:
+                callback(names)
+
+
+def normalize_name(clip_name):
+    """Return a sound clip name as typed by a user in the form it is stored."""
+    return clip_name.lower().strip().replace(' ', '_')
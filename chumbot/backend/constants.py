@@ -1,5 +1,14 @@
 """Defines constants for types of Mumble events."""
 
+# Default sound clip decoder ('ffmpeg', 'ffmpeg-pool', 'miniaudio', or 'auto' to use miniaudio if it is installed)
+DECODER = 'auto'
+
+# Default number of idle ffmpeg processes kept by the 'ffmpeg-pool' decoder
+DECODER_POOL_SIZE = 4
+
+# Default maximum time for the 'ffmpeg-pool' decoder to decode a clip, in seconds
+DECODER_TIMEOUT = 10.0
+
 # Convert a WAV file to PCM
 CONVERT_COMMAND = ['ffmpeg', '-i', '-', '-acodec', 'pcm_s16le',
                    '-ar', '48000', '-ac', '1', '-f', 's32le', '-']
@@ -7,11 +16,140 @@ CONVERT_COMMAND = ['ffmpeg', '-i', '-', '-acodec', 'pcm_s16le',
 # Name of Mumble config file
 MUMBLE_CONFIG = '~/.config/chumbot.ini'
 
+# Default port of the Mumble server
+MUMBLE_PORT = 64738
+
+# Default directory containing the sound clips
+CLIP_DIRECTORY = '~/chumbot-clips'
+
+# Prefix of the config sections describing each instance hosted by one process
+INSTANCE_SECTION_PREFIX = 'mumble:'
+
+# Name of the instance described by the [mumble] config section
+DEFAULT_INSTANCE = 'default'
+
 # Extension of sound clip files
 SOUND_FILE_EXTENSION = '.mp3'
 
 # Maximum clips that can be played in a row
 MAXIMUM_CLIP_LIST_SIZE = 10
 
-# The size of each partition of the clips list
-CLIPS_PARTITION_SIZE = 50
+# Length of the longest text message sent when the server sets no limit, in bytes
+TEXT_MESSAGE_LENGTH = 5000
+
+# Default number of text messages sent per second after the initial burst
+TEXT_MESSAGE_RATE = 1.0
+
+# Default number of text messages that can be sent at once
+TEXT_MESSAGE_BURST = 5
+
+# Default size of the decoded clip cache, in MiB
+PCM_CACHE_SIZE = 64
+
+# Size of the Opus packet cache, in MiB
+PACKET_CACHE_SIZE = 16
+
+# Directory within the clip directory in which decoded clips are stored
+PCM_STORE_DIRECTORY = '.chumbot-cache'
+
+# Time to wait after a change to a clip store's manifest before writing it, in seconds
+MANIFEST_SAVE_DELAY = 2.0
+
+# Number of clips decoded at once
+DECODE_WORKERS = 4
+
+# Size of each frame of a streamed clip, in bytes (20 ms of 48 kHz mono 16-bit PCM)
+STREAM_FRAME_SIZE = 1920
+
+# Maximum audio buffered ahead of playback while streaming a clip, in seconds
+STREAM_BUFFER_AHEAD = 0.5
+
+# Number of threads handling chat messages
+MESSAGE_WORKERS = 4
+
+# Default maximum number of chat messages waiting to be handled
+MESSAGE_QUEUE_SIZE = 100
+
+# Default chat message dropped when the queue is full ('newest' or 'oldest')
+MESSAGE_QUEUE_OVERFLOW = 'newest'
+
+# Default number of users by which another channel must outnumber the current channel to automove
+AUTOMOVE_MARGIN = 1
+
+# Default time to let the channel population settle before automoving, in seconds
+AUTOMOVE_DELAY = 1.0
+
+# Default minimum time between automoves, in seconds
+AUTOMOVE_COOLDOWN = 5.0
+
+# Default delay before the first attempt to reconnect after the connection drops, in seconds
+RECONNECT_MIN_DELAY = 0.5
+
+# Default longest delay between attempts to reconnect, in seconds
+RECONNECT_MAX_DELAY = 60.0
+
+# Maximum time to wait for the server to accept a connection when checking whether it is back, in seconds
+RECONNECT_PROBE_TIMEOUT = 5.0
+
+# Maximum time to wait for the server to finish the connection handshake, in seconds
+CONNECT_TIMEOUT = 30.0
+
+# Time between checks that the Mumble thread is still connecting, in seconds
+CONNECT_POLL_INTERVAL = 0.1
+
+# Default way random clips are chosen ('uniform', 'shuffle' to play every clip before repeating one, or 'weighted')
+RANDOM_MODE = 'uniform'
+
+# Time between checks for changes to the clip directory, in seconds
+CLIP_WATCH_INTERVAL = 2.0
+
+# Name of the clip loudness and trim index within the clip store directory
+LEVELS_FILENAME = 'levels.json'
+
+# Name of the clip catalog within the clip store directory
+CATALOG_FILENAME = 'catalog.sqlite'
+
+# Default RMS level clips are normalised to, in dBFS
+TARGET_LEVEL = -20.0
+
+# Largest gain applied to a quiet clip, in dB
+MAXIMUM_GAIN = 12.0
+
+# Level below which leading and trailing audio is trimmed, in dBFS
+SILENCE_LEVEL = -50.0
+
+# Number of samples of silence kept before and after a trimmed clip (10 ms)
+TRIM_PADDING = 480
+
+# Duration of mixed audio kept queued in the sound output, in seconds
+MIXER_BUFFER_AHEAD = 0.06
+
+# Default maximum number of join, leave and link clips playing at once
+MIXER_PRIORITY_VOICES = 4
+
+# Default maximum number of chat requests playing at once
+MIXER_NORMAL_VOICES = 1
+
+# Default maximum number of requested clips waiting to play
+PLAYBACK_QUEUE_CLIPS = 30
+
+# Default maximum duration of requested clips waiting to play, in seconds
+PLAYBACK_QUEUE_DURATION = 120.0
+
+# Default duration counted for a requested clip of unknown duration when no clip's duration is known, in seconds
+UNKNOWN_CLIP_DURATION = 10.0
+
+# Number of clips of a request decoded ahead of the clip playing, decoded at once
+PLAYBACK_PREFETCH = DECODE_WORKERS
+
+# Default number of clips each user can request per minute
+RATE_LIMIT = 20.0
+
+# Default number of clips each user can request at once
+RATE_LIMIT_BURST = 10
+
+# Upper bounds of the buckets of each stage latency histogram, in seconds
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Address the metrics endpoint listens on
+METRICS_HOST = '127.0.0.1'
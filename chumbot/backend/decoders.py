@@ -0,0 +1,400 @@
+"""Decoders converting sound clip files to 48 kHz mono 16-bit PCM.
+
+Each decoder decodes whole clips both on the calling thread and as coroutines on an asyncio event loop,
+and streams clips as they are decoded on the event loop. A clip ffmpeg fails to decode raises
+subprocess.CalledProcessError, rather than returning whatever audio was decoded before it failed.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, SimpleQueue
+import subprocess as sp
+
+from chumbot.backend import constants
+
+# Names of the decoder backends
+FFMPEG = 'ffmpeg'
+FFMPEG_POOL = 'ffmpeg-pool'
+MINIAUDIO = 'miniaudio'
+AUTO = 'auto'
+
+_SAMPLE_RATE = 48000
+_SAMPLE_WIDTH = 2
+
+
+class FFmpegDecoder:
+    """Decodes sound clips by running an ffmpeg process for each clip."""
+
+    name = FFMPEG
+
+    def __init__(self):
+        """Create a new ffmpeg decoder."""
+        self.processes = 0
+
+    def decode(self, path):
+        """Return the PCM of a sound clip file.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        :raises subprocess.CalledProcessError: if ffmpeg fails to decode the clip
+        """
+        self.processes += 1
+        with open(path, 'rb') as audio_file:
+            with sp.Popen(constants.CONVERT_COMMAND, stdout=sp.PIPE,
+                          stderr=sp.DEVNULL, stdin=audio_file) as process:
+                pcm = process.stdout.read()
+
+        _check_exit(process.returncode)
+        return pcm
+
+    async def decode_async(self, path):
+        """Return the PCM of a sound clip file, decoding it with an asyncio subprocess.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        :raises subprocess.CalledProcessError: if ffmpeg fails to decode the clip
+        """
+        self.processes += 1
+        process = await _create_ffmpeg_process(path)
+        try:
+            pcm = await process.stdout.read()
+            _check_exit(await process.wait())
+        finally:
+            await _kill_process(process)
+
+        return pcm
+
+    async def stream_async(self, path, frame_size):
+        """Yield the PCM of a sound clip file in fixed-size frames as it is decoded by an asyncio subprocess.
+
+        The ffmpeg process is killed if the generator is closed before the end of the file.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        :param frame_size: the size of each frame, in bytes
+        :type frame_size: int
+        :raises subprocess.CalledProcessError: once every frame has been yielded, if ffmpeg failed to decode the clip
+        """
+        self.processes += 1
+        process = await _create_ffmpeg_process(path)
+        try:
+            while True:
+                try:
+                    yield await process.stdout.readexactly(frame_size)
+                except asyncio.IncompleteReadError as error:
+                    if error.partial:
+                        yield error.partial
+                    break
+            _check_exit(await process.wait())
+        finally:
+            await _kill_process(process)
+
+    def close(self):
+        """Release the decoder's resources. An ffmpeg process is only kept while it decodes a clip."""
+
+
+class FFmpegPoolDecoder:
+    """Decodes sound clips with ffmpeg processes started ahead of time.
+
+    ffmpeg decodes a single input per process, so the pool keeps a number of idle processes
+    already started and waiting for input. A clip is written to an idle process, and a replacement
+    is started in the background, so process startup is not paid while a clip is waiting to play.
+    """
+
+    name = FFMPEG_POOL
+
+    def __init__(self, size, timeout):
+        """Create a new ffmpeg process pool, starting its processes.
+
+        :param size: the number of idle ffmpeg processes to keep
+        :type size: int
+        :param timeout: the maximum time to decode a clip, in seconds
+        :type timeout: float
+        """
+        self._timeout = timeout
+        self._idle_processes = SimpleQueue()
+        self._spawner = ThreadPoolExecutor(max_workers=1)
+
+        self.processes = 0
+        self.restarts = 0
+        self.timeouts = 0
+
+        for _ in range(size):
+            self._idle_processes.put(self._spawn())
+
+    def decode(self, path):
+        """Return the PCM of a sound clip file.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        :raises subprocess.TimeoutExpired: if decoding takes longer than the pool timeout
+        :raises subprocess.CalledProcessError: if ffmpeg fails to decode the clip
+        """
+        audio = _read_file(path)
+        process = self._acquire()
+        try:
+            pcm, _ = process.communicate(audio, timeout=self._timeout)
+        except sp.TimeoutExpired:
+            self.timeouts += 1
+            process.kill()
+            process.communicate()
+            raise
+
+        _check_exit(process.returncode)
+        return pcm
+
+    async def decode_async(self, path):
+        """Return the PCM of a sound clip file, waiting for a pooled ffmpeg process without blocking the event loop.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.decode, path)
+
+    async def stream_async(self, path, frame_size):
+        """Yield the PCM of a sound clip file in fixed-size frames as it is decoded by a pooled ffmpeg process.
+
+        The clip is written to the process on the event loop's default executor while its output is read
+        on the event loop. The process is killed if the generator is closed before the end of the file.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        :param frame_size: the size of each frame, in bytes
+        :type frame_size: int
+        :raises subprocess.TimeoutExpired: if a frame takes longer than the pool timeout to decode
+        :raises subprocess.CalledProcessError: once every frame has been yielded, if ffmpeg failed to decode the clip
+        """
+        loop = asyncio.get_running_loop()
+        audio = await loop.run_in_executor(None, _read_file, path)
+        process = await loop.run_in_executor(None, self._acquire)
+        writer = loop.run_in_executor(None, _write_input, process, audio)
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), process.stdout)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(reader.readexactly(frame_size), self._timeout)
+                except asyncio.IncompleteReadError as error:
+                    if error.partial:
+                        yield error.partial
+                    break
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise sp.TimeoutExpired(constants.CONVERT_COMMAND, self._timeout) from None
+            _check_exit(await loop.run_in_executor(None, process.wait))
+        finally:
+            transport.close()
+            if process.poll() is None:
+                process.kill()
+            await writer
+            await loop.run_in_executor(None, process.wait)
+
+    def close(self):
+        """Kill the idle ffmpeg processes."""
+        self._spawner.shutdown()
+        while True:
+            try:
+                process = self._idle_processes.get_nowait()
+            except Empty:
+                return
+            process.kill()
+            process.communicate()
+
+    def _acquire(self):
+        """Take an idle ffmpeg process, starting a replacement in the background.
+
+        Processes that exited while idle are replaced, and a process is started on demand if none are idle.
+        """
+        while True:
+            try:
+                process = self._idle_processes.get_nowait()
+            except Empty:
+                process = self._spawn()
+
+            self._spawner.submit(self._replenish)
+            if process.poll() is None:
+                return process
+
+            self.restarts += 1
+            process.communicate()
+
+    def _replenish(self):
+        """Start an idle ffmpeg process."""
+        self._idle_processes.put(self._spawn())
+
+    def _spawn(self):
+        """Start an ffmpeg process waiting for a sound clip on its input, counting it."""
+        self.processes += 1
+        return _spawn_ffmpeg()
+
+
+class MiniaudioDecoder:
+    """Decodes sound clips in-process with the miniaudio library.
+
+    Clips miniaudio cannot decode are passed to ffmpeg instead.
+    """
+
+    name = MINIAUDIO
+
+    def __init__(self):
+        """Create a new miniaudio decoder.
+
+        :raises ImportError: if miniaudio is not installed
+        """
+        import miniaudio  # pylint: disable=import-outside-toplevel
+
+        self._miniaudio = miniaudio
+        self._fallback = FFmpegDecoder()
+
+    @property
+    def processes(self):
+        """Return the number of ffmpeg processes started for clips miniaudio cannot decode."""
+        return self._fallback.processes
+
+    def decode(self, path):
+        """Return the PCM of a sound clip file.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        """
+        try:
+            sound = self._miniaudio.decode_file(path, output_format=self._miniaudio.SampleFormat.SIGNED16,
+                                                nchannels=1, sample_rate=_SAMPLE_RATE)
+        except self._miniaudio.DecodeError:
+            return self._fallback.decode(path)
+
+        return sound.samples.tobytes()
+
+    async def decode_async(self, path):
+        """Return the PCM of a sound clip file, decoding it without blocking the event loop.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.decode, path)
+
+    async def stream_async(self, path, frame_size):
+        """Yield the PCM of a sound clip file in fixed-size frames as it is decoded.
+
+        Each frame is decoded on the event loop's default executor, so reading and decoding the file
+        does not block the event loop.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        :param frame_size: the size of each frame, in bytes
+        :type frame_size: int
+        """
+        loop = asyncio.get_running_loop()
+        frames = await loop.run_in_executor(None, self._stream_file, path, frame_size)
+        if frames is None:
+            fallback_frames = self._fallback.stream_async(path, frame_size)
+            try:
+                async for frame in fallback_frames:
+                    yield frame
+            finally:
+                await fallback_frames.aclose()
+            return
+
+        frame = await loop.run_in_executor(None, next, frames, None)
+        while frame is not None:
+            yield frame
+            frame = await loop.run_in_executor(None, next, frames, None)
+
+    def close(self):
+        """Release the decoder's resources."""
+        self._fallback.close()
+
+    def _stream_file(self, path, frame_size):
+        """Return a generator of the frames of a sound clip file, or None if miniaudio cannot decode it.
+
+        :param path: the path of the sound clip file
+        :type path: str
+        :param frame_size: the size of each frame, in bytes
+        :type frame_size: int
+        """
+        try:
+            frames = self._miniaudio.stream_file(path, output_format=self._miniaudio.SampleFormat.SIGNED16,
+                                                 nchannels=1, sample_rate=_SAMPLE_RATE,
+                                                 frames_to_read=frame_size // _SAMPLE_WIDTH)
+            first_frame = next(frames, None)
+        except self._miniaudio.DecodeError:
+            return None
+
+        return _frames_to_bytes(first_frame, frames)
+
+
+def create_decoder(backend, pool_size=constants.DECODER_POOL_SIZE, timeout=constants.DECODER_TIMEOUT):
+    """Return a decoder for a backend name, falling back to ffmpeg if the backend is unavailable.
+
+    :param backend: FFMPEG, FFMPEG_POOL, MINIAUDIO, or AUTO to use miniaudio if it is installed
+    :type backend: str
+    :param pool_size: the number of idle ffmpeg processes kept by FFMPEG_POOL
+    :type pool_size: int
+    :param timeout: the maximum time FFMPEG_POOL takes to decode a clip, in seconds
+    :type timeout: float
+    """
+    if backend == FFMPEG_POOL:
+        return FFmpegPoolDecoder(pool_size, timeout)
+
+    if backend in (MINIAUDIO, AUTO):
+        try:
+            return MiniaudioDecoder()
+        except ImportError:
+            if backend == MINIAUDIO:
+                print('miniaudio is not installed, decoding clips with ffmpeg')
+
+    return FFmpegDecoder()
+
+
+def _read_file(path):
+    """Return the contents of a file."""
+    with open(path, 'rb') as audio_file:
+        return audio_file.read()
+
+
+def _write_input(process, audio):
+    """Write a sound clip to an ffmpeg process's input and close it, ignoring a process that already exited."""
+    try:
+        process.stdin.write(audio)
+    except BrokenPipeError:
+        pass
+    try:
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+
+
+def _frames_to_bytes(first_frame, frames):
+    """Yield the bytes of a first decoded frame and of the decoded frames following it."""
+    if first_frame is not None:
+        yield first_frame.tobytes()
+        for frame in frames:
+            yield frame.tobytes()
+
+
+async def _create_ffmpeg_process(path):
+    """Start an asyncio ffmpeg subprocess decoding a sound clip file."""
+    with open(path, 'rb') as audio_file:
+        return await asyncio.create_subprocess_exec(*constants.CONVERT_COMMAND, stdin=audio_file,
+                                                    stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.DEVNULL)
+
+
+def _check_exit(returncode):
+    """Raise subprocess.CalledProcessError if an ffmpeg process exited with an error."""
+    if returncode:
+        raise sp.CalledProcessError(returncode, constants.CONVERT_COMMAND)
+
+
+async def _kill_process(process):
+    """Kill an asyncio subprocess if it is still running, and wait for it to exit."""
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    await process.wait()
+
+
+def _spawn_ffmpeg():
+    """Start an ffmpeg process waiting for a sound clip on its input."""
+    return sp.Popen(constants.CONVERT_COMMAND, stdin=sp.PIPE, stdout=sp.PIPE, stderr=sp.DEVNULL)
@@ -0,0 +1,133 @@
+"""Dispatch work submitted by Mumble users to worker tasks on an asyncio event loop."""
+import asyncio
+from collections import OrderedDict, deque
+from time import monotonic
+from traceback import print_exc
+
+# Overflow policies for a full dispatcher queue
+DROP_NEWEST = 'newest'
+DROP_OLDEST = 'oldest'
+
+
+class Dispatcher:
+    """A bounded, per-user fair work queue served by worker tasks.
+
+    Each user has their own queue, and users are served round-robin so one user cannot starve
+    the others. A user's items are handled one at a time, in the order they were submitted.
+    Every method must be called on the event loop running the workers.
+    """
+
+    def __init__(self, handler, workers, max_depth, overflow=DROP_NEWEST):
+        """Create a new dispatcher.
+
+        :param handler: the coroutine function called with each submitted item
+        :type handler: callable
+        :param workers: the number of items handled at once
+        :type workers: int
+        :param max_depth: the maximum number of queued items
+        :type max_depth: int
+        :param overflow: DROP_NEWEST to drop submitted items when full, or DROP_OLDEST to drop the
+                         oldest item of the user with the most queued items
+        :type overflow: str
+        """
+        self._handler = handler
+        self._max_depth = max_depth
+        self._overflow = overflow
+        self._worker_count = workers
+        self._workers = []
+
+        self._queues = OrderedDict()
+        self._busy_users = set()
+        self._waiters = deque()
+        self._depth = 0
+
+        self.peak_depth = 0
+        self.dropped = 0
+        self.handled = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def depth(self):
+        """Return the number of queued items."""
+        return self._depth
+
+    def start(self):
+        """Start the worker tasks on the running event loop."""
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(self._worker_count)]
+
+    async def stop(self):
+        """Cancel the worker tasks, discarding queued items."""
+        self._queues.clear()
+        self._depth = 0
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, user, item):
+        """Queue an item to be handled on behalf of a user.
+
+        :param user: the user submitting the item
+        :type user: hashable
+        :param item: the item to pass to the handler
+        :return: whether the item was queued
+        """
+        if self._depth >= self._max_depth:
+            if self._overflow != DROP_OLDEST:
+                self.dropped += 1
+                return False
+            longest_queue = max(self._queues.values(), key=len)
+            longest_queue.popleft()
+            self._depth -= 1
+            self.dropped += 1
+
+        self._queues.setdefault(user, deque()).append((monotonic(), item))
+        self._depth += 1
+        self.peak_depth = max(self.peak_depth, self._depth)
+        self._wake()
+        return True
+
+    def _wake(self):
+        """Wake a worker waiting for an item."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def _next(self):
+        """Wait for and remove the next item of the next idle user in round-robin order."""
+        while True:
+            for user, queue in self._queues.items():
+                if user not in self._busy_users and queue:
+                    break
+            else:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                await waiter
+                continue
+
+            queued_at, item = queue.popleft()
+            self._depth -= 1
+            self._busy_users.add(user)
+            del self._queues[user]
+            if queue:
+                self._queues[user] = queue
+            return user, queued_at, item
+
+    async def _work(self):
+        """Handle queued items until cancelled."""
+        while True:
+            user, queued_at, item = await self._next()
+            try:
+                await self._handler(item)
+            except Exception:  # pylint: disable=broad-except
+                print_exc()
+            finally:
+                latency = monotonic() - queued_at
+                self._busy_users.discard(user)
+                self.handled += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+                self._wake()
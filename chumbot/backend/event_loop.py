@@ -0,0 +1,86 @@
+"""Run an asyncio event loop on a background thread, shared by the Mumble clients in the process."""
+import asyncio
+from concurrent.futures import Future
+from threading import Thread, current_thread
+
+
+class EventLoop:
+    """An asyncio event loop running on its own thread.
+
+    Chat messages, playback requests, decoding and automove timers run as tasks on the loop. Other
+    threads, such as the pymumble thread and the interactive shell, hand work to the loop with
+    call_soon, call or run.
+    """
+
+    def __init__(self):
+        """Create a new event loop. The loop does not run until it is started."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    @property
+    def loop(self):
+        """Return the underlying asyncio event loop."""
+        return self._loop
+
+    def start(self):
+        """Start running the event loop on its thread."""
+        self._thread.start()
+
+    def stop(self):
+        """Cancel every task on the event loop, wait for them to finish and stop the loop."""
+        if self._thread.is_alive():
+            self.run(_cancel_tasks()).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._loop.close()
+
+    def call_soon(self, callback, *args):
+        """Schedule a function to be called on the event loop, from any thread.
+
+        :param callback: the function to call
+        :type callback: callable
+        """
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    def call(self, function, *args):
+        """Call a function on the event loop and return its result, waiting for it from another thread.
+
+        :param function: the function to call
+        :type function: callable
+        """
+        if current_thread() is self._thread:
+            return function(*args)
+
+        future = Future()
+
+        def call_function():
+            try:
+                future.set_result(function(*args))
+            except Exception as error:  # pylint: disable=broad-except
+                future.set_exception(error)
+
+        self._loop.call_soon_threadsafe(call_function)
+        return future.result()
+
+    def run(self, coroutine):
+        """Run a coroutine as a task on the event loop, from any thread.
+
+        :param coroutine: the coroutine to run
+        :type coroutine: coroutine
+        :return: a future holding the coroutine's result
+        :rtype: concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def _run(self):
+        """Run the event loop until it is stopped."""
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+
+async def _cancel_tasks():
+    """Cancel every other task on the running event loop and wait for them to finish."""
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
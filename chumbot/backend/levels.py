@@ -0,0 +1,111 @@
+"""Compute and store the loudness gain and silence trim of each sound clip."""
+import json
+from os import fdopen, remove, replace
+from os.path import dirname
+from tempfile import mkstemp
+from threading import Lock
+
+from chumbot.backend import pcm as pcm_ops
+
+_FULL_SCALE = 32768
+
+
+class ClipLevels:
+    """A sidecar index of the gain and trim offsets that normalise each sound clip.
+
+    Each clip is analysed once, and its levels are tagged with the modification time and size of
+    the clip file they were computed from, so they are recomputed only when the file changes.
+    """
+
+    def __init__(self, path, target_level, max_gain, silence_level, padding):
+        """Create a new clip level index, loading it from disk if it exists.
+
+        :param path: the path of the index file
+        :type path: str
+        :param target_level: the RMS level to normalise clips to, in dBFS
+        :type target_level: float
+        :param max_gain: the largest gain to apply to a quiet clip, in dB
+        :type max_gain: float
+        :param silence_level: the level below which leading and trailing audio is trimmed, in dBFS
+        :type silence_level: float
+        :param padding: the number of samples of silence to keep before and after a clip
+        :type padding: int
+        """
+        self._path = path
+        self._target_rms = _FULL_SCALE * 10 ** (target_level / 20)
+        self._max_gain = 10 ** (max_gain / 20)
+        self._silence_threshold = int(_FULL_SCALE * 10 ** (silence_level / 20))
+        self._padding = padding
+        self._lock = Lock()
+        self._levels = {}
+
+        try:
+            with open(path) as levels_file:
+                self._levels = json.load(levels_file)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, name, stamp):
+        """Return the (gain, start, end) levels of a clip, or None if it has not been analysed.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        :param stamp: the (mtime, size) of the clip file
+        :type stamp: tuple
+        """
+        entry = self._levels.get(name)
+        if entry is None or (entry['mtime'], entry['size']) != tuple(stamp):
+            return None
+        return entry['gain'], entry['start'], entry['end']
+
+    def analyze(self, name, stamp, pcm):
+        """Compute and record the levels of a clip from its decoded PCM.
+
+        The gain brings the clip's RMS level to the target level without clipping its peak, and the
+        trim offsets remove leading and trailing silence.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        :param stamp: the (mtime, size) of the clip file the PCM was decoded from
+        :type stamp: tuple
+        :param pcm: the decoded PCM audio
+        :type pcm: bytes
+        """
+        peak, rms, start, end = pcm_ops.analyze(pcm, self._silence_threshold)
+        gain = 1.0
+        if rms and peak:
+            gain = min(self._target_rms / rms, self._max_gain, (_FULL_SCALE - 1) / peak)
+        if start == end:
+            start, end = 0, len(pcm) // pcm_ops.SAMPLE_WIDTH
+        start = max(start - self._padding, 0)
+        end = min(end + self._padding, len(pcm) // pcm_ops.SAMPLE_WIDTH)
+
+        with self._lock:
+            self._levels[name] = {'mtime': stamp[0], 'size': stamp[1], 'gain': gain, 'start': start, 'end': end}
+
+    def prune(self, names):
+        """Remove the levels of every clip not among the given names.
+
+        :param names: the extensionless names of the sound clips to keep
+        :type names: collection
+        """
+        with self._lock:
+            for name in [name for name in self._levels if name not in names]:
+                del self._levels[name]
+
+    def save(self):
+        """Write the index to disk through a uniquely named temporary file, replacing the index at once."""
+        with self._lock:
+            try:
+                fd, temporary_path = mkstemp(suffix='.tmp', dir=dirname(self._path))
+            except OSError:
+                return
+            try:
+                with fdopen(fd, 'w') as levels_file:
+                    json.dump(self._levels, levels_file)
+                replace(temporary_path, self._path)
+            except OSError:
+                try:
+                    remove(temporary_path)
+                except OSError:
+                    pass
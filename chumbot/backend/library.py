@@ -0,0 +1,534 @@
+"""Sound clips and their decoded audio, shared by every Mumble client in the process."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from os.path import expanduser, join
+import subprocess as sp
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from chumbot.backend.catalog import ClipCatalog
+from chumbot.backend.clip_watcher import ClipWatcher
+from chumbot.backend.clips import Clips, normalize_name
+from chumbot.backend.levels import ClipLevels
+from chumbot.backend.metrics import Metrics
+from chumbot.backend import opus
+from chumbot.backend import pcm as pcm_ops
+from chumbot.backend.pcm_cache import PCMCache
+from chumbot.backend.pcm_store import PCMStore
+from chumbot.backend import constants
+
+_PCM_BYTES_PER_SECOND = 48000 * pcm_ops.SAMPLE_WIDTH
+
+
+class ClipLibrary:
+    """Loads sound clips and decodes them, keeping decoded clips in memory and on disk.
+
+    Link, join and leave clips can be pinned, keeping them decoded in memory so they play immediately.
+    Pinned clips are decoded again when their clip files change. Decoded clips can also be encoded to
+    Opus packets once per encoding, which are kept in memory and on disk alongside the decoded clips.
+    The clips are saved to a catalog in the clip store and loaded from it at startup, and the clip
+    directory is then scanned only if clips were added, removed or renamed since. Loading can happen in
+    the background, so that scanning a large directory does not hold up connecting. The library also
+    holds the metrics shared by the clients playing its clips.
+    """
+
+    def __init__(self, clip_directory, decoder, cache_size, watch=False, normalize=False,
+                 target_level=constants.TARGET_LEVEL, background_scan=False, picker=None):
+        """Create a new clip library, loading the sound clips in a directory.
+
+        :param clip_directory: the directory containing the sound clips
+        :type clip_directory: str
+        :param decoder: the decoder converting clip files to PCM
+        :type decoder: chumbot.backend.decoders.FFmpegDecoder
+        :param cache_size: the maximum size of decoded clips kept in memory, in bytes
+        :type cache_size: int
+        :param watch: apply changes to the clip directory as they happen
+        :type watch: bool
+        :param normalize: even out the loudness of clips and trim their silence
+        :type normalize: bool
+        :param target_level: the RMS level to normalise clips to, in dBFS
+        :type target_level: float
+        :param background_scan: scan the clip directory on a background thread instead of before returning
+        :type background_scan: bool
+        :param picker: the picker to choose random clips with, or None for a uniform picker
+        :type picker: chumbot.backend.random_clips.ClipPicker
+        """
+        self._decoder = decoder
+        self._store_directory = join(expanduser(clip_directory), constants.PCM_STORE_DIRECTORY)
+        catalog = ClipCatalog(join(self._store_directory, constants.CATALOG_FILENAME))
+        self.clips = Clips(clip_directory, constants.SOUND_FILE_EXTENSION, load=False, catalog=catalog,
+                           picker=picker)
+        self.pcm_cache = PCMCache(cache_size)
+        self.packet_cache = PCMCache(constants.PACKET_CACHE_SIZE * 1024 * 1024)
+        self.metrics = Metrics()
+        self._add_gauges()
+        self.clips.add_reload_callback(self.pcm_cache.invalidate)
+        self.clips.add_reload_callback(self.packet_cache.invalidate)
+        self.clips.add_reload_callback(self._repin)
+        self._pinned_pcm = {}
+        self._pinned_packets = {}
+        self._pin_lock = Lock()
+        self._clip_watcher = ClipWatcher(self.clips, constants.CLIP_WATCH_INTERVAL) if watch else None
+        self._scanned = Event()
+        self._closed = False
+        self.pcm_store = PCMStore(self._store_directory)
+        self._packet_stores = {}
+        self._packet_store_lock = Lock()
+        self.decode_pool = ThreadPoolExecutor(max_workers=constants.DECODE_WORKERS)
+        self._clip_levels = None
+        self._ingest_lock = Lock()
+        if normalize:
+            self._clip_levels = ClipLevels(join(self._store_directory, constants.LEVELS_FILENAME), target_level,
+                                           constants.MAXIMUM_GAIN, constants.SILENCE_LEVEL, constants.TRIM_PADDING)
+            self.clips.add_reload_callback(self._start_ingest)
+
+        if background_scan:
+            Thread(target=self._scan, daemon=True).start()
+        else:
+            self._scan()
+
+    def wait_for_scan(self):
+        """Wait until the clip directory has been scanned."""
+        self._scanned.wait()
+
+    def get_pcm(self, sound_clip):
+        """Return the decoded PCM of a sound clip, decoding it only if it is not cached or stored.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        :return: the PCM audio, or None if the clip cannot be decoded
+        """
+        stamp = self.clips.stamp(sound_clip)
+        pcm = self._lookup_pcm(sound_clip, stamp)
+        if pcm is None:
+            pcm = self._decode(self.clips[sound_clip])
+            if pcm is None:
+                return None
+            self._store_pcm(sound_clip, stamp, pcm)
+        return self._apply_levels(sound_clip, stamp, pcm)
+
+    async def get_pcm_async(self, sound_clip):
+        """Return the decoded PCM of a sound clip, decoding it on the event loop if it is not cached or stored.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        :return: the PCM audio, or None if the clip cannot be decoded
+        """
+        stamp = self.clips.stamp(sound_clip)
+        pcm = self._lookup_pcm(sound_clip, stamp)
+        if pcm is None:
+            pcm = await self._decode_async(sound_clip)
+            if pcm is None:
+                return None
+            self._store_pcm(sound_clip, stamp, pcm)
+        return self._apply_levels(sound_clip, stamp, pcm)
+
+    async def stream_async(self, sound_clip):
+        """Yield the decoded PCM of a sound clip, in frames as it is decoded if it is not cached or stored.
+
+        A cached or stored clip is yielded whole. A decoded clip is stored once every frame has been
+        yielded, unless decoding failed part way. Clips with computed levels are decoded whole instead,
+        so they can be trimmed.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        """
+        stamp = self.clips.stamp(sound_clip)
+        pcm = self._lookup_pcm(sound_clip, stamp)
+        if pcm is None and self._clip_levels is not None and self._clip_levels.get(sound_clip, stamp):
+            pcm = await self._decode_async(sound_clip)
+            if pcm is None:
+                return
+            self._store_pcm(sound_clip, stamp, pcm)
+        if pcm is not None:
+            yield self._apply_levels(sound_clip, stamp, pcm)
+            return
+
+        frames = []
+        start_time = monotonic()
+        stream = self._decoder.stream_async(self.clips.path(sound_clip), constants.STREAM_FRAME_SIZE)
+        try:
+            async for frame in stream:
+                if not frames:
+                    self.metrics.observe('stream_start', monotonic() - start_time)
+                yield frame
+                frames.append(frame)
+        except sp.CalledProcessError:
+            self.metrics.increment('decode_failures')
+            return
+        finally:
+            await stream.aclose()
+
+        if frames:
+            self._store_pcm(sound_clip, stamp, b''.join(frames))
+        else:
+            self.metrics.increment('decode_failures')
+
+    async def get_packets_async(self, sound_clip, encoding):
+        """Return the decoded PCM of a sound clip and the Opus packets encoding it, encoding it if needed.
+
+        The clip is decoded if it is not cached or stored, and encoded if its packets are not cached or stored.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        :param encoding: the (bitrate, frame duration, profile) to encode the packets with
+        :type encoding: tuple
+        :return: the PCM audio and the list of packets, or None and None if the clip cannot be decoded
+        """
+        pcm = await self.get_pcm_async(sound_clip)
+        if pcm is None:
+            return None, None
+        stamp = self.clips.stamp(sound_clip)
+        packed = self.packet_cache.get(sound_clip, (stamp, encoding))
+        if packed is None:
+            source_path = self.clips.path(sound_clip)
+            packet_store = self._packet_store(encoding)
+            packed = packet_store.get(sound_clip, source_path, stamp)
+            if packed is None:
+                with self.metrics.time('encode'):
+                    packets = await asyncio.get_running_loop().run_in_executor(self.decode_pool, opus.encode,
+                                                                               pcm, encoding)
+                packed = opus.pack(packets)
+                packet_store.put(sound_clip, source_path, stamp, packed)
+            self.packet_cache.put(sound_clip, (stamp, encoding), packed)
+        return pcm, opus.unpack(packed)
+
+    def decoded(self, sound_clip):
+        """Return whether a sound clip's decoded PCM is in the on-disk clip store, so it need not be decoded.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        """
+        return self.pcm_store.is_current(sound_clip, self.clips.path(sound_clip), self.clips.stamp(sound_clip))
+
+    def duration(self, sound_clip):
+        """Return the duration of a sound clip in seconds, or 0 if it has never been decoded.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        """
+        duration = self._known_duration(sound_clip)
+        return duration if duration is not None else 0.0
+
+    def estimated_duration(self, sound_clip, unknown_duration):
+        """Return the duration of a sound clip in seconds, or an upper estimate if it has never been decoded.
+
+        A clip never decoded counts as long as the longest clip decoded, or as the unknown duration if
+        no clip has been decoded yet.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        :param unknown_duration: the duration to count a clip as when no clip's duration is known, in seconds
+        :type unknown_duration: float
+        """
+        duration = self._known_duration(sound_clip)
+        if duration is not None:
+            return duration
+        longest = self.clips.longest_duration()
+        return longest if longest is not None else unknown_duration
+
+    def pin(self, event_clips):
+        """Decode link, join and leave clips that are not already pinned and keep them in memory.
+
+        Any sound clips that do not exist or cannot be decoded are printed.
+
+        :param event_clips: the extensionless names of the sound clips of each event, separated by commas
+        :type event_clips: iterable
+        """
+        with self._pin_lock:
+            self._pin([event_clip for event_clip in event_clips if event_clip not in self._pinned_pcm])
+
+    def pinned(self, event_clip):
+        """Return the decoded PCM of a pinned link, join or leave clip, or None if it is not pinned.
+
+        :param event_clip: the extensionless names of the sound clips, separated by commas
+        :type event_clip: str
+        """
+        return self._pinned_pcm.get(event_clip)
+
+    def pinned_packets(self, event_clip, encoding):
+        """Return the Opus packets of a pinned link, join or leave clip, or None if it is not encoded yet.
+
+        A pinned clip not yet encoded with the encoding is encoded in the background.
+
+        :param event_clip: the extensionless names of the sound clips, separated by commas
+        :type event_clip: str
+        :param encoding: the (bitrate, frame duration, profile) of the packets
+        :type encoding: tuple
+        """
+        with self._pin_lock:
+            entry = self._pinned_packets.get(event_clip)
+            if entry is not None and entry[0] == encoding:
+                return entry[1]
+            pcm = self._pinned_pcm.get(event_clip)
+            if pcm is not None and entry != (encoding, None):
+                # Mark the clip as being encoded, so it is encoded once
+                self._pinned_packets[event_clip] = (encoding, None)
+                self.decode_pool.submit(self._encode_pinned, event_clip, pcm, encoding)
+        return None
+
+    def warm(self):
+        """Decode every sound clip missing from the on-disk clip store, recording their durations in the catalog.
+
+        :return: the number of clips decoded
+        """
+        decoded = self.pcm_store.warm(self.clips, self._decode, constants.DECODE_WORKERS)
+        for sound_clip in list(self.clips):
+            size = self.pcm_store.stored_size(sound_clip)
+            if size is not None and self.clips.duration(sound_clip) is None:
+                try:
+                    self.clips.set_duration(sound_clip, self.clips.stamp(sound_clip), size / _PCM_BYTES_PER_SECOND)
+                except (KeyError, OSError):
+                    pass
+        self.clips.save_catalog()
+        return decoded
+
+    def save(self):
+        """Save the clip catalog and the clip store manifests, with any changes since they were last saved."""
+        if self._scanned.is_set():
+            self.clips.save_catalog()
+        self.pcm_store.save()
+        with self._packet_store_lock:
+            packet_stores = list(self._packet_stores.values())
+        for packet_store in packet_stores:
+            packet_store.save()
+
+    def close(self):
+        """Stop watching the clip directory, save the catalog and clip stores, and close the decoder."""
+        self._closed = True
+        if self._clip_watcher is not None:
+            self._clip_watcher.stop()
+        self.save()
+        self._decoder.close()
+
+    def _decode(self, audio_filename):
+        """Convert a sound clip file's contents to PCM, returning None if it cannot be decoded or has no audio.
+
+        :param audio_filename: the name of the sound clip file within the clip directory
+        :type audio_filename: str
+        """
+        try:
+            with self.metrics.time('decode'):
+                pcm = self._decoder.decode(join(self.clips.directory, audio_filename))
+        except sp.CalledProcessError:
+            pcm = None
+        if not pcm:
+            self.metrics.increment('decode_failures')
+            return None
+        return pcm
+
+    async def _decode_async(self, sound_clip):
+        """Convert a sound clip to PCM on the event loop, returning None if it cannot be decoded or has no audio.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        """
+        try:
+            with self.metrics.time('decode'):
+                pcm = await self._decoder.decode_async(self.clips.path(sound_clip))
+        except sp.CalledProcessError:
+            pcm = None
+        if not pcm:
+            self.metrics.increment('decode_failures')
+            return None
+        return pcm
+
+    def _scan(self):
+        """Load the sound clips, then start watching the clip directory for changes if set to.
+
+        The clips are loaded from the catalog if it was saved, and are playable before the catalog is
+        validated against the clip directory. Otherwise, the clip directory is scanned. Loading the
+        clips computes the levels of any clips not yet analysed, if clips are normalised.
+        """
+        try:
+            with self.metrics.time('clip_scan'):
+                from_catalog = self.clips.load_catalog()
+                if not from_catalog:
+                    self.clips.load()
+            if from_catalog:
+                self._scanned.set()
+                with self.metrics.time('clip_validate'):
+                    self.clips.validate()
+        except OSError as error:
+            print('Could not load the clips in {}: {}'.format(self.clips.directory, error.strerror))
+            return
+        finally:
+            self._scanned.set()
+
+        if self._clip_watcher is not None and not self._closed:
+            self._clip_watcher.start()
+
+    def _add_gauges(self):
+        """Add gauges reporting the decoded clip cache and the decoder's process counts."""
+        cache = self.pcm_cache
+        self.metrics.add_gauge('cache_clips', cache.__len__)
+        self.metrics.add_gauge('cache_bytes', lambda: cache.size)
+        self.metrics.add_gauge('cache_hits', lambda: cache.hits)
+        self.metrics.add_gauge('cache_misses', lambda: cache.misses)
+        self.metrics.add_gauge('cache_hit_ratio', lambda: cache.hits / max(cache.hits + cache.misses, 1))
+        for counter in ('processes', 'restarts', 'timeouts'):
+            if hasattr(self._decoder, counter):
+                self.metrics.add_gauge('decoder_' + counter, partial(getattr, self._decoder, counter))
+
+    def _encode_pinned(self, event_clip, pcm, encoding):
+        """Encode a pinned clip's PCM to Opus packets, keeping them unless the clip was pinned again meanwhile."""
+        with self.metrics.time('encode'):
+            packets = opus.encode(pcm, encoding)
+        with self._pin_lock:
+            if self._pinned_pcm.get(event_clip) is pcm:
+                self._pinned_packets[event_clip] = (encoding, packets)
+
+    def _packet_store(self, encoding):
+        """Return the on-disk store of the Opus packets of an encoding."""
+        with self._packet_store_lock:
+            packet_store = self._packet_stores.get(encoding)
+            if packet_store is None:
+                packet_store = PCMStore(join(self._store_directory, opus.store_name(encoding)))
+                self._packet_stores[encoding] = packet_store
+        return packet_store
+
+    def _drop_packets(self, sound_clips):
+        """Drop the cached and stored Opus packets of sound clips whose levels changed.
+
+        :param sound_clips: the extensionless names of the sound clips
+        :type sound_clips: list
+        """
+        self.packet_cache.invalidate(sound_clips)
+        with self._packet_store_lock:
+            packet_stores = list(self._packet_stores.values())
+        kept_clips = set(self.clips).difference(sound_clips)
+        for packet_store in packet_stores:
+            packet_store.prune(kept_clips)
+
+    def _pin(self, event_clips):
+        """Decode link, join and leave clips and keep them in memory, printing any clips missing or undecodable.
+
+        :param event_clips: the extensionless names of the sound clips of each event, separated by commas
+        :type event_clips: iterable
+        """
+        missing_clips = set()
+        failed_clips = set()
+        for event_clip in event_clips:
+            sound_clips = [normalize_name(sound_clip) for sound_clip in event_clip.split(',')]
+            missing_clips.update(sound_clip for sound_clip in sound_clips if sound_clip not in self.clips)
+            found_clips = [sound_clip for sound_clip in sound_clips if sound_clip in self.clips]
+            decoded_clips = list(zip(found_clips, self.decode_pool.map(self.get_pcm, found_clips)))
+            failed_clips.update(sound_clip for sound_clip, pcm in decoded_clips if pcm is None)
+            self._pinned_pcm[event_clip] = b''.join(pcm for _, pcm in decoded_clips if pcm is not None)
+            self._pinned_packets.pop(event_clip, None)
+
+        if missing_clips:
+            print('Configured clips not found:', ', '.join(sorted(missing_clips)))
+        if failed_clips:
+            print('Configured clips could not be decoded:', ', '.join(sorted(failed_clips)))
+
+    def _repin(self, sound_clips):
+        """Decode the pinned link, join and leave clips again if any of their sound clips changed.
+
+        :param sound_clips: the extensionless names of the changed sound clips
+        :type sound_clips: iterable
+        """
+        sound_clips = set(sound_clips)
+        with self._pin_lock:
+            changed_event_clips = [event_clip for event_clip in self._pinned_pcm
+                                   if sound_clips.intersection(map(normalize_name, event_clip.split(',')))]
+            if changed_event_clips:
+                self._pin(changed_event_clips)
+
+    def _apply_levels(self, sound_clip, stamp, pcm):
+        """Return the decoded PCM of a sound clip with its loudness gain and silence trim applied, if computed.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        :param stamp: the (mtime, size) of the sound clip file the PCM was decoded from
+        :type stamp: tuple
+        :param pcm: the decoded PCM audio
+        :type pcm: bytes
+        """
+        if self._clip_levels is not None:
+            levels = self._clip_levels.get(sound_clip, stamp)
+            if levels is not None:
+                return pcm_ops.apply_levels(pcm, *levels)
+        return pcm
+
+    def _start_ingest(self, sound_clips):
+        """Compute the loudness gain and silence trim of sound clips in the background.
+
+        :param sound_clips: the extensionless names of the sound clips
+        :type sound_clips: iterable
+        """
+        Thread(target=self._ingest, args=(list(sound_clips),), daemon=True).start()
+
+    def _ingest(self, sound_clips):
+        """Compute the loudness gain and silence trim of sound clips that have not been analysed.
+
+        Each clip is decoded once into the on-disk clip store, and the pinned clips are decoded again
+        with their new levels.
+
+        :param sound_clips: the extensionless names of the sound clips
+        :type sound_clips: list
+        """
+        with self._ingest_lock:
+            analyzed_clips = []
+            for sound_clip in sound_clips:
+                try:
+                    stamp = self.clips.stamp(sound_clip)
+                except (KeyError, OSError):
+                    continue
+                if self._clip_levels.get(sound_clip, stamp) is not None:
+                    continue
+
+                source_path = self.clips.path(sound_clip)
+                pcm = self.pcm_store.get(sound_clip, source_path, stamp)
+                if pcm is None:
+                    pcm = self._decode(self.clips[sound_clip])
+                    if pcm is None:
+                        continue
+                    self.pcm_store.put(sound_clip, source_path, stamp, pcm)
+                self._clip_levels.analyze(sound_clip, stamp, pcm)
+                analyzed_clips.append(sound_clip)
+
+            self._clip_levels.prune(self.clips)
+            self._clip_levels.save()
+            if analyzed_clips:
+                self._drop_packets(analyzed_clips)
+            self._repin(analyzed_clips)
+
+    def _lookup_pcm(self, sound_clip, stamp):
+        """Return the cached or stored PCM of a sound clip, or None if it must be decoded.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        :param stamp: the (mtime, size) of the sound clip file
+        :type stamp: tuple
+        """
+        pcm = self.pcm_cache.get(sound_clip, stamp)
+        if pcm is None:
+            pcm = self.pcm_store.get(sound_clip, self.clips.path(sound_clip), stamp)
+            if pcm is not None:
+                self.pcm_cache.put(sound_clip, stamp, pcm)
+                self.clips.set_duration(sound_clip, stamp, len(pcm) / _PCM_BYTES_PER_SECOND)
+        return pcm
+
+    def _known_duration(self, sound_clip):
+        """Return the duration of a sound clip in seconds, from the catalog or the clip store, or None."""
+        duration = self.clips.duration(sound_clip)
+        if duration is not None:
+            return duration
+        size = self.pcm_store.stored_size(sound_clip)
+        return size / _PCM_BYTES_PER_SECOND if size else None
+
+    def _store_pcm(self, sound_clip, stamp, pcm):
+        """Cache and store the decoded PCM of a sound clip.
+
+        :param sound_clip: the extensionless name of the sound clip
+        :type sound_clip: str
+        :param stamp: the (mtime, size) of the sound clip file the PCM was decoded from
+        :type stamp: tuple
+        :param pcm: the decoded PCM audio
+        :type pcm: bytes
+        """
+        self.pcm_store.put(sound_clip, self.clips.path(sound_clip), stamp, pcm)
+        self.pcm_cache.put(sound_clip, stamp, pcm)
+        self.clips.set_duration(sound_clip, stamp, len(pcm) / _PCM_BYTES_PER_SECOND)
@@ -0,0 +1,241 @@
+"""Count events and time each stage between a chat message and its audio, for the stats commands."""
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+
+from chumbot.backend import constants
+
+_PREFIX = 'chumbot_'
+_MAX_REQUEST_SIZE = 8192
+
+
+class Histogram:
+    """Counts of observed durations in fixed buckets, for estimating percentiles."""
+
+    def __init__(self, bounds):
+        """Create a new, empty histogram.
+
+        :param bounds: the upper bound of each bucket, in ascending order
+        :type bounds: tuple
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, value):
+        """Record an observed value.
+
+        :param value: the observed value
+        :type value: float
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, fraction):
+        """Return an upper estimate of a percentile: the bound of the bucket holding it.
+
+        :param fraction: the percentile, between 0 and 1
+        :type fraction: float
+        """
+        rank = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            seen += bucket_count
+            if seen and seen >= rank:
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def copy(self):
+        """Return a copy of the histogram."""
+        histogram = Histogram(self.bounds)
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.total = self.total
+        histogram.maximum = self.maximum
+        return histogram
+
+
+class Metrics:
+    """Counters, stage latency histograms and gauges, shared by the clients in a process.
+
+    Counters and histograms can be updated from any thread. Gauges are functions read whenever the
+    metrics are reported, and are labelled with the instance they describe, if any.
+    """
+
+    def __init__(self, buckets=constants.METRICS_BUCKETS):
+        """Create a new, empty set of metrics.
+
+        :param buckets: the upper bound of each histogram bucket, in seconds
+        :type buckets: tuple
+        """
+        self._buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = Lock()
+
+    def increment(self, name, amount=1):
+        """Add to a counter.
+
+        :param name: the name of the counter
+        :type name: str
+        :param amount: the amount to add
+        :type amount: int
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        """Record the duration of a stage.
+
+        :param name: the name of the stage
+        :type name: str
+        :param seconds: the duration, in seconds
+        :type seconds: float
+        """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self._buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, name):
+        """Record the duration of a block as the duration of a stage.
+
+        :param name: the name of the stage
+        :type name: str
+        """
+        start_time = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, monotonic() - start_time)
+
+    def add_gauge(self, name, function, instance=None):
+        """Add a gauge, read by calling a function whenever the metrics are reported.
+
+        :param name: the name of the gauge
+        :type name: str
+        :param function: the function returning the gauge's value
+        :type function: callable
+        :param instance: the name of the instance the gauge describes, or None
+        :type instance: str
+        """
+        with self._lock:
+            self._gauges[name, instance] = function
+
+    def remove_gauges(self, instance):
+        """Remove every gauge describing an instance.
+
+        :param instance: the name of the instance
+        :type instance: str
+        """
+        with self._lock:
+            for key in [key for key in self._gauges if key[1] == instance]:
+                del self._gauges[key]
+
+    def counters(self):
+        """Return a copy of the counters, by name."""
+        with self._lock:
+            return dict(self._counters)
+
+    def histograms(self):
+        """Return a copy of the stage latency histograms, by stage name."""
+        with self._lock:
+            return {name: histogram.copy() for name, histogram in self._histograms.items()}
+
+    def gauges(self, instance=None):
+        """Return the (name, instance, value) of each gauge.
+
+        :param instance: the name of an instance to report only its gauges and those describing no instance,
+                         or None to report every gauge
+        :type instance: str
+        """
+        with self._lock:
+            gauges = sorted(self._gauges.items(), key=lambda item: (item[0][0], item[0][1] or ''))
+        return [(name, gauge_instance, function()) for (name, gauge_instance), function in gauges
+                if instance is None or gauge_instance in (None, instance)]
+
+    def summary(self, instance=None):
+        """Return lines of text summarising the metrics.
+
+        :param instance: the name of an instance to report only its gauges, or None to report every gauge
+        :type instance: str
+        """
+        lines = []
+        for name, histogram in sorted(self.histograms().items()):
+            lines.append('{}: {} in {:.3f}s, p50 {:.3f}s, p99 {:.3f}s, max {:.3f}s'.format(
+                name, histogram.count, histogram.total, histogram.percentile(0.5),
+                histogram.percentile(0.99), histogram.maximum))
+        for name, value in sorted(self.counters().items()):
+            lines.append('{}: {}'.format(name, value))
+        for name, gauge_instance, value in self.gauges(instance):
+            label = name if instance is not None or gauge_instance is None else '{}[{}]'.format(name, gauge_instance)
+            lines.append('{}: {}'.format(label, _format_value(value)))
+        return lines
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, value in sorted(self.counters().items()):
+            lines.append('# TYPE {}{}_total counter'.format(_PREFIX, name))
+            lines.append('{}{}_total {}'.format(_PREFIX, name, value))
+        for name, histogram in sorted(self.histograms().items()):
+            metric = _PREFIX + name + '_seconds'
+            lines.append('# TYPE {} histogram'.format(metric))
+            cumulative_count = 0
+            for bound, bucket_count in zip(histogram.bounds, histogram.counts):
+                cumulative_count += bucket_count
+                lines.append('{}_bucket{{le="{}"}} {}'.format(metric, bound, cumulative_count))
+            lines.append('{}_bucket{{le="+Inf"}} {}'.format(metric, histogram.count))
+            lines.append('{}_sum {}'.format(metric, histogram.total))
+            lines.append('{}_count {}'.format(metric, histogram.count))
+        typed_gauges = set()
+        for name, instance, value in self.gauges():
+            if name not in typed_gauges:
+                typed_gauges.add(name)
+                lines.append('# TYPE {}{} gauge'.format(_PREFIX, name))
+            label = '' if instance is None else '{{instance="{}"}}'.format(instance)
+            lines.append('{}{}{} {}'.format(_PREFIX, name, label, float(value)))
+        return '\n'.join(lines) + '\n'
+
+
+async def serve(metrics, host, port):
+    """Start serving the metrics over HTTP in the Prometheus text format.
+
+    Every request is answered with the metrics, whatever its path.
+
+    :param metrics: the metrics to serve
+    :type metrics: Metrics
+    :param host: the address to listen on
+    :type host: str
+    :param port: the port to listen on
+    :type port: int
+    :return: the server, closed to stop serving
+    """
+    async def handle_request(reader, writer):
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            body = metrics.render().encode()
+            writer.write(b'HTTP/1.0 200 OK\r\n'
+                         b'Content-Type: text/plain; version=0.0.4\r\n'
+                         b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_request, host, port, limit=_MAX_REQUEST_SIZE)
+
+
+def _format_value(value):
+    """Return a gauge value as text, with fractions rounded."""
+    return '{:.3f}'.format(value) if isinstance(value, float) else str(value)
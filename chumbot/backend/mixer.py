@@ -0,0 +1,295 @@
+"""Mix several voices of PCM audio into the Mumble sound output in real time."""
+from collections import deque
+from itertools import count
+from threading import Condition, Lock, Thread
+
+from chumbot.backend import opus
+from chumbot.backend import pcm as pcm_ops
+
+# Mixer lanes
+PRIORITY = 'priority'
+NORMAL = 'normal'
+
+_SAMPLE_RATE = 48000
+
+
+class Voice:
+    """A stream of PCM audio played by the mixer.
+
+    Audio can be fed to a voice while it plays. A voice starts playing once its first audio is fed
+    to it, and a voice that then runs out of audio before it is finished plays silence until more
+    audio is fed to it. Audio can be fed along with the Opus packets it was encoded to ahead of time,
+    to be sent without encoding it again.
+    """
+
+    def __init__(self, voice_id, lane, label, on_change=None):
+        """Create a new, empty voice.
+
+        :param voice_id: the voice's unique ID
+        :type voice_id: int
+        :param lane: the mixer lane the voice plays in
+        :type lane: str
+        :param label: a description of the voice's audio
+        :type label: str
+        :param on_change: a function called when audio is fed to the voice or it is finished or cancelled
+        :type on_change: callable
+        """
+        self.voice_id = voice_id
+        self.lane = lane
+        self.label = label
+        self.active = False
+        self.started = False
+        self.cancelled = False
+
+        self._chunks = deque()
+        self._buffered = 0
+        self._finished = False
+        self._on_change = on_change
+        self._done_callbacks = []
+        self._lock = Lock()
+
+    @property
+    def buffered(self):
+        """Return the duration of audio fed but not yet played, in seconds."""
+        return self._buffered / pcm_ops.SAMPLE_WIDTH / _SAMPLE_RATE
+
+    @property
+    def done(self):
+        """Return whether the voice has been cancelled or has played all of its audio."""
+        return self.cancelled or (self._finished and not self._buffered)
+
+    def feed(self, pcm, packets=None, encoding=None):
+        """Add PCM audio to the end of the voice.
+
+        :param pcm: the PCM audio
+        :type pcm: bytes
+        :param packets: the Opus packets encoding each frame of the audio, or None
+        :type packets: list of bytes
+        :param encoding: the (bitrate, frame duration, profile) the packets were encoded with
+        :type encoding: tuple
+        """
+        if pcm and not self.cancelled:
+            with self._lock:
+                self._chunks.append((pcm, packets, encoding))
+                self._buffered += len(pcm)
+                self.started = True
+            self._changed()
+
+    def finish(self):
+        """Mark the voice as having been fed all of its audio."""
+        with self._lock:
+            self._finished = True
+        self._changed()
+
+    def cancel(self):
+        """Stop the voice immediately."""
+        with self._lock:
+            self.cancelled = True
+            self._chunks.clear()
+            self._buffered = 0
+        self._changed()
+
+    def add_done_callback(self, callback):
+        """Call a function once the voice is done, or at once if it is already done.
+
+        The function is called on the thread that finishes playing or cancels the voice, such as the mixer thread.
+
+        :param callback: the function to call
+        :type callback: callable
+        """
+        with self._lock:
+            if not self.done:
+                self._done_callbacks.append(callback)
+                return
+        callback()
+
+    def remove_done_callback(self, callback):
+        """Stop a function added with add_done_callback from being called.
+
+        :param callback: the function
+        :type callback: callable
+        """
+        with self._lock:
+            if callback in self._done_callbacks:
+                self._done_callbacks.remove(callback)
+
+    def read_frame(self, size):
+        """Remove and return the next frame of audio, with its Opus packet and encoding if it has one.
+
+        A frame has a packet only if it is a whole frame of audio fed with packets of the same size.
+
+        :param size: the size of the frame, in bytes
+        :type size: int
+        :return: the frame, padded with silence if not enough is buffered, and its packet and encoding or None
+        """
+        frame = bytearray()
+        packet = encoding = None
+        with self._lock:
+            if self._chunks:
+                pcm, packets, chunk_encoding = self._chunks[0]
+                if packets and len(pcm) >= size and opus.frame_size(chunk_encoding) == size:
+                    packet, encoding = packets[0], chunk_encoding
+            while self._chunks and len(frame) < size:
+                pcm, packets, chunk_encoding = self._chunks.popleft()
+                needed = size - len(frame)
+                frame += pcm[:needed]
+                if len(pcm) > needed:
+                    # The rest of the chunk keeps its packets only if a whole packet's frame was read
+                    packets = packets[1:] if packets and needed == opus.frame_size(chunk_encoding) else None
+                    self._chunks.appendleft((pcm[needed:], packets, chunk_encoding))
+            self._buffered -= len(frame)
+        if frame and self._finished and not self._buffered:
+            self._call_done_callbacks()
+        frame += bytes(size - len(frame))
+        return bytes(frame), packet, encoding
+
+    def _changed(self):
+        """Tell the mixer the voice changed, and call the done callbacks if the voice is done."""
+        if self._on_change is not None:
+            self._on_change()
+        self._call_done_callbacks()
+
+    def _call_done_callbacks(self):
+        """Call the done callbacks, once, if the voice is done."""
+        with self._lock:
+            if not self.done:
+                return
+            callbacks, self._done_callbacks = self._done_callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+class Mixer(Thread):
+    """A thread summing the active voices of each lane into the sound output, frame by frame.
+
+    Voices in a lane beyond its limit of concurrent voices wait for earlier voices in the lane to finish.
+    An active voice is left out of the mix until its first audio is fed to it. The thread sleeps while
+    no voice has audio to play, and while the sound output has enough audio queued.
+    """
+
+    def __init__(self, frame_size, buffer_ahead, lane_limits):
+        """Create a new mixer.
+
+        :param frame_size: the size of each mixed frame, in bytes
+        :type frame_size: int
+        :param buffer_ahead: the duration of mixed audio to keep queued in the sound output, in seconds
+        :type buffer_ahead: float
+        :param lane_limits: the maximum number of concurrent voices of each lane
+        :type lane_limits: dict
+        """
+        super().__init__(daemon=True)
+        self._frame_size = frame_size
+        self._buffer_ahead = buffer_ahead
+        self._lane_limits = lane_limits
+        self._lanes = {lane: [] for lane in lane_limits}
+        self._voice_ids = count(1)
+        self._condition = Condition()
+        self._output = None
+
+        self.frames = 0
+
+    def set_output(self, sound_output):
+        """Set the sound output to mix into, or None to pause mixing.
+
+        :param sound_output: the Mumble client's sound output
+        :type sound_output: pymumble.soundoutput.SoundOutput
+        """
+        with self._condition:
+            self._output = sound_output
+            self._condition.notify()
+
+    def add_voice(self, lane, label=''):
+        """Create and return a new voice in a lane.
+
+        :param lane: PRIORITY or NORMAL
+        :type lane: str
+        :param label: a description of the voice's audio
+        :type label: str
+        """
+        voice = Voice(next(self._voice_ids), lane, label, self._wake)
+        with self._condition:
+            self._lanes[lane].append(voice)
+            self._condition.notify()
+        return voice
+
+    def play(self, pcm, lane, label='', packets=None, encoding=None):
+        """Play PCM audio as a new voice.
+
+        :param pcm: the PCM audio
+        :type pcm: bytes
+        :param lane: PRIORITY or NORMAL
+        :type lane: str
+        :param label: a description of the audio
+        :type label: str
+        :param packets: the Opus packets encoding each frame of the audio, or None
+        :type packets: list of bytes
+        :param encoding: the (bitrate, frame duration, profile) the packets were encoded with
+        :type encoding: tuple
+        """
+        voice = self.add_voice(lane, label)
+        voice.feed(pcm, packets, encoding)
+        voice.finish()
+        return voice
+
+    def voices(self):
+        """Return the voices playing or waiting to play."""
+        with self._condition:
+            return [voice for lane in self._lanes.values() for voice in lane if not voice.done]
+
+    def cancel(self, voice_id):
+        """Cancel a voice by its ID.
+
+        :param voice_id: the ID of the voice
+        :type voice_id: int
+        :return: whether a voice was cancelled
+        """
+        for voice in self.voices():
+            if voice.voice_id == voice_id:
+                voice.cancel()
+                return True
+        return False
+
+    def cancel_all(self):
+        """Cancel every voice."""
+        for voice in self.voices():
+            voice.cancel()
+
+    def run(self):
+        """Mix the active voices into the sound output."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._output is not None and self._playing_voices())
+                sound_output = self._output
+
+            add_packet = getattr(sound_output, 'add_packet', None)
+            while sound_output.get_buffer_size() < self._buffer_ahead:
+                frames = [voice.read_frame(self._frame_size) for voice in self._playing_voices()]
+                if not frames:
+                    break
+                # A voice playing alone can send its packets as they are; mixed voices must be encoded
+                if len(frames) == 1 and frames[0][1] is not None and add_packet is not None:
+                    add_packet(*frames[0])
+                else:
+                    sound_output.add_sound(pcm_ops.mix([frame for frame, _, _ in frames]))
+                self.frames += 1
+            else:
+                # Sleep until the sound output has played enough to take another frame, or a voice changes
+                with self._condition:
+                    self._condition.wait(sound_output.get_buffer_size() - self._buffer_ahead)
+
+    def _wake(self):
+        """Wake the mixer thread to check its voices again."""
+        with self._condition:
+            self._condition.notify()
+
+    def _playing_voices(self):
+        """Drop finished voices and return the voices of each lane within the lane's limit that have audio."""
+        playing_voices = []
+        with self._condition:
+            for lane, voices in self._lanes.items():
+                voices[:] = [voice for voice in voices if not voice.done]
+                for voice in voices[:self._lane_limits[lane]]:
+                    voice.active = True
+                    if voice.started:
+                        playing_voices.append(voice)
+        return playing_voices
@@ -0,0 +1,87 @@
+"""Encode sound clips to Opus packets ahead of time, so repeated plays are not encoded again.
+
+An encoding is the (bitrate, frame duration, application profile) of the Opus encoder negotiated with
+a Mumble server. Packets are only sent in place of PCM while the server's encoding matches theirs.
+"""
+import struct
+
+_SAMPLE_RATE = 48000
+_SAMPLE_WIDTH = 2
+_PACKET_LENGTH = struct.Struct('<H')
+
+
+def frame_size(encoding):
+    """Return the size of the PCM audio encoded in each packet of an encoding, in bytes.
+
+    :param encoding: the (bitrate, frame duration, profile) of the Opus encoder
+    :type encoding: tuple
+    """
+    return int(round(encoding[1] * _SAMPLE_RATE)) * _SAMPLE_WIDTH
+
+
+def pad(pcm, encoding):
+    """Return PCM audio padded with silence to a whole number of frames, as it is when encoded.
+
+    :param pcm: the PCM audio
+    :type pcm: bytes
+    :param encoding: the (bitrate, frame duration, profile) of the Opus encoder
+    :type encoding: tuple
+    """
+    return pcm + bytes(-len(pcm) % frame_size(encoding))
+
+
+def encode(pcm, encoding):
+    """Return 48 kHz mono PCM audio encoded as Opus packets, one per frame, padding the last frame with silence.
+
+    :param pcm: the PCM audio
+    :type pcm: bytes
+    :param encoding: the (bitrate, frame duration, profile) of the Opus encoder
+    :type encoding: tuple
+    """
+    import opuslib  # pylint: disable=import-outside-toplevel
+
+    bitrate, _, profile = encoding
+    encoder = opuslib.Encoder(_SAMPLE_RATE, 1, profile)
+    encoder.bitrate = bitrate
+    size = frame_size(encoding)
+    packets = []
+    for i in range(0, len(pcm), size):
+        frame = pcm[i:i + size]
+        frame += bytes(size - len(frame))
+        packets.append(encoder.encode(frame, size // _SAMPLE_WIDTH))
+    return packets
+
+
+def pack(packets):
+    """Return Opus packets joined into bytes, each prefixed with its length, to be cached or stored.
+
+    :param packets: the Opus packets
+    :type packets: list of bytes
+    """
+    return b''.join(_PACKET_LENGTH.pack(len(packet)) + packet for packet in packets)
+
+
+def unpack(data):
+    """Return the Opus packets joined into bytes by pack.
+
+    :param data: the joined packets
+    :type data: bytes
+    """
+    packets = []
+    offset = 0
+    while offset < len(data):
+        length, = _PACKET_LENGTH.unpack_from(data, offset)
+        offset += _PACKET_LENGTH.size
+        packets.append(bytes(data[offset:offset + length]))
+        offset += length
+    return packets
+
+
+def store_name(encoding):
+    """Return the name of the directory storing the packets of an encoding.
+
+    :param encoding: the (bitrate, frame duration, profile) of the Opus encoder
+    :type encoding: tuple
+    """
+    bitrate, frame_duration, profile = encoding
+    return 'opus-{}-{}-{}'.format(bitrate, int(round(frame_duration * 1000)), profile)
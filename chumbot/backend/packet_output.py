@@ -0,0 +1,103 @@
+"""A pymumble connection whose sound output sends Opus packets encoded ahead of time instead of encoding them again."""
+import opuslib
+import pymumble_py3 as pymumble
+from pymumble_py3.constants import PYMUMBLE_AUDIO_PER_PACKET, PYMUMBLE_AUDIO_TYPE_OPUS, PYMUMBLE_SAMPLERATE
+from pymumble_py3.errors import CodecNotSupportedError
+from pymumble_py3.soundoutput import SoundOutput
+
+
+class EncodedFrame(bytes):
+    """A frame of PCM audio carrying the Opus packet it was encoded to ahead of time."""
+
+    def __new__(cls, pcm, packet, encoding):
+        """Create a new encoded frame.
+
+        :param pcm: the frame of PCM audio
+        :type pcm: bytes
+        :param packet: the Opus packet encoding the frame
+        :type packet: bytes
+        :param encoding: the (bitrate, frame duration, profile) the packet was encoded with
+        :type encoding: tuple
+        """
+        frame = super().__new__(cls, pcm)
+        frame.packet = packet
+        frame.encoding = encoding
+        return frame
+
+
+class PacketMumble(pymumble.Mumble):
+    """A Mumble connection using a PacketOutput as its sound output."""
+
+    def init_connection(self):
+        """Reset the state of the connection, including its sound output, before connecting."""
+        super().init_connection()
+        self.sound_output = PacketOutput(self)
+
+
+class PacketOutput(SoundOutput):
+    """pymumble's sound output, sending frames encoded ahead of time as their packets.
+
+    pymumble encodes each frame of audio as it sends it. A frame added with add_packet is sent as
+    its packet instead, as long as it was encoded with the output's current encoding; otherwise,
+    such as after the server changes the bitrate, its PCM is encoded as usual.
+    """
+
+    def __init__(self, mumble):
+        """Create a new sound output for a Mumble connection.
+
+        :param mumble: the Mumble connection
+        :type mumble: pymumble.Mumble
+        """
+        self.encoding = None
+        self.packets_sent = 0
+        self.frames_encoded = 0
+        super().__init__(mumble, PYMUMBLE_AUDIO_PER_PACKET, mumble.bandwidth, stereo=mumble.stereo,
+                         opus_profile=mumble.get_codec_profile())
+
+    def add_packet(self, pcm, packet, encoding):
+        """Add a frame of audio to be sent, along with the Opus packet it was encoded to.
+
+        :param pcm: the frame of PCM audio, as long as one encoder frame
+        :type pcm: bytes
+        :param packet: the Opus packet encoding the frame
+        :type packet: bytes
+        :param encoding: the (bitrate, frame duration, profile) the packet was encoded with
+        :type encoding: tuple
+        """
+        with self.lock:
+            self.pcm.append(EncodedFrame(pcm, packet, encoding))
+
+    def create_encoder(self):
+        """Create the encoder for the codec requested by the server."""
+        if not self.codec:
+            return
+
+        if not self.codec.opus:
+            raise CodecNotSupportedError('')
+        self.encoder = _PacketEncoder(self, PYMUMBLE_SAMPLERATE, self.channels, self.opus_profile)
+        self.encoder_framesize = self.audio_per_packet
+        self.codec_type = PYMUMBLE_AUDIO_TYPE_OPUS
+        self._set_bandwidth()
+
+    def _set_bandwidth(self):
+        """Set the encoder's bitrate for the bandwidth, and record the resulting encoding."""
+        super()._set_bandwidth()
+        self.encoding = None
+        if self.encoder is not None and self.channels == 1:
+            self.encoding = (self.encoder.bitrate, self.encoder_framesize, self.opus_profile)
+
+
+class _PacketEncoder(opuslib.Encoder):
+    """An Opus encoder returning the packets of frames encoded ahead of time with its settings."""
+
+    def __init__(self, output, sample_rate, channels, profile):
+        super().__init__(sample_rate, channels, profile)
+        self._output = output
+
+    def encode(self, pcm_data, frame_size):
+        """Return the Opus packet of a frame of PCM audio."""
+        if isinstance(pcm_data, EncodedFrame) and pcm_data.encoding == self._output.encoding:
+            self._output.packets_sent += 1
+            return pcm_data.packet
+        self._output.frames_encoded += 1
+        return super().encode(pcm_data, frame_size)
@@ -0,0 +1,110 @@
+"""Operations on 16-bit mono PCM audio, vectorised with NumPy when it is installed."""
+from array import array
+from math import sqrt
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SAMPLE_WIDTH = 2
+
+_MIN_SAMPLE = -32768
+_MAX_SAMPLE = 32767
+
+
+def analyze(pcm, silence_threshold):
+    """Return the peak, RMS level and non-silent bounds of PCM audio.
+
+    :param pcm: the PCM audio
+    :type pcm: bytes
+    :param silence_threshold: the largest absolute sample value considered silent
+    :type silence_threshold: int
+    :return: the peak and RMS sample values, and the indexes of the first non-silent sample and of
+             the sample after the last non-silent sample
+    """
+    if numpy is not None:
+        samples = numpy.frombuffer(pcm, dtype='<i2').astype(numpy.int32)
+        if not samples.size:
+            return 0, 0.0, 0, 0
+        magnitudes = numpy.abs(samples)
+        loud = numpy.flatnonzero(magnitudes > silence_threshold)
+        rms = float(numpy.sqrt(numpy.mean(numpy.square(samples, dtype=numpy.float64))))
+        start, end = (int(loud[0]), int(loud[-1]) + 1) if loud.size else (0, 0)
+        return int(magnitudes.max()), rms, start, end
+
+    samples = _to_array(pcm)
+    if not samples:
+        return 0, 0.0, 0, 0
+    magnitudes = [abs(sample) for sample in samples]
+    loud = [i for i, magnitude in enumerate(magnitudes) if magnitude > silence_threshold]
+    rms = sqrt(sum(sample * sample for sample in samples) / len(samples))
+    start, end = (loud[0], loud[-1] + 1) if loud else (0, 0)
+    return max(magnitudes), rms, start, end
+
+
+def scale(pcm, gain):
+    """Return PCM audio multiplied by a gain, saturating samples that would overflow.
+
+    :param pcm: the PCM audio
+    :type pcm: bytes
+    :param gain: the linear gain
+    :type gain: float
+    """
+    if gain == 1.0:
+        return pcm
+
+    if numpy is not None:
+        samples = numpy.frombuffer(pcm, dtype='<i2').astype(numpy.float32) * gain
+        return numpy.clip(samples, _MIN_SAMPLE, _MAX_SAMPLE).astype('<i2').tobytes()
+
+    return _to_bytes(array('h', (max(_MIN_SAMPLE, min(_MAX_SAMPLE, int(sample * gain)))
+                                 for sample in _to_array(pcm))))
+
+
+def apply_levels(pcm, gain, start, end):
+    """Return PCM audio trimmed to a range of samples and multiplied by a gain.
+
+    :param pcm: the PCM audio
+    :type pcm: bytes
+    :param gain: the linear gain
+    :type gain: float
+    :param start: the index of the first sample to keep
+    :type start: int
+    :param end: the index of the sample after the last sample to keep
+    :type end: int
+    """
+    return scale(pcm[start * SAMPLE_WIDTH:end * SAMPLE_WIDTH], gain)
+
+
+def mix(frames):
+    """Return the sum of equally sized frames of PCM audio, saturating samples that would overflow.
+
+    :param frames: the frames of PCM audio
+    :type frames: list of bytes
+    """
+    if len(frames) == 1:
+        return frames[0]
+
+    if numpy is not None:
+        mixed = numpy.sum([numpy.frombuffer(frame, dtype='<i2') for frame in frames], axis=0, dtype=numpy.int32)
+        return numpy.clip(mixed, _MIN_SAMPLE, _MAX_SAMPLE).astype('<i2').tobytes()
+
+    return _to_bytes(array('h', (max(_MIN_SAMPLE, min(_MAX_SAMPLE, sum(samples)))
+                                 for samples in zip(*map(_to_array, frames)))))
+
+
+def _to_array(pcm):
+    """Return little-endian PCM audio as an array of samples."""
+    samples = array('h', pcm)
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples
+
+
+def _to_bytes(samples):
+    """Return an array of samples as little-endian PCM audio."""
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return samples.tobytes()
@@ -0,0 +1,90 @@
+"""Cache decoded PCM audio in memory with least-recently-used eviction."""
+from collections import OrderedDict
+from threading import Lock
+
+
+class PCMCache:
+    """Stores decoded sound clips in memory, bounded by a total byte budget.
+
+    Entries are keyed by clip name and tagged with the modification time and size of the clip
+    file they were decoded from, so a clip replaced on disk is never served stale.
+    """
+
+    def __init__(self, max_bytes):
+        """Create a new PCM cache.
+
+        :param max_bytes: the maximum number of PCM bytes to hold, or 0 to disable caching
+        :type max_bytes: int
+        """
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Return the number of cached clips."""
+        return len(self._entries)
+
+    @property
+    def size(self):
+        """Return the total number of cached PCM bytes."""
+        return self._size
+
+    def get(self, name, stamp):
+        """Return the cached PCM for a clip, or None on a miss.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        :param stamp: the (mtime, size) of the clip file the PCM must have been decoded from
+        :type stamp: tuple
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, name, stamp, pcm):
+        """Store the PCM for a clip, evicting the least recently used clips to stay in budget.
+
+        PCM larger than the whole budget is not cached.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        :param stamp: the (mtime, size) of the clip file the PCM was decoded from
+        :type stamp: tuple
+        :param pcm: the decoded PCM audio
+        :type pcm: bytes
+        """
+        if len(pcm) > self._max_bytes:
+            return
+
+        with self._lock:
+            self._discard(name)
+            self._entries[name] = (stamp, pcm)
+            self._size += len(pcm)
+            while self._size > self._max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def invalidate(self, names):
+        """Drop the cached PCM of the given clips.
+
+        :param names: the extensionless names of the sound clips
+        :type names: iterable
+        """
+        with self._lock:
+            for name in names:
+                self._discard(name)
+
+    def _discard(self, name):
+        """Remove a clip's entry, if any. The cache lock must be held."""
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            self._size -= len(entry[1])
@@ -0,0 +1,247 @@
+"""Persist decoded PCM audio on disk so sound clips survive restarts without decoding."""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+from os import fdopen, makedirs, remove, replace
+from os.path import getsize, join
+from tempfile import mkstemp
+from threading import Lock, Timer
+
+from chumbot.backend import constants
+
+_MANIFEST_FILENAME = 'manifest.json'
+_PCM_EXTENSION = '.pcm'
+_HASH_BLOCK_SIZE = 1 << 16
+
+
+class PCMStore:
+    """Stores decoded sound clips as raw 48 kHz mono PCM files in a cache directory.
+
+    A manifest maps each clip name to the modification time, size and SHA-1 hash of the clip
+    file it was decoded from. A clip whose file was touched but not changed is still served
+    from the store once its hash has been checked. Changes to the manifest are written to disk
+    in batches, save_delay seconds after the first unsaved change, or when the store is saved.
+    """
+
+    def __init__(self, directory, save_delay=constants.MANIFEST_SAVE_DELAY):
+        """Create a new PCM store, creating its directory if needed.
+
+        :param directory: the directory in which to store decoded clips
+        :type directory: str
+        :param save_delay: the time to wait after a change to the manifest before writing it, in seconds
+        :type save_delay: float
+        """
+        self._directory = directory
+        self._save_delay = save_delay
+        self._lock = Lock()
+        self._manifest = {}
+        self._unsaved = False
+        self._save_timer = None
+        self._enabled = True
+
+        try:
+            makedirs(directory, exist_ok=True)
+            with open(join(directory, _MANIFEST_FILENAME)) as manifest_file:
+                self._manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            self._enabled = False
+
+    def __contains__(self, name):
+        """Return whether a clip has decoded PCM in the store."""
+        return name in self._manifest
+
+    def get(self, name, source_path, stamp):
+        """Return the stored PCM for a clip, or None if it is missing or out of date.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        :param source_path: the path of the clip file
+        :type source_path: str
+        :param stamp: the (mtime, size) of the clip file
+        :type stamp: tuple
+        """
+        if not self.is_current(name, source_path, stamp):
+            return None
+
+        try:
+            with open(self._pcm_path(name), 'rb') as pcm_file:
+                return pcm_file.read()
+        except OSError:
+            return None
+
+    def put(self, name, source_path, stamp, pcm):
+        """Store the decoded PCM of a clip.
+
+        The clip file is hashed unless the clip is already stored with the same stamp.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        :param source_path: the path of the clip file the PCM was decoded from
+        :type source_path: str
+        :param stamp: the (mtime, size) of the clip file
+        :type stamp: tuple
+        :param pcm: the decoded PCM audio
+        :type pcm: bytes
+        """
+        if not self._enabled:
+            return
+
+        entry = self._manifest.get(name)
+        try:
+            if entry is not None and (entry['mtime'], entry['size']) == tuple(stamp):
+                source_hash = entry['hash']
+            else:
+                source_hash = _hash_file(source_path)
+            # Each put writes its own temporary file, so concurrent puts of a clip cannot mix their PCM
+            self._write(self._pcm_path(name), pcm)
+        except OSError:
+            return
+
+        with self._lock:
+            self._manifest[name] = {'mtime': stamp[0], 'size': stamp[1], 'hash': source_hash}
+            self._schedule_save()
+
+    def stored_size(self, name):
+        """Return the size of a clip's stored PCM in bytes, or None if it is not stored.
+
+        The stored PCM is not checked against the clip file, so the size is only an estimate.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        """
+        if name not in self._manifest:
+            return None
+        try:
+            return getsize(self._pcm_path(name))
+        except OSError:
+            return None
+
+    def is_current(self, name, source_path, stamp):
+        """Return whether the stored PCM of a clip was decoded from the clip's current file.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        :param source_path: the path of the clip file
+        :type source_path: str
+        :param stamp: the (mtime, size) of the clip file
+        :type stamp: tuple
+        """
+        entry = self._manifest.get(name)
+        if entry is None:
+            return False
+        if (entry['mtime'], entry['size']) == tuple(stamp):
+            return True
+
+        # The file was touched; keep the stored PCM if its contents are unchanged
+        try:
+            if entry['size'] != stamp[1] or entry['hash'] != _hash_file(source_path):
+                return False
+        except OSError:
+            return False
+
+        with self._lock:
+            entry['mtime'] = stamp[0]
+            self._schedule_save()
+        return True
+
+    def prune(self, names):
+        """Remove the stored PCM of every clip not among the given names.
+
+        :param names: the extensionless names of the sound clips to keep
+        :type names: collection
+        """
+        with self._lock:
+            stale_names = [name for name in self._manifest if name not in names]
+            for name in stale_names:
+                del self._manifest[name]
+                try:
+                    remove(self._pcm_path(name))
+                except OSError:
+                    pass
+            if stale_names:
+                self._schedule_save()
+
+    def warm(self, clips, decode, workers):
+        """Decode and store every clip whose stored PCM is missing or out of date.
+
+        Clips are decoded in parallel, and clips that no longer exist are pruned.
+
+        :param clips: the sound clips to store
+        :type clips: chumbot.backend.clips.Clips
+        :param decode: a function converting a clip filename to PCM, or returning None if it cannot be decoded
+        :type decode: callable
+        :param workers: the number of clips to decode at once
+        :type workers: int
+        :return: the number of clips decoded
+        """
+        def warm_clip(name):
+            source_path = clips.path(name)
+            stamp = clips.stamp(name)
+            if self.is_current(name, source_path, stamp):
+                return False
+            pcm = decode(clips[name])
+            if pcm is None:
+                return False
+            self.put(name, source_path, stamp, pcm)
+            return True
+
+        self.prune(clips)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            decoded = sum(executor.map(warm_clip, list(clips)))
+        self.save()
+
+        return decoded
+
+    def save(self):
+        """Write the manifest to disk, if it has changed since it was last written."""
+        if not self._enabled:
+            return
+
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._unsaved:
+                return
+            self._unsaved = False
+            try:
+                self._write(join(self._directory, _MANIFEST_FILENAME), json.dumps(self._manifest).encode())
+            except OSError:
+                pass
+
+    def _schedule_save(self):
+        """Write the manifest to disk after the save delay, unless already scheduled. The store lock must be held."""
+        self._unsaved = True
+        if self._save_timer is None:
+            self._save_timer = Timer(self._save_delay, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _write(self, path, data):
+        """Write a file in the store directory through a temporary file, replacing it at once."""
+        fd, temporary_path = mkstemp(suffix='.tmp', dir=self._directory)
+        try:
+            with fdopen(fd, 'wb') as temporary_file:
+                temporary_file.write(data)
+            replace(temporary_path, path)
+        except OSError:
+            try:
+                remove(temporary_path)
+            except OSError:
+                pass
+            raise
+
+    def _pcm_path(self, name):
+        """Return the path of a clip's stored PCM file."""
+        return join(self._directory, name + _PCM_EXTENSION)
+
+
+def _hash_file(path):
+    """Return the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as hashed_file:
+        for block in iter(lambda: hashed_file.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
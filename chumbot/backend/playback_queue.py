@@ -0,0 +1,201 @@
+"""Queue requested sound clips and play them in order, one request per worker task."""
+import asyncio
+from collections import deque
+from itertools import count
+from time import monotonic
+from traceback import print_exc
+
+
+class PlaybackRequest:
+    """Sound clips requested together, played in order as one mixer voice."""
+
+    def __init__(self, request_id, user, clips, duration):
+        """Create a new playback request.
+
+        :param request_id: the request's unique ID
+        :type request_id: int
+        :param user: the user who requested the clips, or None
+        :type user: hashable
+        :param clips: the extensionless names of the sound clips
+        :type clips: list
+        :param duration: the estimated duration of the clips, in seconds
+        :type duration: float
+        """
+        self.request_id = request_id
+        self.user = user
+        self.clips = clips
+        self.duration = duration
+        self.queued_time = monotonic()
+        self.cancelled = False
+        self.voice = None
+
+    @property
+    def label(self):
+        """Return a description of the request's clips."""
+        return ', '.join(self.clips)
+
+    def attach(self, voice):
+        """Set the mixer voice playing the request, cancelling it if the request was cancelled.
+
+        :param voice: the voice playing the request
+        :type voice: chumbot.backend.mixer.Voice
+        """
+        self.voice = voice
+        if self.cancelled:
+            voice.cancel()
+
+    def cancel(self):
+        """Stop the request, whether it is queued or playing."""
+        self.cancelled = True
+        if self.voice is not None:
+            self.voice.cancel()
+
+
+class PlaybackQueue:
+    """A bounded queue of playback requests served in order by worker tasks.
+
+    The queue is bounded by the total number of clips and the total estimated duration of the clips
+    waiting to play. Requests are only handed to the player when a worker is free, so their clips
+    are decoded just before their turn rather than when they are queued.
+    Every method must be called on the event loop running the workers.
+    """
+
+    def __init__(self, player, workers, max_clips, max_duration):
+        """Create a new playback queue.
+
+        :param player: the coroutine function called with each request to play it
+        :type player: callable
+        :param workers: the number of requests played at once
+        :type workers: int
+        :param max_clips: the maximum number of queued clips
+        :type max_clips: int
+        :param max_duration: the maximum estimated duration of queued clips, in seconds
+        :type max_duration: float
+        """
+        self._player = player
+        self._max_clips = max_clips
+        self._max_duration = max_duration
+        self._worker_count = workers
+        self._workers = []
+
+        self._queue = deque()
+        self._playing = []
+        self._request_ids = count(1)
+        self._clips = 0
+        self._duration = 0.0
+        self._waiters = deque()
+
+        self.dropped = 0
+        self.played = 0
+        self.skipped = 0
+
+    @property
+    def depth(self):
+        """Return the number of queued clips."""
+        return self._clips
+
+    @property
+    def duration(self):
+        """Return the estimated duration of the queued clips, in seconds."""
+        return self._duration
+
+    def start(self):
+        """Start the worker tasks on the running event loop."""
+        self._workers = [asyncio.ensure_future(self._work()) for _ in range(self._worker_count)]
+
+    async def stop(self):
+        """Cancel the worker tasks, stopping the requests playing and discarding queued requests."""
+        self.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def admits(self, clip_count, duration):
+        """Return whether a request would fit in the queue.
+
+        :param clip_count: the number of clips in the request
+        :type clip_count: int
+        :param duration: the estimated duration of the clips, in seconds
+        :type duration: float
+        """
+        return self._clips + clip_count <= self._max_clips and self._duration + duration <= self._max_duration
+
+    def enqueue(self, user, clips, duration):
+        """Queue sound clips to be played.
+
+        :param user: the user requesting the clips, or None
+        :type user: hashable
+        :param clips: the extensionless names of the sound clips
+        :type clips: list
+        :param duration: the estimated duration of the clips, in seconds
+        :type duration: float
+        :return: the queued request, or None if the queue is full
+        """
+        if not self.admits(len(clips), duration):
+            self.dropped += 1
+            return None
+
+        request = PlaybackRequest(next(self._request_ids), user, clips, duration)
+        self._queue.append(request)
+        self._clips += len(clips)
+        self._duration += duration
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+        return request
+
+    def requests(self):
+        """Return the requests playing, followed by the requests waiting to play."""
+        return self._playing + list(self._queue)
+
+    def skip(self):
+        """Stop the requests playing, moving on to the next queued requests.
+
+        :return: the number of requests stopped
+        """
+        playing = list(self._playing)
+        for request in playing:
+            request.cancel()
+        self.skipped += len(playing)
+        return len(playing)
+
+    def clear(self):
+        """Discard every queued request and stop the requests playing.
+
+        :return: the number of requests discarded or stopped
+        """
+        discarded = len(self._queue)
+        for request in self._queue:
+            request.cancel()
+        self._queue.clear()
+        self._clips = 0
+        self._duration = 0.0
+        return discarded + self.skip()
+
+    async def _next(self):
+        """Wait for and remove the next queued request, marking it as playing."""
+        while not self._queue:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+        request = self._queue.popleft()
+        self._clips -= len(request.clips)
+        self._duration -= request.duration
+        self._playing.append(request)
+        return request
+
+    async def _work(self):
+        """Play queued requests until cancelled."""
+        while True:
+            request = await self._next()
+            try:
+                await self._player(request)
+            except Exception:  # pylint: disable=broad-except
+                print_exc()
+            finally:
+                self._playing.remove(request)
+                self.played += 1
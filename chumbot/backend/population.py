@@ -0,0 +1,106 @@
+"""Track which Mumble channel each user occupies."""
+from threading import Lock
+
+
+class ChannelPopulation:
+    """An index of Mumble users by channel, updated incrementally as users join, move and leave.
+
+    Channels are also bucketed by user count, so the most populous channel is found in constant time.
+    """
+
+    def __init__(self):
+        """Create a new, empty channel population index."""
+        self._user_channels = {}
+        self._channel_users = {}
+        self._buckets = {}
+        self._max_count = 0
+        self._lock = Lock()
+
+    def rebuild(self, users):
+        """Replace the index with the current state of the Mumble users.
+
+        :param users: the Mumble users
+        :type users: iterable of pymumble.users.User
+        """
+        with self._lock:
+            self._user_channels.clear()
+            self._channel_users.clear()
+            self._buckets.clear()
+            self._max_count = 0
+            for user in users:
+                self._add(user['session'], user['channel_id'])
+
+    def move(self, session, channel_id):
+        """Record a user joining the server or moving to a channel.
+
+        :param session: the session number of the user
+        :type session: int
+        :param channel_id: the ID of the channel the user is in
+        :type channel_id: int
+        :return: the ID of the channel the user was in before, or None if they just joined
+        """
+        with self._lock:
+            old_channel_id = self._remove(session)
+            self._add(session, channel_id)
+        return old_channel_id
+
+    def remove(self, session):
+        """Record a user leaving the server.
+
+        :param session: the session number of the user
+        :type session: int
+        :return: the ID of the channel the user was in, or None if they were unknown
+        """
+        with self._lock:
+            return self._remove(session)
+
+    def count(self, channel_id):
+        """Return the number of users in a channel.
+
+        :param channel_id: the ID of the channel
+        :type channel_id: int
+        """
+        return len(self._channel_users.get(channel_id, ()))
+
+    def most_populous(self):
+        """Return the ID of the channel with the most users, or None if there are no users."""
+        with self._lock:
+            if not self._max_count:
+                return None
+            return next(iter(self._buckets[self._max_count]))
+
+    @property
+    def max_count(self):
+        """Return the number of users in the most populous channel."""
+        return self._max_count
+
+    def _add(self, session, channel_id):
+        """Add a user to a channel. The index lock must be held."""
+        self._user_channels[session] = channel_id
+        channel_users = self._channel_users.setdefault(channel_id, set())
+        self._rebucket(channel_id, len(channel_users), len(channel_users) + 1)
+        channel_users.add(session)
+        self._max_count = max(self._max_count, len(channel_users))
+
+    def _remove(self, session):
+        """Remove a user from their channel, returning its ID. The index lock must be held."""
+        channel_id = self._user_channels.pop(session, None)
+        if channel_id is not None:
+            channel_users = self._channel_users[channel_id]
+            self._rebucket(channel_id, len(channel_users), len(channel_users) - 1)
+            channel_users.discard(session)
+            if not channel_users:
+                del self._channel_users[channel_id]
+            if self._max_count not in self._buckets:
+                self._max_count -= 1
+        return channel_id
+
+    def _rebucket(self, channel_id, old_count, new_count):
+        """Move a channel between user count buckets. The index lock must be held."""
+        if old_count:
+            bucket = self._buckets[old_count]
+            bucket.discard(channel_id)
+            if not bucket:
+                del self._buckets[old_count]
+        if new_count:
+            self._buckets.setdefault(new_count, set()).add(channel_id)
@@ -0,0 +1,187 @@
+"""Pick random sound clips without copying the clip names for each pick."""
+from random import random, randrange
+from threading import Lock
+
+# Random clip modes
+UNIFORM = 'uniform'
+SHUFFLE = 'shuffle'
+WEIGHTED = 'weighted'
+
+_DEFAULT_WEIGHT = 1.0
+
+
+class ClipPicker:
+    """Picks random sound clip names, updated as clips are added and removed.
+
+    The names are kept in an array with each name's position, so adding, removing and picking a
+    name take constant time. UNIFORM picks any clip each time. SHUFFLE plays every clip once, in
+    random order, before any clip repeats: the front of the array holds the clips not yet played.
+    WEIGHTED picks clips in proportion to their weights, kept in a Fenwick tree over the array
+    so that picking a clip and changing a weight take logarithmic time.
+    """
+
+    def __init__(self, mode=UNIFORM, weights=None, play_weight=0.0):
+        """Create a new, empty clip picker.
+
+        :param mode: UNIFORM, SHUFFLE or WEIGHTED
+        :type mode: str
+        :param weights: the weights of clips by name in WEIGHTED mode, for clips not weighted 1
+        :type weights: dict
+        :param play_weight: the weight added to a clip in WEIGHTED mode each time it is requested
+        :type play_weight: float
+        """
+        self.mode = mode
+        self._base_weights = dict(weights or {})
+        self._play_weight = play_weight
+        self._plays = {}
+        self._names = []
+        self._positions = {}
+        self._unplayed = 0
+        self._weights = [] if mode == WEIGHTED else None
+        self._tree = [0.0] if mode == WEIGHTED else None
+        self._lock = Lock()
+
+    def __len__(self):
+        """Return the number of clips that can be picked."""
+        return len(self._names)
+
+    def reset(self, names):
+        """Replace every clip that can be picked.
+
+        :param names: the extensionless names of the sound clips
+        :type names: iterable
+        """
+        with self._lock:
+            self._names = []
+            self._positions = {}
+            self._unplayed = 0
+            if self._tree is not None:
+                self._weights = []
+                self._tree = [0.0]
+            for name in names:
+                self._add(name)
+
+    def add(self, name):
+        """Add a clip that can be picked, unless it already can be.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        """
+        with self._lock:
+            self._add(name)
+
+    def remove(self, name):
+        """Remove a clip, if it can be picked.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        """
+        with self._lock:
+            position = self._positions.get(name)
+            if position is None:
+                return
+            if position < self._unplayed:
+                # Move the clip to the end of the unplayed clips, and shrink them past it
+                self._swap(position, self._unplayed - 1)
+                self._unplayed -= 1
+                position = self._unplayed
+            last = len(self._names) - 1
+            self._swap(position, last)
+            if self._tree is not None:
+                # The last node of a Fenwick tree covers no other node, so it can be dropped as is
+                self._weights.pop()
+                self._tree.pop()
+            del self._positions[self._names.pop()]
+
+    def pick(self):
+        """Return the name of a random clip, or None if there are no clips."""
+        with self._lock:
+            if not self._names:
+                return None
+            if self.mode == SHUFFLE:
+                if not self._unplayed:
+                    self._unplayed = len(self._names)
+                self._swap(randrange(self._unplayed), self._unplayed - 1)
+                self._unplayed -= 1
+                return self._names[self._unplayed]
+            if self._tree is not None:
+                total = self._prefix_sum(len(self._names))
+                if total > 0:
+                    return self._names[self._find(random() * total)]
+            return self._names[randrange(len(self._names))]
+
+    def played(self, name):
+        """Count a request for a clip, adding to its weight in WEIGHTED mode if set to.
+
+        :param name: the extensionless name of the sound clip
+        :type name: str
+        """
+        if self._tree is None or not self._play_weight:
+            return
+        with self._lock:
+            self._plays[name] = self._plays.get(name, 0) + 1
+            position = self._positions.get(name)
+            if position is not None:
+                self._set_weight(position, self._weight(name))
+
+    def _add(self, name):
+        """Add a clip that can be picked, unless it already can be. The picker lock must be held."""
+        if name in self._positions:
+            return
+        position = len(self._names)
+        self._names.append(name)
+        self._positions[name] = position
+        if self._tree is not None:
+            weight = self._weight(name)
+            self._weights.append(weight)
+            index = position + 1
+            # The new node covers the weights from just after its lowest set bit up to itself
+            self._tree.append(weight + self._prefix_sum(index - 1) - self._prefix_sum(index - (index & -index)))
+        # A new clip has not been played in this round of the shuffle
+        self._swap(position, self._unplayed)
+        self._unplayed += 1
+
+    def _weight(self, name):
+        """Return the weight of a clip, from its configured weight and its number of requests."""
+        return self._base_weights.get(name, _DEFAULT_WEIGHT) + self._play_weight * self._plays.get(name, 0)
+
+    def _swap(self, i, j):
+        """Swap two clips' positions in the array. The picker lock must be held."""
+        if i == j:
+            return
+        names = self._names
+        names[i], names[j] = names[j], names[i]
+        self._positions[names[i]] = i
+        self._positions[names[j]] = j
+        if self._tree is not None:
+            weight_i, weight_j = self._weights[j], self._weights[i]
+            self._set_weight(i, weight_i)
+            self._set_weight(j, weight_j)
+
+    def _set_weight(self, position, weight):
+        """Change the weight of the clip at a position in the array. The picker lock must be held."""
+        delta = weight - self._weights[position]
+        self._weights[position] = weight
+        index = position + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix_sum(self, count):
+        """Return the total weight of the first clips in the array. The picker lock must be held."""
+        total = 0.0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+    def _find(self, value):
+        """Return the position of the clip whose weight range holds a value. The picker lock must be held."""
+        position = 0
+        step = 1 << (len(self._names).bit_length() - 1)
+        while step:
+            if position + step <= len(self._names) and self._tree[position + step] <= value:
+                position += step
+                value -= self._tree[position]
+            step >>= 1
+        return min(position, len(self._names) - 1)
@@ -0,0 +1,51 @@
+"""Limit how often each Mumble user can request sound clips."""
+from threading import Lock
+from time import monotonic
+
+
+class RateLimiter:
+    """A token bucket for each user.
+
+    Each user's bucket holds up to burst tokens and refills at a steady rate. Requesting a clip
+    takes a token, so a user can request a burst of clips at once and then clips at the refill rate.
+    """
+
+    def __init__(self, rate, burst):
+        """Create a new rate limiter.
+
+        :param rate: the number of tokens added to each bucket per second
+        :type rate: float
+        :param burst: the maximum number of tokens in each bucket
+        :type burst: int
+        """
+        self._rate = rate
+        self._burst = burst
+        self._buckets = {}
+        self._lock = Lock()
+
+        self.limited = 0
+
+    def acquire(self, user, tokens):
+        """Take up to a number of tokens from a user's bucket.
+
+        :param user: the user requesting tokens
+        :type user: hashable
+        :param tokens: the number of tokens requested
+        :type tokens: int
+        :return: the number of tokens taken
+        """
+        now = monotonic()
+        with self._lock:
+            available, last_time = self._buckets.get(user, (self._burst, now))
+            available = min(self._burst, available + (now - last_time) * self._rate)
+            granted = min(tokens, int(available))
+            if granted < tokens:
+                self.limited += 1
+
+            available -= granted
+            if available >= self._burst:
+                self._buckets.pop(user, None)
+            else:
+                self._buckets[user] = (available, now)
+
+        return granted
@@ -0,0 +1,128 @@
+"""Send text messages to a Mumble channel in batches, paced to stay under the server's flood limits."""
+import asyncio
+from collections import deque
+
+from chumbot.backend.rate_limiter import RateLimiter
+
+_LINE_SEPARATOR = '<br/>'
+
+
+class TextSender:
+    """A queue of outbound text messages sent by a task on the event loop.
+
+    Lines of text are packed into as few messages as the server's message length limit allows, and
+    messages are sent at a steady rate after an initial burst. A request with a key is dropped while
+    an earlier request with the same key is still being sent.
+    Every method must be called on the event loop.
+    """
+
+    def __init__(self, send, max_length, rate, burst):
+        """Create a new text message sender.
+
+        :param send: the function sending a single text message
+        :type send: callable
+        :param max_length: a function returning the largest message the server accepts, in bytes
+        :type max_length: callable
+        :param rate: the number of messages sent per second after the initial burst
+        :type rate: float
+        :param burst: the number of messages that can be sent at once
+        :type burst: int
+        """
+        self._send = send
+        self._max_length = max_length
+        self._interval = 1 / rate
+        self._limiter = RateLimiter(rate, burst)
+        self._messages = deque()
+        self._pending_keys = set()
+        self._task = None
+
+        self.sent = 0
+        self.coalesced = 0
+
+    @property
+    def depth(self):
+        """Return the number of messages waiting to be sent."""
+        return len(self._messages)
+
+    def send(self, message):
+        """Queue a text message.
+
+        :param message: the text of the message
+        :type message: str
+        """
+        self._queue([message], None)
+
+    def send_lines(self, lines, key=None):
+        """Queue lines of text, packed into as few messages as the server allows.
+
+        :param lines: the lines of text
+        :type lines: list of str
+        :param key: a key identifying the request, to drop it while an earlier request with the key is pending
+        :type key: hashable
+        :return: whether the lines were queued
+        """
+        if key is not None:
+            if key in self._pending_keys:
+                self.coalesced += 1
+                return False
+            self._pending_keys.add(key)
+
+        self._queue(pack_lines(lines, self._max_length()), key)
+        return True
+
+    def clear(self):
+        """Discard every message waiting to be sent."""
+        self._messages.clear()
+        self._pending_keys.clear()
+
+    def _queue(self, messages, key):
+        """Queue messages, marking the key as no longer pending after the last of them is sent."""
+        for index, message in enumerate(messages):
+            self._messages.append((message, key if index == len(messages) - 1 else None))
+        if not messages:
+            self._pending_keys.discard(key)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self):
+        """Send the queued messages, waiting whenever the send rate is exceeded."""
+        while self._messages:
+            while not self._limiter.acquire(None, 1):
+                await asyncio.sleep(self._interval)
+            if not self._messages:
+                return
+
+            message, key = self._messages.popleft()
+            self._send(message)
+            self.sent += 1
+            if key is not None:
+                self._pending_keys.discard(key)
+
+
+def pack_lines(lines, max_length):
+    """Return lines of text joined into as few messages as fit within a length limit.
+
+    Each message starts with a line break, as Mumble shows the sender's name before the first line.
+    A line too long to fit in a message is sent in a message on its own.
+
+    :param lines: the lines of text
+    :type lines: list of str
+    :param max_length: the largest message, in UTF-8 bytes
+    :type max_length: int
+    """
+    separator_length = len(_LINE_SEPARATOR.encode())
+    messages = []
+    message_lines = []
+    message_length = 0
+    for line in lines:
+        line_length = separator_length + len(line.encode())
+        if message_lines and message_length + line_length > max_length:
+            messages.append(_LINE_SEPARATOR + _LINE_SEPARATOR.join(message_lines))
+            message_lines = []
+            message_length = 0
+        message_lines.append(line)
+        message_length += line_length
+
+    if message_lines:
+        messages.append(_LINE_SEPARATOR + _LINE_SEPARATOR.join(message_lines))
+    return messages
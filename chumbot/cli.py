@@ -1,19 +1,10 @@
 """Command-line interface and main entry point for Chumbot."""
 import argparse
-import configparser
-from os.path import expanduser
 
 from chumbot import client_interface
 from chumbot.backend.chumshell import ChumShell
-from chumbot.backend.constants import MUMBLE_CONFIG
-
-_CONFIG = configparser.ConfigParser()
-_CONFIG.read(expanduser(MUMBLE_CONFIG))
-
-_USERNAME = _CONFIG['mumble']['Username']
-_HOST = _CONFIG['mumble']['Host']
-_PORT = int(_CONFIG['mumble']['Port'])
-_PASSWORD = _CONFIG['mumble']['Password']
+from chumbot.backend.constants import DEFAULT_INSTANCE, INSTANCE_SECTION_PREFIX, MUMBLE_PORT
+from chumbot.config import CONFIG
 
 
 def run():
@@ -22,21 +13,73 @@ def run():
     parser = argparse.ArgumentParser(prog='chumbot',
                                      description='Chumbot command-line interface')
 
+    # The defaults are read from the config file once the arguments are parsed, so --help does not read it
     parser.add_argument('-u', '--username', help="specify Chumbot's username",
-                        type=str, action='store', default=_USERNAME)
+                        type=str, action='store')
     parser.add_argument('-H', '--host', help='specify the Mumble host address',
-                        type=str, action='store', default=_HOST)
+                        type=str, action='store')
     parser.add_argument('-P', '--port', help='specify the Mumble host port',
-                        type=str, action='store', default=_PORT)
+                        type=str, action='store')
     parser.add_argument('-p', '--password', help='specify the Mumble host password',
-                        type=str, action='store', default=_PASSWORD)
+                        type=str, action='store')
     parser.add_argument('-d', '--debug', help='enable debug message printing',
                         action='store_true')
+    parser.add_argument('--prebuild-cache', help='decode all clips into the clip store and exit',
+                        action='store_true')
 
     args = parser.parse_args()
-    client_interface.initialize(args.username, args.host, args.port, args.password, args.debug)
+    try:
+        for name, (username, host, port, password) in _instances(args).items():
+            client_interface.initialize(username, host, port, password, args.debug, name)
+    except ValueError as error:
+        client_interface.shutdown()
+        parser.error(str(error))
+
+    if args.prebuild_cache:
+        client_interface.warm_cache()
+        client_interface.shutdown()
+        return
+
+    try:
+        ChumShell().cmdloop()
+    finally:
+        client_interface.shutdown()
+
+
+def _instances(args):
+    """Return the username, host, port and password of each instance, by name.
+
+    Instances are described by [mumble:<name>] sections, with unset settings taken from [mumble] or the command
+    line, or by the [mumble] section alone if there are none.
+
+    :raises ValueError: if a setting is not valid, or an instance has no username or host
+    """
+    username = _override(args.username, CONFIG.get('mumble', 'Username'))
+    host = _override(args.host, CONFIG.get('mumble', 'Host'))
+    port = _override(args.port, CONFIG.getint('mumble', 'Port', fallback=MUMBLE_PORT))
+    password = _override(args.password, CONFIG.get('mumble', 'Password', fallback=''))
+
+    instances = {}
+    for name in CONFIG.sections(INSTANCE_SECTION_PREFIX):
+        section = INSTANCE_SECTION_PREFIX + name
+        instances[name] = (CONFIG.get(section, 'Username', fallback=username),
+                           CONFIG.get(section, 'Host', fallback=host),
+                           CONFIG.getint(section, 'Port', fallback=port),
+                           CONFIG.get(section, 'Password', fallback=password))
+    if not instances:
+        instances[DEFAULT_INSTANCE] = (username, host, port, password)
+
+    for name, (username, host, _, _) in instances.items():
+        for option, setting in (('Username', username), ('Host', host)):
+            if setting is None:
+                raise ValueError('No {} for the {} instance: set it in the [mumble] section of {} or pass --{}'
+                                 .format(option, name, CONFIG.path, option.lower()))
+    return instances
+
 
-    ChumShell().cmdloop()
+def _override(argument, setting):
+    """Return a command-line argument if it was given, or the setting from the config file otherwise."""
+    return setting if argument is None else argument
 
 
 if __name__ == '__main__':
@@ -1,39 +1,130 @@
-"""Interface for managing the Chumbot Mumble client."""
-from chumbot.backend.client import Client
+"""Interface for managing the Chumbot Mumble clients.
 
-_CLIENT = None
+One process can host several clients, each connected to its own Mumble server and sharing one clip
+library and one event loop. Commands apply to the targeted client, or to every client if none is targeted.
+The client module, which pulls in pymumble, is imported when the first client is initialized.
+"""
+from contextlib import contextmanager
+from time import monotonic
 
+from chumbot.backend.constants import DEFAULT_INSTANCE
+from chumbot.backend.event_loop import EventLoop
 
-def initialize(username, host, port, password, debug=False):
-    """Initialize the Chumbot client."""
-    global _CLIENT
-    _CLIENT = Client(username, host, port, password, debug)
+_LIBRARY = None
+_LOOP = None
+_METRICS_SERVER = None
+_CLIENTS = {}
+_TARGET = None
+
+
+def initialize(username, host, port, password, debug=False, name=DEFAULT_INSTANCE):
+    """Initialize a Chumbot client, sharing the clip library and event loop of the other clients.
+
+    A client already initialized with the same instance name is closed and replaced.
+
+    :param name: the name of the client's instance
+    :type name: str
+    """
+    global _LIBRARY, _LOOP, _METRICS_SERVER
+    start_time = monotonic()
+    # pylint: disable=import-outside-toplevel
+    from chumbot.backend.client import Client, create_library, serve_metrics
+    import_time = monotonic() - start_time
+    if _LIBRARY is None:
+        _LIBRARY = create_library()
+        _LIBRARY.metrics.observe('import', import_time)
+    if _LOOP is None:
+        _LOOP = EventLoop()
+        _LOOP.start()
+        _METRICS_SERVER = serve_metrics(_LIBRARY, _LOOP)
+    previous_client = _CLIENTS.pop(name, None)
+    if previous_client is not None:
+        previous_client.close()
+    _CLIENTS[name] = Client(username, host, port, password, debug, _LIBRARY, _LOOP, name)
+
+
+def shutdown():
+    """Disconnect every client, stop their tasks, close the clip library, and stop the metrics server and event loop."""
+    global _LIBRARY, _LOOP, _METRICS_SERVER
+    for client in _CLIENTS.values():
+        client.close()
+    _CLIENTS.clear()
+    if _LIBRARY is not None:
+        _LIBRARY.close()
+        _LIBRARY = None
+    if _METRICS_SERVER is not None:
+        _LOOP.call(_METRICS_SERVER.close)
+        _METRICS_SERVER = None
+    if _LOOP is not None:
+        _LOOP.stop()
+        _LOOP = None
+
+
+def instance_names():
+    """Return the names of the client instances."""
+    return list(_CLIENTS)
+
+
+def target(name):
+    """Target a client instance by name, or every instance if the name is empty or 'all'.
+
+    :param name: the name of the instance
+    :type name: str
+    :return: whether the instance exists
+    """
+    global _TARGET
+    if name in ('', 'all'):
+        _TARGET = None
+    elif name in _CLIENTS:
+        _TARGET = name
+    else:
+        print('No such instance: ' + name)
+        return False
+    return True
+
+
+def current_target():
+    """Return the name of the targeted instance, or None if every instance is targeted."""
+    return _TARGET
+
+
+@contextmanager
+def targeting(name):
+    """Target a client instance for the duration of a block, restoring the previous target after.
+
+    :param name: the name of the instance, or 'all'
+    :type name: str
+    :return: whether the instance exists
+    """
+    previous_target = _TARGET
+    try:
+        yield target(name)
+    finally:
+        target(previous_target or '')
 
 
 def connect():
     """Connect the Chumbot to the server."""
-    if _CLIENT:
-        _CLIENT.connect()
+    for client in _targets():
+        client.connect()
 
 
 def disconnect():
     """Disconnect the Chumbot client from the server."""
-    if _CLIENT:
-        _CLIENT.disconnect()
+    for client in _targets():
+        client.disconnect()
 
 
 def reconnect():
     """Reconnect the Chumbot client."""
-    if _CLIENT:
-        _CLIENT.reconnect()
+    for client in _targets():
+        client.reconnect()
 
 
 def print_users():
     """Print a display of the users and the channels they occupy."""
-    if _CLIENT:
-        return _CLIENT.print_users()
-
-    return None
+    for client in _targets(labelled=True):
+        client.print_users()
 
 
 def move_to_channel(channel):
@@ -42,20 +133,20 @@ def move_to_channel(channel):
     :param channel: the Mumble channel to which to move
     :type channel: str
     """
-    if _CLIENT:
-        _CLIENT.move_to_channel(channel)
+    for client in _targets():
+        client.move_to_channel(channel)
 
 
 def mute_self():
     """Mute the Chumbot client."""
-    if _CLIENT:
-        _CLIENT.mute_self()
+    for client in _targets():
+        client.mute_self()
 
 
 def unmute_self():
     """Unmute the Chumbot client."""
-    if _CLIENT:
-        _CLIENT.unmute_self()
+    for client in _targets():
+        client.unmute_self()
 
 
 def play_clips(sound_clips):
@@ -64,20 +155,38 @@ def play_clips(sound_clips):
     :param sound_clips: the (extensionless) names of the sound clips, separated by commas
     :type sound_clips: str
     """
-    if _CLIENT:
-        _CLIENT.play_clips(sound_clips)
+    for client in _targets():
+        client.play_clips(sound_clips)
 
 
 def play_random():
     """Play a random sound clip in Mumble and list its name."""
-    if _CLIENT:
-        _CLIENT.play_random()
+    for client in _targets():
+        client.play_random()
+
+
+def skip_playback():
+    """Stop the sound clips playing, moving on to the next queued clips."""
+    for client in _targets():
+        client.skip_playback()
+
+
+def stop_playback():
+    """Stop the sound clips playing and discard every queued clip."""
+    for client in _targets():
+        client.stop_playback()
+
+
+def print_queue():
+    """Print the requested sound clips playing or waiting to play."""
+    for client in _targets(labelled=True):
+        client.print_queue()
 
 
 def list_clips():
     """List all clips loaded into Chumbot."""
-    if _CLIENT:
-        _CLIENT.list_clips()
+    for client in _targets():
+        client.list_clips()
 
 
 def search_clips(clip_name):
@@ -86,14 +195,64 @@ def search_clips(clip_name):
     :param clip_name: the name of the clip to search for
     :type clip_name: str
     """
-    if _CLIENT:
-        _CLIENT.search_clips(clip_name)
+    for client in _targets():
+        client.search_clips(clip_name)
 
 
 def reload_clips():
     """Reload the stored sound clips."""
-    if _CLIENT:
-        _CLIENT.reload_clips()
+    if _CLIENTS:
+        _any_client().reload_clips()
+
+
+def print_voices():
+    """Print the voices playing or waiting to play."""
+    for client in _targets(labelled=True):
+        client.print_voices()
+
+
+def cancel_voice(voice_id):
+    """Stop a voice playing or waiting to play.
+
+    :param voice_id: the ID of the voice
+    :type voice_id: str
+    """
+    for client in _targets():
+        try:
+            client.cancel_voice(int(voice_id))
+        except ValueError:
+            print('Invalid voice ID: ' + voice_id)
+            return
+
+
+def warm_cache():
+    """Decode every sound clip missing from the on-disk clip store."""
+    if _CLIENTS:
+        _any_client().warm_cache()
+
+
+def print_cache_stats():
+    """Print the decoded audio cache usage and hit ratio."""
+    if _CLIENTS:
+        _any_client().print_cache_stats()
+
+
+def print_message_stats():
+    """Print the chat message queue depth and handling latency."""
+    for client in _targets(labelled=True):
+        client.print_message_stats()
+
+
+def print_connection_stats():
+    """Print the state of the connections and how often they dropped and were restored."""
+    for client in _targets(labelled=True):
+        client.print_connection_stats()
+
+
+def print_stats():
+    """Print the stage latencies, counters and gauges of the clients."""
+    for client in _targets(labelled=True):
+        client.print_stats()
 
 
 def automove(action):
@@ -102,9 +261,34 @@ def automove(action):
     :param action: 'on' or 1 to turn on, 'off' or 0 to turn off
     :type action: str
     """
-    if _CLIENT:
-        action = action.lower()
+    action = action.lower()
+    for client in _targets():
         if action in ('on', '1'):
-            _CLIENT.enable_automove()
+            client.enable_automove()
         elif action in ('off', '0'):
-            _CLIENT.disable_automove()
+            client.disable_automove()
+
+
+def _targets(labelled=False):
+    """Return the targeted clients.
+
+    :param labelled: print each client's instance name before it is used, if several are targeted
+    :type labelled: bool
+    """
+    if _TARGET is not None:
+        return [_CLIENTS[_TARGET]]
+    if not labelled or len(_CLIENTS) < 2:
+        return list(_CLIENTS.values())
+    return _labelled(_CLIENTS)
+
+
+def _labelled(clients):
+    """Yield clients, printing each client's instance name first."""
+    for name, client in clients.items():
+        print('[' + name + ']')
+        yield client
+
+
+def _any_client():
+    """Return the targeted client, or any client for commands on the shared clip library."""
+    return _CLIENTS[_TARGET] if _TARGET is not None else next(iter(_CLIENTS.values()))
@@ -0,0 +1,95 @@
+"""The Chumbot config file, read the first time a setting is looked up."""
+import configparser
+from os.path import expanduser
+from time import monotonic
+
+from chumbot.backend import constants
+
+
+class Config:
+    """The settings of a config file, which is read only once a setting is first looked up.
+
+    Settings missing from the file, including whole sections, take their fallback values. A setting
+    that is not a valid number or boolean raises ValueError naming its section and key.
+    """
+
+    def __init__(self, path):
+        """Create a new config for a config file, without reading it.
+
+        :param path: the path of the config file
+        :type path: str
+        """
+        self._path = path
+        self._parser = None
+        self.load_time = None
+
+    @property
+    def path(self):
+        """Return the path of the config file."""
+        return self._path
+
+    def load(self, path=None):
+        """Read the config file, replacing any settings already read.
+
+        :param path: the path of another config file to read instead, or None
+        :type path: str
+        """
+        if path is not None:
+            self._path = path
+        start_time = monotonic()
+        parser = configparser.ConfigParser()
+        parser.read(expanduser(self._path))
+        self._parser = parser
+        self.load_time = monotonic() - start_time
+
+    def get(self, section, option, fallback=None):
+        """Return a setting as a string, or the fallback if it is not set."""
+        return self._settings().get(section, option, fallback=fallback)
+
+    def getint(self, section, option, fallback=None):
+        """Return a setting as an integer, or the fallback if it is not set."""
+        return self._convert(self._settings().getint, section, option, fallback)
+
+    def getfloat(self, section, option, fallback=None):
+        """Return a setting as a float, or the fallback if it is not set."""
+        return self._convert(self._settings().getfloat, section, option, fallback)
+
+    def getboolean(self, section, option, fallback=None):
+        """Return a setting as a boolean, or the fallback if it is not set."""
+        return self._convert(self._settings().getboolean, section, option, fallback)
+
+    def section(self, section):
+        """Return the settings of a section by name, or an empty dict if the section is missing.
+
+        :param section: the name of the section
+        :type section: str
+        """
+        parser = self._settings()
+        return dict(parser[section].items()) if parser.has_section(section) else {}
+
+    def sections(self, prefix):
+        """Return the sections whose names start with a prefix, by their names without the prefix.
+
+        :param prefix: the prefix of the section names
+        :type prefix: str
+        """
+        parser = self._settings()
+        return {name[len(prefix):]: parser[name] for name in parser.sections() if name.startswith(prefix)}
+
+    def _convert(self, getter, section, option, fallback):
+        """Return a setting converted by a parser getter, naming the setting if its value is invalid."""
+        try:
+            return getter(section, option, fallback=fallback)
+        except ValueError as error:
+            raise ValueError('Invalid {} in the [{}] section of {}: {}'.format(option, section, self._path,
+                                                                                error)) from None
+
+    def _settings(self):
+        """Return the parsed config file, reading it if it has not been read."""
+        if self._parser is None:
+            self.load()
+        return self._parser
+
+
+# The Chumbot config file
+CONFIG = Config(constants.MUMBLE_CONFIG)
@@ -0,0 +1,157 @@
+"""A stand-in for a pymumble connection with no server, for testing and benchmarking a client offline.
+
+The stand-in records the audio and text messages the client sends, with the time each was sent,
+and simulates the server events the client handles: chat messages and users joining and leaving.
+"""
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+from types import SimpleNamespace
+
+from pymumble_py3.constants import (PYMUMBLE_CLBK_TEXTMESSAGERECEIVED, PYMUMBLE_CLBK_USERCREATED,
+                                    PYMUMBLE_CLBK_USERREMOVED, PYMUMBLE_CMD_MOVE, PYMUMBLE_CMD_TEXTMESSAGE,
+                                    PYMUMBLE_CONN_STATE_CONNECTED)
+
+# Session and channel of the client's own user
+BOT_SESSION = 1
+ROOT_CHANNEL = 0
+
+# Message length limit of a default Murmur server, in bytes
+MAX_MESSAGE_LENGTH = 5000
+
+_PCM_BYTES_PER_SECOND = 48000 * 2
+
+
+class FakeSoundOutput:
+    """Plays audio in real time without sending it, recording the time and size of each frame added."""
+
+    def __init__(self):
+        self.sounds = []
+        self._playing_until = 0.0
+        self._lock = Lock()
+
+    def add_sound(self, pcm):
+        """Queue PCM audio behind the audio still playing."""
+        now = monotonic()
+        with self._lock:
+            self._playing_until = max(self._playing_until, now) + len(pcm) / _PCM_BYTES_PER_SECOND
+            self.sounds.append((now, len(pcm)))
+
+    def get_buffer_size(self):
+        """Return the duration of the queued audio left to play, in seconds."""
+        return max(0.0, self._playing_until - monotonic())
+
+    def first_sound_since(self, start_time):
+        """Return the time of the first frame added at or after a time, or None if there is none."""
+        with self._lock:
+            index = bisect_left(self.sounds, (start_time, 0))
+            return self.sounds[index][0] if index < len(self.sounds) else None
+
+
+class FakeUser(dict):
+    """A Mumble user, as a dictionary of user state like pymumble.users.User."""
+
+    def mute(self):
+        """Mute the user."""
+        self['self_mute'] = True
+
+    def unmute(self):
+        """Unmute the user."""
+        self['self_mute'] = False
+
+
+class FakeUsers(dict):
+    """The users connected to the fake server, by session, starting with the client's own user."""
+
+    def __init__(self, username):
+        super().__init__()
+        self.lock = Lock()
+        self.myself_session = BOT_SESSION
+        self.myself = FakeUser(session=BOT_SESSION, name=username, channel_id=ROOT_CHANNEL)
+        self[BOT_SESSION] = self.myself
+
+
+class FakeCallbacks:
+    """The callbacks added for each pymumble event."""
+
+    def __init__(self):
+        self._callbacks = {}
+
+    def add_callback(self, event, callback):
+        """Add a function called when an event happens."""
+        self._callbacks.setdefault(event, []).append(callback)
+
+    def fire(self, event, *args):
+        """Call the functions added for an event, as the pymumble thread would."""
+        for callback in self._callbacks.get(event, []):
+            callback(*args)
+
+
+class FakeMumble:
+    """A pymumble.Mumble stand-in connected to no server.
+
+    The client sends text messages and moves with execute_command, so these commands are recorded
+    as (time, message) and (time, channel ID) pairs. Audio is recorded by the sound output.
+    """
+
+    def __init__(self, host, user, port=64738, password='', debug=False):
+        self.host = host
+        self.port = port
+        self.callbacks = FakeCallbacks()
+        self.users = FakeUsers(user)
+        self.channels = {}
+        self.sound_output = FakeSoundOutput()
+        self.control_socket = SimpleNamespace(close=lambda: None)
+        self.connected = None
+        self.ready_lock = Lock()
+        self.ready_lock.acquire()
+        self.text_messages = []
+        self.moves = []
+
+    def start(self):
+        """Start the connection, which is ready immediately."""
+        self.connected = PYMUMBLE_CONN_STATE_CONNECTED
+        self.ready_lock.release()
+
+    def is_alive(self):
+        """Return whether the connection has been started and has not stopped."""
+        return self.connected is not None
+
+    def join(self):
+        """Return once the connection has stopped."""
+
+    def my_channel(self):
+        """Return the channel the client's own user is in."""
+        return self.channels[self.users.myself['channel_id']]
+
+    def get_max_message_length(self):
+        """Return the length of the longest text message the server accepts, in bytes."""
+        return MAX_MESSAGE_LENGTH
+
+    def execute_command(self, command, blocking=True):
+        """Record a text message or move sent by the client, once the connection is ready as pymumble does."""
+        self.ready_lock.acquire()
+        self.ready_lock.release()
+        now = monotonic()
+        if command.cmd == PYMUMBLE_CMD_TEXTMESSAGE:
+            self.text_messages.append((now, command.parameters['message']))
+        elif command.cmd == PYMUMBLE_CMD_MOVE:
+            self.moves.append((now, command.parameters['channel_id']))
+            self.users[command.parameters['session']]['channel_id'] = command.parameters['channel_id']
+
+    def receive_message(self, actor, message):
+        """Deliver a chat message sent by a user to the client."""
+        self.callbacks.fire(PYMUMBLE_CLBK_TEXTMESSAGERECEIVED, SimpleNamespace(actor=actor, message=message))
+
+    def add_user(self, session, name, channel_id=ROOT_CHANNEL):
+        """Connect a user to the server, telling the client."""
+        user = FakeUser(session=session, name=name, channel_id=channel_id)
+        with self.users.lock:
+            self.users[session] = user
+        self.callbacks.fire(PYMUMBLE_CLBK_USERCREATED, user)
+
+    def remove_user(self, session):
+        """Disconnect a user from the server, telling the client."""
+        with self.users.lock:
+            user = self.users.pop(session)
+        self.callbacks.fire(PYMUMBLE_CLBK_USERREMOVED, user, None)
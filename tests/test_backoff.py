@@ -0,0 +1,17 @@
+"""Test the Chumbot retry backoff with Unittest."""
+import unittest
+
+from chumbot.backend.backoff import Backoff
+
+
+class TestBackoff(unittest.TestCase):
+    """Test the Backoff class."""
+
+    def test_delays(self):
+        """Test delays double after each attempt within their jitter, up to the maximum."""
+        backoff = Backoff(1.0, 10.0)
+        for maximum in (1.0, 2.0, 4.0, 8.0, 10.0, 10.0):
+            delay = backoff.next_delay()
+            self.assertGreaterEqual(delay, maximum / 2)
+            self.assertLessEqual(delay, maximum)
+        self.assertEqual(6, backoff.attempts)
@@ -0,0 +1,39 @@
+"""Test the Chumbot clip catalog with Unittest."""
+from os.path import join
+from tempfile import TemporaryDirectory
+import unittest
+
+from chumbot.backend.catalog import ClipCatalog
+
+
+class TestClipCatalog(unittest.TestCase):
+    """Test the ClipCatalog class."""
+
+    def setUp(self):
+        """Create a directory for the catalog file."""
+        self._directory = TemporaryDirectory()
+        self._path = join(self._directory.name, 'cache', 'catalog.sqlite')
+
+    def tearDown(self):
+        """Remove the catalog directory."""
+        self._directory.cleanup()
+
+    def test_save_load(self):
+        """Test a saved snapshot is loaded unchanged, replacing the previous snapshot."""
+        catalog = ClipCatalog(self._path)
+        self.assertIsNone(catalog.load())
+
+        catalog.save(1, {'horn': ('horn.mp3', None, None, None)})
+        entries = {'horn': ('horn.mp3', 10, 20, 1.5), 'bell': ('bell.mp3', None, None, None)}
+        catalog.save(2, entries)
+        self.assertEqual((2, entries), ClipCatalog(self._path).load())
+
+    def test_unreadable(self):
+        """Test a catalog file that is not a catalog is ignored and replaced."""
+        with open(self._path.replace('cache', ''), 'w') as catalog_file:
+            catalog_file.write('not a database')
+        catalog = ClipCatalog(self._path.replace('cache', ''))
+        self.assertIsNone(catalog.load())
+
+        catalog.save(1, {})
+        self.assertEqual((1, {}), catalog.load())
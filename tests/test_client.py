@@ -0,0 +1,265 @@
+"""Test the Chumbot Client against a fake Mumble server with Unittest."""
+import asyncio
+from os.path import basename, join
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from time import monotonic, sleep
+import unittest
+from unittest.mock import patch
+
+from pymumble_py3.constants import PYMUMBLE_CLBK_DISCONNECTED, PYMUMBLE_CONN_STATE_AUTHENTICATING
+
+from chumbot.backend import client as client_module
+from chumbot.backend.event_loop import EventLoop
+from chumbot.backend.library import ClipLibrary
+from tests.fake_mumble import FakeMumble, FakeSoundOutput
+
+# pylama:ignore=W0212
+
+_ENCODING = (40000, 0.02, 'audio')
+_FRAME_SIZE = 1920
+_TIMEOUT = 5.0
+
+
+def _encode(pcm, encoding):
+    """Return fake Opus packets of PCM audio, one per 20 ms frame, each holding the frame's first byte."""
+    return [pcm[i:i + 1] for i in range(0, len(pcm), _FRAME_SIZE)]
+
+
+def _wait_until(condition, timeout=_TIMEOUT):
+    """Wait until a condition is true, returning whether it became true before the timeout."""
+    deadline = monotonic() + timeout
+    while not condition():
+        if monotonic() > deadline:
+            return False
+        sleep(0.01)
+    return True
+
+
+class _FakeDecoder:
+    """A decoder returning a clip file's contents as its PCM, recording each decode and stream."""
+
+    def __init__(self):
+        self.decoded = []
+        self.delays = {}
+        self.frame_delay = 0.0
+        self.streamed = []
+        self.closed_streams = []
+
+    def decode(self, path):
+        self.decoded.append(basename(path))
+        with open(path, 'rb') as clip_file:
+            return clip_file.read()
+
+    async def decode_async(self, path):
+        await asyncio.sleep(self.delays.get(basename(path), 0.0))
+        return self.decode(path)
+
+    def close(self):
+        pass
+
+    async def stream_async(self, path, frame_size):
+        pcm = self.decode(path)
+        try:
+            for i in range(0, len(pcm), frame_size):
+                await asyncio.sleep(self.frame_delay)
+                yield pcm[i:i + frame_size]
+            self.streamed.append(basename(path))
+        finally:
+            self.closed_streams.append(basename(path))
+
+
+class _PacketSoundOutput(FakeSoundOutput):
+    """A sound output that can send Opus packets encoded ahead of time, recording each packet sent."""
+
+    def __init__(self):
+        super().__init__()
+        self.encoding = _ENCODING
+        self.packets = []
+
+    def add_packet(self, pcm, packet, encoding):
+        self.packets.append(packet)
+        self.add_sound(pcm)
+
+
+class _PacketMumble(FakeMumble):
+    """A fake Mumble connection whose sound output sends packets."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sound_output = _PacketSoundOutput()
+
+
+class _HangingMumble(_PacketMumble):
+    """A fake Mumble connection to a server that never finishes the handshake."""
+
+    def start(self):
+        self.connected = PYMUMBLE_CONN_STATE_AUTHENTICATING
+
+
+async def _reachable(_):
+    """Report the server as accepting connections."""
+    return True
+
+
+class TestClient(unittest.TestCase):
+    """Test the Client class."""
+
+    def setUp(self):
+        """Create a clip directory with a few clips and a client connected to a fake server."""
+        self._directory = TemporaryDirectory()
+        # The clips are not a whole number of frames long
+        self._write('horn.mp3', b'\x01\x00' * 1500)
+        self._write('bell.mp3', b'\x02\x00' * 2500)
+        self._decoder = _FakeDecoder()
+        self._library = ClipLibrary(self._directory.name, self._decoder, 1 << 20)
+        self._loop = EventLoop()
+        self._loop.start()
+        with patch.object(client_module.pymumble, 'Mumble', _PacketMumble), \
+                patch.object(client_module, 'PacketMumble', _PacketMumble):
+            self._client = client_module.Client('chumbot', 'localhost', 64738, '', False, self._library, self._loop)
+        self._client.connect()
+        self._mumble = self._client._mumble
+
+    def tearDown(self):
+        """Close the client and remove the clip directory."""
+        self._client.close()
+        self._library.close()
+        self._loop.stop()
+        self._directory.cleanup()
+
+    def _write(self, filename, contents):
+        """Write a file to the clip directory."""
+        with open(join(self._directory.name, filename), 'wb') as clip_file:
+            clip_file.write(contents)
+
+    def test_packets_across_clips(self):
+        """Test the packets of every clip in a request are sent, when the clips are not whole frames long."""
+        with patch('chumbot.backend.library.opus.encode', side_effect=_encode):
+            self._library.warm()
+            self._client.play_clips('horn,bell')
+            sound_output = self._mumble.sound_output
+            self.assertTrue(_wait_until(lambda: len(sound_output.packets) >= 5))
+        self.assertEqual([b'\x01'] * 2 + [b'\x02'] * 3, sound_output.packets)
+
+    def test_decodes_out_of_order(self):
+        """Test clips decoded out of order are still played in the order they were requested."""
+        self._write('wow.mp3', b'\x03\x00' * 2000)
+        self._library.clips.update_file('wow.mp3')
+        self._decoder.delays['bell.mp3'] = 0.2
+        with patch('chumbot.backend.library.opus.encode', side_effect=_encode), \
+                patch.object(client_module.constants, 'PLAYBACK_PREFETCH', 2):
+            self._client.play_clips('horn,bell,wow')
+            sound_output = self._mumble.sound_output
+            self.assertTrue(_wait_until(lambda: len(sound_output.packets) >= 6))
+        self.assertLess(self._decoder.decoded.index('wow.mp3'), self._decoder.decoded.index('bell.mp3'))
+        self.assertEqual([b'\x02'] * 3 + [b'\x03'] * 3, sound_output.packets)
+
+    def test_stream(self):
+        """Test a clip's first frames are played while it is decoded, and decoding stops on disconnecting."""
+        self._write('long.mp3', b'\x04\x00' * 96000)
+        self._library.clips.update_file('long.mp3')
+        self._decoder.frame_delay = 0.02
+        self._client.play_clips('long')
+        self.assertTrue(_wait_until(lambda: self._mumble.sound_output.sounds))
+        self.assertEqual([], self._decoder.closed_streams)
+
+        self._client.disconnect()
+        self.assertTrue(_wait_until(lambda: self._decoder.closed_streams))
+        self.assertEqual([], self._decoder.streamed)
+
+    def test_undecodable_clip(self):
+        """Test a clip that cannot be decoded is skipped, and the clips after it still play."""
+        self._write('empty.mp3', b'')
+        self._library.clips.update_file('empty.mp3')
+        with patch('chumbot.backend.library.opus.encode', side_effect=_encode):
+            self._client.play_clips('bell,empty,horn')
+            sound_output = self._mumble.sound_output
+            self.assertTrue(_wait_until(lambda: b'\x01' in sound_output.packets))
+
+    def test_slow_message(self):
+        """Test a user's clips play while another user's message is still being handled."""
+        searching = Event()
+        finish_search = Event()
+
+        def search(clip_name):
+            searching.set()
+            finish_search.wait(_TIMEOUT)
+            return []
+
+        with patch.object(self._library.clips.index, 'search', side_effect=search):
+            self._mumble.receive_message(2, '?horn')
+            self.assertTrue(searching.wait(_TIMEOUT))
+            self._mumble.receive_message(3, 'bell')
+            played = _wait_until(lambda: self._mumble.sound_output.sounds, _TIMEOUT / 5)
+            finish_search.set()
+        self.assertTrue(played)
+
+    def test_pinned_event_clips(self):
+        """Test pinned link, join and leave clips play at once without going through the playback queue."""
+        queue = self._client._playback_queue
+        self._library.pin(['horn', 'bell', 'horn, bell'])
+        decoded = list(self._decoder.decoded)
+        settings = self._client._settings
+        with patch.object(settings, 'link_posted_clip', 'horn'), \
+                patch.object(settings, 'user_joined_clip_default', 'bell'), \
+                patch.object(settings, 'user_left_clip_default', 'horn, bell'), \
+                patch.object(self._client._mixer, 'play', wraps=self._client._mixer.play) as play:
+            self._loop.call(setattr, queue, '_max_clips', 0)
+            self._mumble.receive_message(2, '<a href="https://example.com">link</a>')
+            self._mumble.add_user(2, 'Alice')
+            self._mumble.remove_user(2)
+            self.assertTrue(_wait_until(lambda: self._mumble.sound_output.sounds))
+        self.assertEqual(['horn', 'bell', 'horn, bell'], [call.args[2] for call in play.call_args_list])
+        self.assertEqual((0, 0), self._loop.call(lambda: (queue.played, queue.dropped)))
+        self.assertEqual(decoded, self._decoder.decoded)
+
+    def test_dropped_random_request(self):
+        """Test a request dropped by the full playback queue picks no random clip and records no play."""
+        picker = self._library.clips.picker
+        queue = self._client._playback_queue
+        with patch.object(picker, 'pick', wraps=picker.pick) as pick, \
+                patch.object(picker, 'played', wraps=picker.played) as played:
+            self._loop.call(setattr, queue, '_max_clips', 0)
+            self._client.play_clips('*,horn', user=1)
+            self._client.play_random(user=1)
+            self.assertEqual(2, self._loop.call(getattr, queue, 'dropped'))
+            pick.assert_not_called()
+            played.assert_not_called()
+
+            self._loop.call(setattr, queue, '_max_clips', 30)
+            self._client.play_clips('*,horn', user=1)
+            self._loop.call(lambda: None)
+            pick.assert_called_once_with()
+            played.assert_called_once_with('horn')
+
+    def test_command_while_reconnecting(self):
+        """Test a text message sent while the connection is not ready is dropped without blocking the event loop."""
+        self._mumble.ready_lock.acquire()
+        self._mumble.connected = PYMUMBLE_CONN_STATE_AUTHENTICATING
+        try:
+            sender = Thread(target=self._loop.call, args=(self._client._send_text_message, 'hello'), daemon=True)
+            sender.start()
+            sender.join(_TIMEOUT / 5)
+            self.assertFalse(sender.is_alive())
+        finally:
+            self._mumble.ready_lock.release()
+        self.assertEqual([], self._mumble.text_messages)
+
+    def test_never_ready(self):
+        """Test a server that never finishes the handshake fails the connection, and reconnecting backs off."""
+        with patch.object(client_module.constants, 'CONNECT_TIMEOUT', 0.2), \
+                patch.object(client_module, 'PacketMumble', _HangingMumble), \
+                patch.object(client_module.Client, '_server_reachable', _reachable), \
+                patch.object(self._client._settings, 'reconnect_min_delay', 0.01), \
+                patch.object(self._client._settings, 'reconnect_max_delay', 0.05):
+            Thread(target=self._mumble.callbacks.fire, args=(PYMUMBLE_CLBK_DISCONNECTED,)).start()
+            self.assertTrue(_wait_until(lambda: self._client._reconnect_attempts >= 2))
+            self._client.disconnect()
+            self.assertIsNone(self._client._supervisor)
+            self._client.connect()
+        self.assertFalse(self._client._connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""Test the Chumbot clip name index with Unittest."""
+import unittest
+
+from chumbot.backend.clip_index import ClipIndex
+
+
+class TestClipIndex(unittest.TestCase):
+    """Test the ClipIndex class."""
+
+    def setUp(self):
+        """Index a few clip names."""
+        self._index = ClipIndex(['airhorn', 'bruh', 'horn', 'sad_horn', 'horns_of_doom', 'wow'])
+
+    def test_names(self):
+        """Test the names are kept sorted."""
+        self._index.add('ahh')
+        self.assertEqual(['ahh', 'airhorn', 'bruh', 'horn', 'horns_of_doom', 'sad_horn', 'wow'], self._index.names)
+
+    def test_prefix(self):
+        """Test finding names by prefix."""
+        self.assertEqual(['horn', 'horns_of_doom'], self._index.prefix('horn'))
+        self.assertEqual([], self._index.prefix('x'))
+
+    def test_search(self):
+        """Test substring matches are ranked after prefix matches."""
+        self.assertEqual(['horn', 'horns_of_doom', 'airhorn', 'sad_horn'], self._index.search('horn'))
+        self.assertEqual(['bruh'], self._index.search('ru'))
+        self.assertEqual([], self._index.search('xyz'))
+
+    def test_suggest(self):
+        """Test suggesting similar names for a misspelled name."""
+        self.assertEqual('airhorn', self._index.suggest('airhron')[0])
+        self.assertEqual([], self._index.suggest('qqqq'))
+
+    def test_suggest_transposition(self):
+        """Test suggesting a name for a query with two letters swapped, sharing no trigram with it."""
+        self.assertEqual('horn', self._index.suggest('hron')[0])
+        self.assertEqual('bruh', self._index.suggest('burh')[0])
+
+    def test_remove(self):
+        """Test removed names are no longer found."""
+        self._index.remove('horn')
+        self.assertNotIn('horn', self._index)
+        self.assertEqual(['horns_of_doom', 'airhorn', 'sad_horn'], self._index.search('horn'))
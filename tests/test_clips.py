@@ -0,0 +1,186 @@
+"""Test the Chumbot sound clip dictionary with Unittest."""
+from os import makedirs, remove, rename
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import sleep
+import unittest
+from unittest.mock import patch
+
+from chumbot.backend.catalog import ClipCatalog
+from chumbot.backend import clip_watcher
+from chumbot.backend.clip_watcher import ClipWatcher
+from chumbot.backend.clips import Clips
+
+
+class TestClips(unittest.TestCase):
+    """Test the Clips and ClipWatcher classes."""
+
+    def setUp(self):
+        """Create a clip directory with a few clips."""
+        self._directory = TemporaryDirectory()
+        for filename in ('horn.mp3', '_link.mp3', 'notes.txt'):
+            self._touch(filename)
+        self._clips = Clips(self._directory.name, '.mp3')
+        self._invalidated = []
+        self._clips.add_reload_callback(self._invalidated.extend)
+
+    def tearDown(self):
+        """Remove the clip directory."""
+        self._directory.cleanup()
+
+    def _touch(self, filename):
+        """Create an empty file in the clip directory."""
+        with open(join(self._directory.name, filename), 'wb'):
+            pass
+
+    def _write(self, filename, contents):
+        """Write a file in the clip directory."""
+        with open(join(self._directory.name, filename), 'wb') as clip_file:
+            clip_file.write(contents)
+
+    def _wait_for(self, condition):
+        """Wait until a condition is true, failing the test if it does not become true."""
+        for _ in range(50):
+            if condition():
+                return
+            sleep(0.05)
+        self.fail('Timed out waiting for the clips to change')
+
+    def test_load(self):
+        """Test only clips with the clip extension are loaded, and hidden clips are not indexed."""
+        self.assertEqual({'horn': 'horn.mp3', '_link': '_link.mp3'}, dict(self._clips))
+        self.assertEqual(['horn'], self._clips.index.names)
+
+    def test_deferred_load(self):
+        """Test clips can be loaded after the dictionary is created, notifying the reload callbacks."""
+        clips = Clips(self._directory.name, '.mp3', load=False)
+        invalidated = []
+        clips.add_reload_callback(invalidated.extend)
+        self.assertEqual({}, dict(clips))
+        clips.load()
+        self.assertEqual(['horn'], clips.index.names)
+        self.assertEqual(['_link', 'horn'], sorted(invalidated))
+
+    def test_catalog(self):
+        """Test clips are loaded from a saved catalog, and reloaded only if the clip directory changed."""
+        # The catalog's directory is created before the clips are scanned, as the clip store is
+        makedirs(join(self._directory.name, 'cache'))
+        catalog = ClipCatalog(join(self._directory.name, 'cache', 'catalog.sqlite'))
+        clips = Clips(self._directory.name, '.mp3', catalog=catalog)
+        clips.set_duration('horn', clips.stamp('horn'), 1.5)
+        clips.save_catalog()
+
+        clips = Clips(self._directory.name, '.mp3', load=False, catalog=catalog)
+        self.assertTrue(clips.load_catalog())
+        self.assertEqual({'horn': 'horn.mp3', '_link': '_link.mp3'}, dict(clips))
+        self.assertEqual(['horn'], clips.index.names)
+        self.assertEqual(1.5, clips.duration('horn'))
+        self.assertFalse(clips.validate())
+
+        # Files other than clips, such as the clip store, change the directory without reloading the clips
+        sleep(0.01)
+        makedirs(join(self._directory.name, '.chumbot-cache'))
+        with patch.object(clips, '_scan', wraps=clips._scan) as scan:  # pylint: disable=protected-access
+            self.assertFalse(clips.validate())
+            self.assertFalse(clips.validate())
+        scan.assert_called_once_with()
+
+        sleep(0.01)
+        self._touch('wow.mp3')
+        self.assertTrue(clips.validate())
+        self.assertEqual(['horn', 'wow'], clips.index.names)
+        self.assertEqual(1.5, clips.duration('horn'))
+        self.assertIsNone(clips.duration('wow'))
+
+    def test_reload(self):
+        """Test reloading applies only the differences to the clip directory."""
+        self._touch('wow.mp3')
+        remove(join(self._directory.name, 'horn.mp3'))
+        self._clips.reload()
+        self.assertEqual({'wow': 'wow.mp3', '_link': '_link.mp3'}, dict(self._clips))
+        self.assertEqual(['wow'], self._clips.index.names)
+        self.assertEqual({'wow', '_link'}, {self._clips.picker.pick() for _ in range(50)})
+        self.assertEqual({'wow', 'horn'}, set(self._invalidated))
+
+    def test_watcher(self):
+        """Test the watcher applies added, removed and renamed clips."""
+        watcher = ClipWatcher(self._clips, 0.05)
+        watcher.start()
+        sleep(0.1)
+        self._touch('wow.mp3')
+        rename(join(self._directory.name, 'horn.mp3'), join(self._directory.name, 'airhorn.mp3'))
+        remove(join(self._directory.name, '_link.mp3'))
+        for _ in range(50):
+            if dict(self._clips) == {'wow': 'wow.mp3', 'airhorn': 'airhorn.mp3'}:
+                break
+            sleep(0.05)
+        watcher.stop()
+        self.assertEqual({'wow': 'wow.mp3', 'airhorn': 'airhorn.mp3'}, dict(self._clips))
+        self.assertEqual(['airhorn', 'wow'], self._clips.index.names)
+
+    def test_watcher_errors(self):
+        """Test the watcher carries on after a change fails to apply, and polls once inotify fails."""
+        update_file = self._clips.update_file
+
+        def update_file_failing(filename):
+            if filename == 'bad.mp3':
+                raise RuntimeError(filename)
+            update_file(filename)
+
+        watcher = ClipWatcher(self._clips, 0.05)
+        with patch.object(self._clips, 'update_file', side_effect=update_file_failing), \
+                patch('chumbot.backend.clip_watcher.print_exc') as print_exc:
+            watcher.start()
+            sleep(0.1)
+            self._touch('bad.mp3')
+            self._touch('wow.mp3')
+            self._wait_for(lambda: 'wow' in self._clips)
+        print_exc.assert_called_once_with()
+
+        with patch('chumbot.backend.clip_watcher.read', side_effect=OSError('inotify failed')), \
+                patch('builtins.print'):
+            self._touch('bell.mp3')
+            self._wait_for(lambda: 'bell' in self._clips)
+            self._touch('airhorn.mp3')
+            self._wait_for(lambda: 'airhorn' in self._clips)
+        watcher.stop()
+        self.assertEqual({'_link', 'airhorn', 'bad', 'bell', 'horn', 'wow'}, set(self._clips))
+
+    def test_remote_filesystem(self):
+        """Test directories on network filesystems are found from the mounted filesystems."""
+        mounts_path = join(self._directory.name, 'mounts')
+        with open(mounts_path, 'w') as mounts_file:
+            mounts_file.write('/dev/sda1 / ext4 rw 0 0\n'
+                              'server:/clips /mnt/my\\040clips nfs4 rw 0 0\n'
+                              'user@host:/ /mnt/my\\040clips/ssh fuse.sshfs rw 0 0\n'
+                              '/dev/sdb1 /mnt/my\\040clips/local ext4 rw 0 0\n')
+        remote_filesystem = clip_watcher._remote_filesystem  # pylint: disable=protected-access
+        with patch.object(clip_watcher, '_MOUNTS_PATH', mounts_path):
+            self.assertFalse(remote_filesystem('/home/clips'))
+            self.assertTrue(remote_filesystem('/mnt/my clips'))
+            self.assertTrue(remote_filesystem('/mnt/my clips/ssh/a'))
+            self.assertFalse(remote_filesystem('/mnt/my clips/local'))
+            self.assertFalse(remote_filesystem('/mnt/my clipsx'))
+
+    def test_reload_overwritten(self):
+        """Test reloading applies a clip file overwritten in place, once the clip has been stamped."""
+        self._clips.stamp('horn')
+        self._write('horn.mp3', b'new horn')
+        self._clips.reload()
+        self.assertEqual(['horn'], self._invalidated)
+
+    def test_poll_overwritten(self):
+        """Test the polling watcher applies a stamped clip file overwritten in place."""
+        self._clips.stamp('horn')
+        with patch('chumbot.backend.clip_watcher._inotify_watch', return_value=None):
+            watcher = ClipWatcher(self._clips, 0.05)
+            watcher.start()
+            sleep(0.1)
+            self._write('horn.mp3', b'new horn')
+            for _ in range(50):
+                if self._invalidated:
+                    break
+                sleep(0.05)
+            watcher.stop()
+        self.assertEqual(['horn'], self._invalidated)
+
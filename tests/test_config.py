@@ -0,0 +1,52 @@
+"""Test the Chumbot config file with Unittest."""
+from os.path import join
+from tempfile import TemporaryDirectory
+import unittest
+
+from chumbot.config import Config
+
+
+class TestConfig(unittest.TestCase):
+    """Test the Config class."""
+
+    def setUp(self):
+        """Write a config file with a few sections."""
+        self._directory = TemporaryDirectory()
+        self._path = join(self._directory.name, 'chumbot.ini')
+        with open(self._path, 'w') as config_file:
+            config_file.write('[mumble]\nPort = 2112\n\n[mumble:home]\nHost = home\n\n[join]\nuser1 = horn\n\n'
+                              '[weights]\nhorn = loud\n')
+
+    def tearDown(self):
+        """Remove the config file."""
+        self._directory.cleanup()
+
+    def test_lazy_load(self):
+        """Test the config file is read only once a setting is looked up."""
+        config = Config(self._path)
+        self.assertIsNone(config.load_time)
+        self.assertEqual(2112, config.getint('mumble', 'Port'))
+        self.assertIsNotNone(config.load_time)
+
+    def test_fallbacks(self):
+        """Test missing settings and sections take their fallbacks."""
+        config = Config(self._path)
+        self.assertEqual('~/clips', config.get('clips', 'ClipDir', fallback='~/clips'))
+        self.assertFalse(config.getboolean('clips', 'Normalize', fallback=False))
+        self.assertEqual({}, config.section('disconnect'))
+        self.assertEqual({}, Config(join(self._directory.name, 'missing.ini')).section('mumble'))
+
+    def test_sections(self):
+        """Test looking up sections by name and by prefix."""
+        config = Config(self._path)
+        self.assertEqual({'user1': 'horn'}, config.section('join'))
+        self.assertEqual(['home'], list(config.sections('mumble:')))
+        self.assertEqual('home', config.sections('mumble:')['home']['Host'])
+
+    def test_invalid(self):
+        """Test an invalid setting is reported with its section and key."""
+        config = Config(self._path)
+        with self.assertRaisesRegex(ValueError, r'Invalid horn in the \[weights\] section'):
+            config.getfloat('weights', 'horn')
+        with self.assertRaisesRegex(ValueError, r'Invalid Host in the \[mumble:home\] section'):
+            config.getint('mumble:home', 'Host')
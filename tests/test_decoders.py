@@ -0,0 +1,178 @@
+"""Test the Chumbot sound clip decoders with Unittest."""
+import asyncio
+from contextlib import closing
+from os.path import join
+from tempfile import TemporaryDirectory
+import subprocess as sp
+from threading import current_thread
+import unittest
+from unittest.mock import patch
+import wave
+
+from chumbot.backend import constants
+from chumbot.backend.decoders import FFmpegDecoder, FFmpegPoolDecoder, MiniaudioDecoder, create_decoder, \
+    FFMPEG, MINIAUDIO
+
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+
+# A stand-in for ffmpeg that copies its input and then fails
+_FAILING_COMMAND = ['sh', '-c', 'cat; exit 1']
+
+
+class TestDecoders(unittest.TestCase):
+    """Test the decoder backends."""
+
+    def test_create_ffmpeg(self):
+        """Test creating the ffmpeg decoder by name."""
+        self.assertIsInstance(create_decoder(FFMPEG), FFmpegDecoder)
+
+    @unittest.skipIf(miniaudio is None, 'miniaudio is not installed')
+    def test_miniaudio(self):
+        """Test decoding and streaming a clip with miniaudio."""
+        with TemporaryDirectory() as directory:
+            path = join(directory, 'silence.wav')
+            with closing(wave.open(path, 'wb')) as wave_file:
+                wave_file.setnchannels(1)
+                wave_file.setsampwidth(2)
+                wave_file.setframerate(48000)
+                wave_file.writeframes(b'\x00\x00' * 4800)
+
+            decoder = create_decoder(MINIAUDIO)
+            self.assertIsInstance(decoder, MiniaudioDecoder)
+            self.assertEqual(9600, len(decoder.decode(path)))
+            stream_file = miniaudio.stream_file
+            threads = []
+
+            def stream_file_on_thread(*args, **kwargs):
+                threads.append(current_thread())
+                return stream_file(*args, **kwargs)
+
+            with patch.object(miniaudio, 'stream_file', side_effect=stream_file_on_thread):
+                frames = asyncio.run(_stream_async(decoder, path, 1920))
+            self.assertEqual(b''.join(frames), decoder.decode(path))
+            self.assertTrue(all(len(frame) == 1920 for frame in frames))
+            self.assertNotIn(current_thread(), threads)
+
+
+async def _stream_async(decoder, path, frame_size, frames=None):
+    """Return the first frames of a clip streamed asynchronously by a decoder, or all of them."""
+    streamed = []
+    stream = decoder.stream_async(path, frame_size)
+    async for frame in stream:
+        streamed.append(frame)
+        if len(streamed) == frames:
+            break
+    await stream.aclose()
+    return streamed
+
+
+@patch.object(constants, 'CONVERT_COMMAND', ['cat'])
+class TestFFmpegDecoderAsync(unittest.TestCase):
+    """Test decoding with asyncio subprocesses, with cat standing in for ffmpeg."""
+
+    def setUp(self):
+        """Create a clip file."""
+        self._directory = TemporaryDirectory()
+        self._path = join(self._directory.name, 'clip.mp3')
+        with open(self._path, 'wb') as clip_file:
+            clip_file.write(b'\x01\x02' * 5000)
+
+    def tearDown(self):
+        """Remove the clip file."""
+        self._directory.cleanup()
+
+    def test_decode_async(self):
+        """Test decoding a clip with an asyncio subprocess."""
+        self.assertEqual(b'\x01\x02' * 5000, asyncio.run(FFmpegDecoder().decode_async(self._path)))
+
+    def test_stream_async(self):
+        """Test streaming a clip in frames, stopping part way through."""
+        frames = asyncio.run(_stream_async(FFmpegDecoder(), self._path, 1920))
+        self.assertEqual(b'\x01\x02' * 5000, b''.join(frames))
+        self.assertEqual([1920] * 5 + [400], [len(frame) for frame in frames])
+        self.assertEqual(1, len(asyncio.run(_stream_async(FFmpegDecoder(), self._path, 1920, 1))))
+
+    def test_failure(self):
+        """Test a clip ffmpeg fails to decode raises, even once its output has been read or streamed."""
+        decoder = FFmpegDecoder()
+        with patch.object(constants, 'CONVERT_COMMAND', _FAILING_COMMAND):
+            with self.assertRaises(sp.CalledProcessError):
+                decoder.decode(self._path)
+            with self.assertRaises(sp.CalledProcessError):
+                asyncio.run(decoder.decode_async(self._path))
+            frames = []
+
+            async def stream():
+                async for frame in decoder.stream_async(self._path, 1920):
+                    frames.append(frame)
+
+            with self.assertRaises(sp.CalledProcessError):
+                asyncio.run(stream())
+        self.assertEqual(b'\x01\x02' * 5000, b''.join(frames))
+
+
+@patch.object(constants, 'CONVERT_COMMAND', ['cat'])
+class TestFFmpegPoolDecoder(unittest.TestCase):
+    """Test the ffmpeg process pool, with cat standing in for ffmpeg."""
+
+    def setUp(self):
+        """Create a clip file."""
+        self._directory = TemporaryDirectory()
+        self._path = join(self._directory.name, 'clip.mp3')
+        with open(self._path, 'wb') as clip_file:
+            clip_file.write(b'\x01\x02' * 5000)
+
+    def tearDown(self):
+        """Remove the clip file."""
+        self._directory.cleanup()
+
+    def test_decode(self):
+        """Test decoding more clips than there are idle processes."""
+        decoder = FFmpegPoolDecoder(2, 5)
+        for _ in range(5):
+            self.assertEqual(b'\x01\x02' * 5000, decoder.decode(self._path))
+        decoder.close()
+
+    def test_stream_async(self):
+        """Test streaming a clip in frames from a pooled process, stopping part way through."""
+        decoder = FFmpegPoolDecoder(1, 5)
+        frames = asyncio.run(_stream_async(decoder, self._path, 1920))
+        self.assertEqual([1920] * 5 + [400], [len(frame) for frame in frames])
+        self.assertEqual(b'\x01\x02' * 5000, b''.join(frames))
+        self.assertEqual(1, len(asyncio.run(_stream_async(decoder, self._path, 1920, 1))))
+        decoder.close()
+
+    def test_restart(self):
+        """Test idle processes that exited are replaced."""
+        decoder = FFmpegPoolDecoder(1, 5)
+        process = decoder._idle_processes.get()  # pylint: disable=protected-access
+        process.kill()
+        process.wait()
+        decoder._idle_processes.put(process)  # pylint: disable=protected-access
+        self.assertEqual(b'\x01\x02' * 5000, decoder.decode(self._path))
+        self.assertEqual(1, decoder.restarts)
+        decoder.close()
+
+    def test_failure(self):
+        """Test a clip ffmpeg fails to decode raises."""
+        with patch.object(constants, 'CONVERT_COMMAND', _FAILING_COMMAND):
+            decoder = FFmpegPoolDecoder(1, 5)
+            with self.assertRaises(sp.CalledProcessError):
+                decoder.decode(self._path)
+            with self.assertRaises(sp.CalledProcessError):
+                asyncio.run(_stream_async(decoder, self._path, 1920))
+        decoder.close()
+
+    def test_timeout(self):
+        """Test decoding gives up after the timeout."""
+        with patch.object(constants, 'CONVERT_COMMAND', ['sleep', '5']):
+            decoder = FFmpegPoolDecoder(1, 0.1)
+            with self.assertRaises(sp.TimeoutExpired):
+                decoder.decode(self._path)
+            with self.assertRaises(sp.TimeoutExpired):
+                asyncio.run(_stream_async(decoder, self._path, 1920))
+        self.assertEqual(2, decoder.timeouts)
+        decoder.close()
@@ -0,0 +1,97 @@
+"""Test the Chumbot message dispatcher with Unittest."""
+import asyncio
+import unittest
+
+from chumbot.backend.dispatcher import Dispatcher, DROP_OLDEST
+
+
+async def _wait_for_handled(dispatcher, count):
+    """Wait until a dispatcher has handled a number of items."""
+    while dispatcher.handled < count:
+        await asyncio.sleep(0.01)
+
+
+class TestDispatcher(unittest.TestCase):
+    """Test the Dispatcher class."""
+
+    def test_round_robin(self):
+        """Test users take turns and each user's items stay in order."""
+        handled = []
+
+        async def handle(item):
+            handled.append(item)
+
+        async def dispatch():
+            dispatcher = Dispatcher(handle, 1, 10)
+            for item in ('a1', 'a2', 'a3'):
+                dispatcher.submit('a', item)
+            dispatcher.submit('b', 'b1')
+            dispatcher.start()
+            await _wait_for_handled(dispatcher, 4)
+            await dispatcher.stop()
+
+        asyncio.run(dispatch())
+        self.assertEqual(['a1', 'b1', 'a2', 'a3'], handled)
+
+    def test_drop_newest(self):
+        """Test items submitted to a full queue are dropped."""
+        dispatcher = Dispatcher(None, 1, 2)
+        self.assertTrue(dispatcher.submit('a', 1))
+        self.assertTrue(dispatcher.submit('a', 2))
+        self.assertFalse(dispatcher.submit('b', 3))
+        self.assertEqual(1, dispatcher.dropped)
+        self.assertEqual(2, dispatcher.depth)
+
+    def test_drop_oldest(self):
+        """Test the oldest item of the busiest user is dropped from a full queue."""
+        handled = []
+
+        async def handle(item):
+            handled.append(item)
+
+        async def dispatch():
+            dispatcher = Dispatcher(handle, 1, 2, DROP_OLDEST)
+            dispatcher.submit('a', 'a1')
+            dispatcher.submit('a', 'a2')
+            self.assertTrue(dispatcher.submit('b', 'b1'))
+            dispatcher.start()
+            await _wait_for_handled(dispatcher, 2)
+            await dispatcher.stop()
+
+        asyncio.run(dispatch())
+        self.assertEqual(['a2', 'b1'], handled)
+
+    def test_handler_error(self):
+        """Test a failing handler does not stop the worker."""
+        handled = []
+
+        async def handle(item):
+            if item == 'fail':
+                raise ValueError(item)
+            handled.append(item)
+
+        async def dispatch():
+            dispatcher = Dispatcher(handle, 1, 10)
+            dispatcher.start()
+            dispatcher.submit('a', 'fail')
+            dispatcher.submit('a', 'ok')
+            await asyncio.wait_for(_wait_for_handled(dispatcher, 2), 1)
+            await dispatcher.stop()
+
+        asyncio.run(dispatch())
+        self.assertEqual(['ok'], handled)
+
+    def test_concurrent_users(self):
+        """Test items of different users are handled at the same time."""
+        async def handle(item):
+            await asyncio.sleep(0.2)
+
+        async def dispatch():
+            dispatcher = Dispatcher(handle, 4, 10)
+            dispatcher.start()
+            for user in 'abcd':
+                dispatcher.submit(user, user)
+            await asyncio.wait_for(_wait_for_handled(dispatcher, 4), 0.5)
+            await dispatcher.stop()
+
+        asyncio.run(dispatch())
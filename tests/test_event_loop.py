@@ -0,0 +1,40 @@
+"""Test the Chumbot event loop thread with Unittest."""
+import asyncio
+import unittest
+
+from chumbot.backend.event_loop import EventLoop
+
+
+class TestEventLoop(unittest.TestCase):
+    """Test the EventLoop class."""
+
+    def setUp(self):
+        """Start an event loop."""
+        self._loop = EventLoop()
+        self._loop.start()
+
+    def tearDown(self):
+        """Stop the event loop."""
+        self._loop.stop()
+
+    def test_call(self):
+        """Test calling a function on the event loop from another thread."""
+        self.assertTrue(self._loop.call(lambda: asyncio.get_running_loop() is self._loop.loop))
+        with self.assertRaises(ValueError):
+            self._loop.call(int, 'x')
+
+    def test_stop_cancels_tasks(self):
+        """Test stopping the event loop cancels its running tasks."""
+        cancelled = []
+
+        async def wait_forever():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        future = self._loop.run(wait_forever())
+        self._loop.stop()
+        self.assertTrue(future.cancelled())
+        self.assertEqual([True], cancelled)
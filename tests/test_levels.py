@@ -0,0 +1,64 @@
+"""Test the Chumbot clip loudness and trim levels with Unittest."""
+from array import array
+from math import sqrt
+from os import listdir, makedirs
+from os.path import join
+from tempfile import TemporaryDirectory
+import unittest
+
+from chumbot.backend import pcm as pcm_ops
+from chumbot.backend.levels import ClipLevels
+
+
+def _pcm(samples):
+    """Return PCM audio of a list of samples."""
+    return array('h', samples).tobytes()
+
+
+class TestLevels(unittest.TestCase):
+    """Test the PCM operations and ClipLevels class."""
+
+    def test_analyze(self):
+        """Test finding the peak, RMS level and non-silent bounds of PCM audio."""
+        peak, rms, start, end = pcm_ops.analyze(_pcm([0, 1, 1000, -2000, 0, 0]), 10)
+        self.assertEqual(2000, peak)
+        self.assertAlmostEqual(912.87, rms, places=2)
+        self.assertEqual((2, 4), (start, end))
+
+    def test_apply_levels(self):
+        """Test trimming and scaling PCM audio, saturating overflowing samples."""
+        self.assertEqual(_pcm([2000, -32768, 32767]),
+                         pcm_ops.apply_levels(_pcm([0, 1000, -20000, 30000, 0]), 2.0, 1, 4))
+
+    def test_clip_levels(self):
+        """Test computing, persisting and invalidating clip levels."""
+        with TemporaryDirectory() as directory:
+            path = join(directory, 'levels.json')
+            levels = ClipLevels(path, -20.0, 12.0, -50.0, 1)
+            levels.analyze('clip', (1, 10), _pcm([0, 0, 0, 1000, 2000, 1000, 0, 0]))
+            levels.save()
+
+            gain, start, end = ClipLevels(path, -20.0, 12.0, -50.0, 1).get('clip', (1, 10))
+            self.assertAlmostEqual(3276.8 / sqrt(750000), gain)
+            self.assertEqual((2, 7), (start, end))
+            self.assertIsNone(levels.get('clip', (2, 10)))
+
+    def test_save(self):
+        """Test saving replaces the index through a temporary file that is not left behind."""
+        with TemporaryDirectory() as directory:
+            path = join(directory, 'levels.json')
+            # A leftover file at a fixed temporary path does not block saving
+            makedirs(path + '.tmp')
+            levels = ClipLevels(path, -20.0, 12.0, -50.0, 1)
+            levels.analyze('clip', (1, 10), _pcm([1000, 2000, 1000]))
+            levels.save()
+            self.assertEqual(['levels.json', 'levels.json.tmp'], sorted(listdir(directory)))
+            self.assertIsNotNone(ClipLevels(path, -20.0, 12.0, -50.0, 1).get('clip', (1, 10)))
+
+    def test_peak_limited(self):
+        """Test the gain does not clip a loud peak."""
+        with TemporaryDirectory() as directory:
+            levels = ClipLevels(join(directory, 'levels.json'), 0.0, 12.0, -50.0, 0)
+            levels.analyze('clip', (1, 10), _pcm([100, 16000, 100]))
+            gain, _, _ = levels.get('clip', (1, 10))
+            self.assertAlmostEqual(32767 / 16000, gain)
@@ -0,0 +1,217 @@
+"""Test the Chumbot clip library with Unittest."""
+import asyncio
+from os.path import basename, join
+import subprocess as sp
+from tempfile import TemporaryDirectory
+from threading import enumerate as enumerate_threads
+import unittest
+from unittest.mock import patch
+
+from chumbot.backend.clip_watcher import ClipWatcher
+from chumbot.backend.library import ClipLibrary
+
+_ENCODING = (40000, 0.02, 'audio')
+
+
+def _encode(pcm, encoding):
+    """Return fake Opus packets of PCM audio, one per 20 ms frame."""
+    return [b'packet'] * -(-len(pcm) // 1920)
+
+
+class _FakeDecoder:
+    """A decoder returning a clip file's contents as its PCM, counting each decode.
+
+    Clips in failing are read as if ffmpeg decoded them and then exited with an error.
+    """
+
+    def __init__(self):
+        self.decoded = []
+        self.failing = set()
+        self.closed = False
+
+    def decode(self, path):
+        pcm = self._read(path)
+        self._check_exit(path)
+        return pcm
+
+    async def decode_async(self, path):
+        return self.decode(path)
+
+    def close(self):
+        self.closed = True
+
+    async def stream_async(self, path, frame_size):
+        pcm = self._read(path)
+        for i in range(0, len(pcm), frame_size):
+            yield pcm[i:i + frame_size]
+        self._check_exit(path)
+
+    def _read(self, path):
+        self.decoded.append(basename(path))
+        with open(path, 'rb') as clip_file:
+            return clip_file.read()
+
+    def _check_exit(self, path):
+        if basename(path) in self.failing:
+            raise sp.CalledProcessError(1, 'ffmpeg')
+
+
+async def _stream(library, sound_clip, frames=None):
+    """Return the first frames of a clip streamed from a library, or all of them."""
+    streamed = []
+    stream = library.stream_async(sound_clip)
+    async for frame in stream:
+        streamed.append(frame)
+        if len(streamed) == frames:
+            break
+    await stream.aclose()
+    return streamed
+
+
+class TestClipLibrary(unittest.TestCase):
+    """Test the ClipLibrary class."""
+
+    def setUp(self):
+        """Create a clip directory with a few clips and a library on it."""
+        self._directory = TemporaryDirectory()
+        self._write('horn.mp3', b'\x01\x00' * 4)
+        self._write('bell.mp3', b'\x02\x00' * 96000)
+        self._decoder = _FakeDecoder()
+        self._library = ClipLibrary(self._directory.name, self._decoder, 1 << 20)
+
+    def tearDown(self):
+        """Remove the clip directory."""
+        self._directory.cleanup()
+
+    def _write(self, filename, contents):
+        """Write a file in the clip directory."""
+        with open(join(self._directory.name, filename), 'wb') as clip_file:
+            clip_file.write(contents)
+
+    def test_get_pcm(self):
+        """Test a clip is decoded once and then served from memory and disk."""
+        self.assertEqual(b'\x01\x00' * 4, self._library.get_pcm('horn'))
+        self.assertEqual(b'\x01\x00' * 4, self._library.get_pcm('horn'))
+        self.assertEqual(['horn.mp3'], self._decoder.decoded)
+
+        # The library is saved at shutdown, before it is loaded again
+        self._library.save()
+        library = ClipLibrary(self._directory.name, self._decoder, 1 << 20)
+        self.assertEqual(b'\x01\x00' * 4, library.get_pcm('horn'))
+        self.assertEqual(['horn.mp3'], self._decoder.decoded)
+
+    def test_close(self):
+        """Test closing the library stops the clip watcher, closes the decoder and saves the clip store."""
+        library = ClipLibrary(self._directory.name, self._decoder, 1 << 20, watch=True)
+        library.get_pcm('horn')
+        library.close()
+        self.assertFalse([thread for thread in enumerate_threads() if isinstance(thread, ClipWatcher)])
+        self.assertTrue(self._decoder.closed)
+        self.assertIn('horn', ClipLibrary(self._directory.name, self._decoder, 1 << 20).pcm_store)
+
+    def test_background_scan(self):
+        """Test clips scanned in the background are available once the scan finishes, and a missing directory."""
+        library = ClipLibrary(self._directory.name, self._decoder, 1 << 20, background_scan=True)
+        library.wait_for_scan()
+        self.assertEqual(['bell', 'horn'], sorted(library.clips))
+        self.assertEqual(1, library.metrics.histograms()['clip_scan'].count)
+
+        library = ClipLibrary(join(self._directory.name, 'missing'), self._decoder, 1 << 20, background_scan=True)
+        library.wait_for_scan()
+        self.assertEqual({}, dict(library.clips))
+
+    def test_catalog_durations(self):
+        """Test clip durations are saved in the catalog and known before the clips are decoded again."""
+        self._library.get_pcm('bell')
+        self._library.save()
+
+        decoder = _FakeDecoder()
+        library = ClipLibrary(self._directory.name, decoder, 1 << 20)
+        self.assertEqual(2.0, library.clips.duration('bell'))
+        self.assertEqual(2.0, library.duration('bell'))
+        self.assertIsNone(library.clips.duration('horn'))
+        self.assertEqual(2.0, library.estimated_duration('horn', 10.0))
+
+    def test_estimated_duration(self):
+        """Test clips never decoded count as long as the longest clip decoded, or as the unknown duration."""
+        self.assertEqual(10.0, self._library.estimated_duration('bell', 10.0))
+        self._library.get_pcm('horn')
+        self.assertAlmostEqual(8 / 96000, self._library.estimated_duration('horn', 10.0))
+        self.assertAlmostEqual(8 / 96000, self._library.estimated_duration('bell', 10.0))
+        self._library.get_pcm('bell')
+        self.assertEqual(2.0, self._library.estimated_duration('bell', 10.0))
+        self.assertEqual(0.0, self._library.duration('missing'))
+
+    def test_metrics(self):
+        """Test decodes are timed and the cache hit ratio is reported."""
+        self._library.get_pcm('horn')
+        self._library.get_pcm('horn')
+        self.assertEqual(1, self._library.metrics.histograms()['decode'].count)
+        gauges = {name: value for name, _, value in self._library.metrics.gauges()}
+        self.assertEqual(0.5, gauges['cache_hit_ratio'])
+
+    def test_get_packets(self):
+        """Test a clip is encoded once and its packets are then served from memory and disk."""
+        with patch('chumbot.backend.library.opus.encode', side_effect=_encode) as encode:
+            pcm, packets = asyncio.run(self._library.get_packets_async('bell', _ENCODING))
+            self.assertEqual(b'\x02\x00' * 96000, pcm)
+            self.assertEqual([b'packet'] * 100, packets)
+            asyncio.run(self._library.get_packets_async('bell', _ENCODING))
+            self.assertEqual(1, encode.call_count)
+
+            self._library.save()
+            library = ClipLibrary(self._directory.name, self._decoder, 1 << 20)
+            self.assertEqual(packets, asyncio.run(library.get_packets_async('bell', _ENCODING))[1])
+            self.assertEqual(1, encode.call_count)
+
+            asyncio.run(library.get_packets_async('bell', (24000, 0.02, 'audio')))
+            self.assertEqual(2, encode.call_count)
+
+    def test_stream(self):
+        """Test a streamed clip is stored only once it has been streamed in full."""
+        asyncio.run(_stream(self._library, 'bell', 1))
+        self.assertEqual(0.0, self._library.duration('bell'))
+
+        self.assertEqual(b'\x02\x00' * 96000, b''.join(asyncio.run(_stream(self._library, 'bell'))))
+        self.assertEqual(2.0, self._library.duration('bell'))
+        self.assertEqual([b'\x02\x00' * 96000], asyncio.run(_stream(self._library, 'bell')))
+        self.assertEqual(b'\x02\x00' * 96000, asyncio.run(self._library.get_pcm_async('bell')))
+
+    def test_decode_failure(self):
+        """Test clips that fail to decode or have no audio are skipped, and not cached, stored or given a duration."""
+        self._decoder.failing.add('bell.mp3')
+        self._write('empty.mp3', b'')
+        self._library.clips.update_file('empty.mp3')
+        self.assertIsNone(self._library.get_pcm('bell'))
+        self.assertIsNone(asyncio.run(self._library.get_pcm_async('empty')))
+        self.assertEqual((None, None), asyncio.run(self._library.get_packets_async('bell', _ENCODING)))
+        self.assertEqual(b'\x02\x00' * 96000, b''.join(asyncio.run(_stream(self._library, 'bell'))))
+        self.assertEqual([], asyncio.run(_stream(self._library, 'empty')))
+
+        self._library.pin(['horn, bell'])
+        self.assertEqual(b'\x01\x00' * 4, self._library.pinned('horn, bell'))
+        self.assertEqual(0, self._library.warm())
+        for sound_clip in ('bell', 'empty'):
+            self.assertNotIn(sound_clip, self._library.pcm_store)
+            self.assertIsNone(self._library.clips.duration(sound_clip))
+        self.assertEqual(8, self._library.metrics.counters()['decode_failures'])
+
+    def test_pin(self):
+        """Test pinned clips are decoded once and decoded again when their files change."""
+        self._library.pin(['horn, bell', 'missing'])
+        self._library.pin(['horn, bell'])
+        self.assertEqual(b'\x01\x00' * 4 + b'\x02\x00' * 96000, self._library.pinned('horn, bell'))
+        self.assertEqual(b'', self._library.pinned('missing'))
+        self.assertIsNone(self._library.pinned('horn'))
+
+        self._write('horn.mp3', b'\x03\x00')
+        self._library.clips.update_file('horn.mp3')
+        self.assertEqual(b'\x03\x00' + b'\x02\x00' * 96000, self._library.pinned('horn, bell'))
+
+    def test_pin_overwritten(self):
+        """Test a pinned clip overwritten in place is decoded again when the clips are reloaded."""
+        self._library.pin(['horn'])
+        self._write('horn.mp3', b'\x03\x00' * 2)
+        self._library.clips.reload()
+        self.assertEqual(b'\x03\x00' * 2, self._library.pinned('horn'))
+        self.assertEqual(b'\x03\x00' * 2, self._library.get_pcm('horn'))
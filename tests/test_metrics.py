@@ -0,0 +1,110 @@
+"""Test the Chumbot metrics with Unittest."""
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from chumbot.backend import metrics
+from chumbot.backend.metrics import Histogram, Metrics
+
+
+class TestHistogram(unittest.TestCase):
+    """Test the Histogram class."""
+
+    def test_percentile(self):
+        """Test percentiles are estimated by the bound of the bucket holding them."""
+        histogram = Histogram((0.01, 0.1, 1.0))
+        for value in [0.005] * 90 + [0.05] * 9 + [3.0]:
+            histogram.observe(value)
+        self.assertEqual(100, histogram.count)
+        self.assertEqual([90, 9, 0, 1], histogram.counts)
+        self.assertEqual(0.01, histogram.percentile(0.5))
+        self.assertEqual(0.1, histogram.percentile(0.99))
+        self.assertEqual(3.0, histogram.percentile(1.0))
+
+    def test_empty(self):
+        """Test an empty histogram reports zero percentiles."""
+        self.assertEqual(0.0, Histogram((0.01, 0.1)).percentile(0.99))
+
+
+class TestMetrics(unittest.TestCase):
+    """Test the Metrics class."""
+
+    def test_counters(self):
+        """Test counters are incremented."""
+        stats = Metrics()
+        stats.increment('messages')
+        stats.increment('messages', 2)
+        self.assertEqual({'messages': 3}, stats.counters())
+
+    @patch('chumbot.backend.metrics.monotonic')
+    def test_time(self, monotonic):
+        """Test timing a block records its duration."""
+        monotonic.side_effect = [10.0, 10.25]
+        stats = Metrics((0.1, 1.0))
+        with stats.time('decode'):
+            pass
+        histogram = stats.histograms()['decode']
+        self.assertEqual(1, histogram.count)
+        self.assertEqual(0.25, histogram.total)
+        self.assertEqual([0, 1, 0], histogram.counts)
+
+    def test_gauges(self):
+        """Test gauges are read when reported, filtered by instance and removed by instance."""
+        depth = [0]
+        stats = Metrics()
+        stats.add_gauge('cache_hits', lambda: 4)
+        stats.add_gauge('queue_depth', lambda: depth[0], 'first')
+        stats.add_gauge('queue_depth', lambda: 7, 'second')
+        depth[0] = 2
+        self.assertEqual([('cache_hits', None, 4), ('queue_depth', 'first', 2), ('queue_depth', 'second', 7)],
+                         stats.gauges())
+        self.assertEqual([('cache_hits', None, 4), ('queue_depth', 'first', 2)], stats.gauges('first'))
+        stats.remove_gauges('first')
+        self.assertEqual([('cache_hits', None, 4), ('queue_depth', 'second', 7)], stats.gauges())
+
+    def test_summary(self):
+        """Test the summary has a line for each histogram, counter and gauge."""
+        stats = Metrics((0.1, 1.0))
+        stats.observe('enqueue', 0.05)
+        stats.increment('messages')
+        stats.add_gauge('cache_hit_ratio', lambda: 0.5)
+        stats.add_gauge('queue_depth', lambda: 1, 'first')
+        self.assertEqual(['enqueue: 1 in 0.050s, p50 0.050s, p99 0.050s, max 0.050s',
+                          'messages: 1',
+                          'cache_hit_ratio: 0.500',
+                          'queue_depth[first]: 1'], stats.summary())
+        self.assertEqual('queue_depth: 1', stats.summary('first')[-1])
+
+    def test_render(self):
+        """Test the metrics are rendered in the Prometheus text format."""
+        stats = Metrics((0.1, 1.0))
+        stats.observe('decode', 0.5)
+        stats.increment('messages')
+        stats.add_gauge('queue_depth', lambda: 3, 'first')
+        lines = stats.render().splitlines()
+        self.assertIn('chumbot_messages_total 1', lines)
+        self.assertIn('chumbot_decode_seconds_bucket{le="0.1"} 0', lines)
+        self.assertIn('chumbot_decode_seconds_bucket{le="1.0"} 1', lines)
+        self.assertIn('chumbot_decode_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn('chumbot_decode_seconds_count 1', lines)
+        self.assertIn('chumbot_queue_depth{instance="first"} 3.0', lines)
+
+    def test_serve(self):
+        """Test the metrics are served over HTTP."""
+        stats = Metrics()
+        stats.increment('messages')
+
+        async def scrape():
+            server = await metrics.serve(stats, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response
+
+        response = asyncio.run(scrape())
+        self.assertTrue(response.startswith(b'HTTP/1.0 200 OK\r\n'))
+        self.assertIn(b'chumbot_messages_total 1\n', response)
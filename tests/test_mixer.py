@@ -0,0 +1,154 @@
+"""Test the Chumbot real-time mixer with Unittest."""
+from array import array
+from threading import Lock
+from time import sleep
+import unittest
+
+from chumbot.backend import pcm as pcm_ops
+from chumbot.backend.mixer import Mixer, NORMAL, PRIORITY, Voice
+
+# An encoding with frames of 2 samples
+_ENCODING = (40000, 2 / 48000, 'audio')
+
+
+def _pcm(samples):
+    """Return PCM audio of a list of samples."""
+    return array('h', samples).tobytes()
+
+
+class _FakeSoundOutput:
+    """A sound output recording the frames added to it and playing them instantly."""
+
+    def __init__(self):
+        self.frames = []
+        self._lock = Lock()
+
+    def add_sound(self, pcm):
+        with self._lock:
+            self.frames.append(pcm)
+
+    def get_buffer_size(self):
+        return 0.0
+
+
+class _FakePacketOutput(_FakeSoundOutput):
+    """A sound output that also records the Opus packets added to it."""
+
+    def add_packet(self, pcm, packet, encoding):
+        with self._lock:
+            self.frames.append(packet)
+
+
+class TestMixer(unittest.TestCase):
+    """Test the Voice and Mixer classes and the mix PCM operation."""
+
+    def test_mix(self):
+        """Test summing frames, saturating overflowing samples."""
+        self.assertEqual(_pcm([3, -32768, 32767]),
+                         pcm_ops.mix([_pcm([1, -20000, 20000]), _pcm([2, -20000, 20000])]))
+
+    def test_voice_read(self):
+        """Test reading frames across fed chunks, padded with silence."""
+        voice = Voice(1, NORMAL, 'clip')
+        voice.feed(_pcm([1, 2, 3]))
+        voice.feed(_pcm([4]))
+        self.assertEqual(_pcm([1, 2]), voice.read_frame(4)[0])
+        self.assertEqual(_pcm([3, 4, 0]), voice.read_frame(6)[0])
+        self.assertFalse(voice.done)
+        voice.finish()
+        self.assertTrue(voice.done)
+
+    def test_voice_read_frame(self):
+        """Test frames keep their packets only while they are read whole and aligned."""
+        voice = Voice(1, NORMAL, 'clip')
+        voice.feed(_pcm([1, 2, 3, 4, 5]), [b'a', b'b', b'c'], _ENCODING)
+        self.assertEqual((_pcm([1, 2]), b'a', _ENCODING), voice.read_frame(4))
+        self.assertEqual((_pcm([3]), None, None), voice.read_frame(2))
+        self.assertEqual((_pcm([4, 5]), None, None), voice.read_frame(4))
+
+        voice.feed(_pcm([1, 2, 3, 4]), [b'a', b'b'], _ENCODING)
+        self.assertEqual((_pcm([1, 2, 3]), None, None), voice.read_frame(6))
+
+    def test_voice_cancel(self):
+        """Test a cancelled voice drops its audio."""
+        voice = Voice(1, NORMAL, 'clip')
+        voice.feed(bytes(96000))
+        voice.cancel()
+        self.assertTrue(voice.done)
+        self.assertEqual(0, voice.buffered)
+
+    def test_lanes(self):
+        """Test a priority voice mixes over a normal voice, and normal voices take turns."""
+        output = _FakeSoundOutput()
+        mixer = Mixer(4, 0.01, {PRIORITY: 4, NORMAL: 1})
+        first = mixer.play(_pcm([1, 1, 1, 1]), NORMAL, 'first')
+        second = mixer.play(_pcm([2, 2]), NORMAL, 'second')
+        mixer.play(_pcm([10, 10]), PRIORITY, 'event')
+        self.assertEqual(3, len(mixer.voices()))
+
+        mixer.set_output(output)
+        mixer.start()
+        while not second.done:
+            sleep(0.01)
+        mixer.set_output(None)
+
+        self.assertTrue(first.done)
+        self.assertEqual(_pcm([11, 11, 1, 1, 2, 2]), b''.join(output.frames))
+
+    def test_packets(self):
+        """Test a voice playing alone sends its packets, and mixed voices are sent as PCM."""
+        output = _FakePacketOutput()
+        mixer = Mixer(4, 0.01, {PRIORITY: 4, NORMAL: 1})
+        normal = mixer.play(_pcm([1, 1, 1, 1]), NORMAL, 'clip', [b'a', b'b'], _ENCODING)
+        mixer.play(_pcm([10, 10]), PRIORITY, 'event', [b'c'], _ENCODING)
+
+        mixer.set_output(output)
+        mixer.start()
+        while not normal.done:
+            sleep(0.01)
+        mixer.set_output(None)
+
+        self.assertEqual([_pcm([11, 11]), b'b'], output.frames)
+
+    def test_cancel(self):
+        """Test cancelling a voice by its ID."""
+        mixer = Mixer(4, 0.01, {PRIORITY: 4, NORMAL: 1})
+        voice = mixer.add_voice(NORMAL, 'clip')
+        self.assertFalse(mixer.cancel(voice.voice_id + 1))
+        self.assertTrue(mixer.cancel(voice.voice_id))
+        self.assertEqual([], mixer.voices())
+
+
+    def test_voice_done_callback(self):
+        """Test done callbacks are called once when a voice finishes playing, or at once if it is done."""
+        voice = Voice(1, NORMAL, 'clip')
+        calls = []
+        voice.add_done_callback(lambda: calls.append('first'))
+        voice.add_done_callback(calls.append)
+        voice.remove_done_callback(calls.append)
+        voice.feed(_pcm([1, 2]))
+        voice.finish()
+        self.assertEqual([], calls)
+        voice.read_frame(4)
+        self.assertEqual(['first'], calls)
+        voice.read_frame(4)
+        voice.add_done_callback(lambda: calls.append('second'))
+        self.assertEqual(['first', 'second'], calls)
+
+    def test_unstarted_voice(self):
+        """Test a voice is not mixed until its first audio is fed to it, and feeding it wakes the mixer."""
+        output = _FakeSoundOutput()
+        mixer = Mixer(4, 0.01, {PRIORITY: 4, NORMAL: 1})
+        voice = mixer.add_voice(NORMAL, 'clip')
+        mixer.set_output(output)
+        mixer.start()
+        sleep(0.05)
+        self.assertEqual([], output.frames)
+        self.assertTrue(voice.active)
+
+        voice.feed(_pcm([1, 2]))
+        voice.finish()
+        while not voice.done:
+            sleep(0.01)
+        mixer.set_output(None)
+        self.assertEqual([_pcm([1, 2])], output.frames)
@@ -0,0 +1,42 @@
+"""Test the Chumbot Opus packet encoding with Unittest."""
+import unittest
+
+from chumbot.backend import opus
+
+_ENCODING = (40000, 0.02, 'audio')
+
+try:
+    import opuslib  # pylint: disable=unused-import
+except Exception:  # pylint: disable=broad-except
+    # opuslib raises a generic exception when libopus is missing
+    opuslib = None
+
+
+class TestOpus(unittest.TestCase):
+    """Test the opus module's functions."""
+
+    def test_frame_size(self):
+        """Test the PCM size of each packet's frame."""
+        self.assertEqual(1920, opus.frame_size(_ENCODING))
+        self.assertEqual(960, opus.frame_size((40000, 0.01, 'audio')))
+
+    def test_pad(self):
+        """Test PCM is padded with silence to a whole number of frames."""
+        self.assertEqual(b'\x01' * 1000 + bytes(920), opus.pad(b'\x01' * 1000, _ENCODING))
+        self.assertEqual(b'\x01' * 3840, opus.pad(b'\x01' * 3840, _ENCODING))
+        self.assertEqual(b'', opus.pad(b'', _ENCODING))
+
+    def test_pack(self):
+        """Test packets are joined and split again unchanged."""
+        packets = [b'\x01\x02', b'', b'\xff' * 300]
+        self.assertEqual(packets, opus.unpack(opus.pack(packets)))
+        self.assertEqual([], opus.unpack(opus.pack([])))
+
+    def test_store_name(self):
+        """Test each encoding's packets are stored in their own directory."""
+        self.assertEqual('opus-40000-20-audio', opus.store_name(_ENCODING))
+
+    @unittest.skipIf(opuslib is None, 'libopus is not installed')
+    def test_encode(self):
+        """Test PCM is encoded to a packet per frame, padding the last frame."""
+        self.assertEqual(3, len(opus.encode(bytes(1920 * 2 + 2), _ENCODING)))
@@ -0,0 +1,49 @@
+"""Test the Chumbot PCM cache with Unittest."""
+import unittest
+
+from chumbot.backend.pcm_cache import PCMCache
+
+
+class TestPCMCache(unittest.TestCase):
+    """Test the PCMCache class."""
+
+    def test_hit_and_miss(self):
+        """Test cache hits and misses are counted."""
+        cache = PCMCache(1024)
+        self.assertIsNone(cache.get('clip', (1, 4)))
+        cache.put('clip', (1, 4), b'\x00' * 4)
+        self.assertEqual(b'\x00' * 4, cache.get('clip', (1, 4)))
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_stale_stamp(self):
+        """Test PCM decoded from an older clip file is not returned."""
+        cache = PCMCache(1024)
+        cache.put('clip', (1, 4), b'\x00' * 4)
+        self.assertIsNone(cache.get('clip', (2, 4)))
+
+    def test_lru_eviction(self):
+        """Test the least recently used clips are evicted to stay within budget."""
+        cache = PCMCache(8)
+        cache.put('a', (1, 1), b'\x00' * 4)
+        cache.put('b', (1, 1), b'\x00' * 4)
+        cache.get('a', (1, 1))
+        cache.put('c', (1, 1), b'\x00' * 4)
+        self.assertIsNotNone(cache.get('a', (1, 1)))
+        self.assertIsNone(cache.get('b', (1, 1)))
+        self.assertEqual(8, cache.size)
+
+    def test_oversized(self):
+        """Test PCM larger than the whole budget is not cached."""
+        cache = PCMCache(2)
+        cache.put('clip', (1, 4), b'\x00' * 4)
+        self.assertEqual(0, len(cache))
+
+    def test_invalidate(self):
+        """Test invalidating clips drops their PCM."""
+        cache = PCMCache(1024)
+        cache.put('a', (1, 1), b'\x00' * 4)
+        cache.put('b', (1, 1), b'\x00' * 4)
+        cache.invalidate(['a'])
+        self.assertIsNone(cache.get('a', (1, 1)))
+        self.assertEqual(4, cache.size)
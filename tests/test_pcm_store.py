@@ -0,0 +1,87 @@
+"""Test the Chumbot PCM store with Unittest."""
+import json
+from os import listdir, utime
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from time import sleep
+import unittest
+from unittest.mock import patch
+
+from chumbot.backend.pcm_store import PCMStore, _hash_file
+
+
+class TestPCMStore(unittest.TestCase):
+    """Test the PCMStore class."""
+
+    def setUp(self):
+        """Create a clip file and an empty store."""
+        self._directory = TemporaryDirectory()
+        self._clip_path = join(self._directory.name, 'clip.mp3')
+        with open(self._clip_path, 'wb') as clip_file:
+            clip_file.write(b'mp3 data')
+        self._store_directory = join(self._directory.name, '.chumbot-cache')
+
+    def tearDown(self):
+        """Remove the clip file and store."""
+        self._directory.cleanup()
+
+    def test_persisted(self):
+        """Test stored PCM is served by a new store on the same directory once the store is saved."""
+        store = PCMStore(self._store_directory)
+        store.put('clip', self._clip_path, (1, 8), b'\x01\x02')
+        store.save()
+        self.assertEqual(b'\x01\x02', PCMStore(self._store_directory).get('clip', self._clip_path, (1, 8)))
+
+    def test_save_delay(self):
+        """Test the manifest is written once after a batch of puts, without saving the store."""
+        store = PCMStore(self._store_directory, save_delay=0.05)
+        with patch('chumbot.backend.pcm_store.json.dumps', wraps=json.dumps) as dumps:
+            for name in ('clip', 'other', 'third'):
+                store.put(name, self._clip_path, (1, 8), b'\x01\x02')
+            sleep(0.2)
+        self.assertEqual(1, dumps.call_count)
+        self.assertIn('third', PCMStore(self._store_directory))
+
+    def test_hash_reused(self):
+        """Test the clip file is not hashed again when a clip is stored again with the same stamp."""
+        store = PCMStore(self._store_directory)
+        with patch('chumbot.backend.pcm_store._hash_file', wraps=_hash_file) as hash_file:
+            store.put('clip', self._clip_path, (1, 8), b'\x01\x02')
+            store.put('clip', self._clip_path, (1, 8), b'\x01\x02')
+            store.put('clip', self._clip_path, (2, 8), b'\x01\x02')
+        self.assertEqual(2, hash_file.call_count)
+
+    def test_concurrent_puts(self):
+        """Test concurrent puts of one clip each write a whole file, leaving no temporary files."""
+        store = PCMStore(self._store_directory)
+        pcms = [bytes([i]) * 100000 for i in range(8)]
+        threads = [Thread(target=store.put, args=('clip', self._clip_path, (1, 8), pcm)) for pcm in pcms]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn(store.get('clip', self._clip_path, (1, 8)), pcms)
+        self.assertEqual(['clip.pcm'], listdir(self._store_directory))
+
+    def test_touched(self):
+        """Test stored PCM survives a new modification time when the contents are unchanged."""
+        store = PCMStore(self._store_directory)
+        store.put('clip', self._clip_path, (1, 8), b'\x01\x02')
+        utime(self._clip_path)
+        self.assertEqual(b'\x01\x02', store.get('clip', self._clip_path, (2, 8)))
+
+    def test_changed(self):
+        """Test stored PCM is not served once the clip file changes."""
+        store = PCMStore(self._store_directory)
+        store.put('clip', self._clip_path, (1, 8), b'\x01\x02')
+        with open(self._clip_path, 'wb') as clip_file:
+            clip_file.write(b'new data')
+        self.assertIsNone(store.get('clip', self._clip_path, (2, 8)))
+
+    def test_prune(self):
+        """Test pruning removes clips that no longer exist."""
+        store = PCMStore(self._store_directory)
+        store.put('clip', self._clip_path, (1, 8), b'\x01\x02')
+        store.prune(set())
+        self.assertNotIn('clip', store)
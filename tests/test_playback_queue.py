@@ -0,0 +1,71 @@
+"""Test the Chumbot playback queue with Unittest."""
+import asyncio
+import unittest
+
+from chumbot.backend.playback_queue import PlaybackQueue
+
+
+async def _wait_for(condition):
+    """Wait until a condition is true."""
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+class TestPlaybackQueue(unittest.TestCase):
+    """Test the PlaybackQueue class."""
+
+    def test_order(self):
+        """Test requests are played in the order they were queued."""
+        played = []
+
+        async def play(request):
+            played.append(request.clips)
+
+        async def run_queue():
+            queue = PlaybackQueue(play, 1, 10, 60.0)
+            queue.enqueue(1, ['a', 'b'], 0.0)
+            queue.enqueue(2, ['c'], 0.0)
+            queue.start()
+            await _wait_for(lambda: queue.played == 2)
+            await queue.stop()
+
+        asyncio.run(run_queue())
+        self.assertEqual([['a', 'b'], ['c']], played)
+
+    def test_limits(self):
+        """Test requests exceeding the queued clip or duration limit are dropped."""
+        queue = PlaybackQueue(None, 1, 3, 10.0)
+        self.assertIsNotNone(queue.enqueue(1, ['a', 'b'], 4.0))
+        self.assertFalse(queue.admits(2, 0.0))
+        self.assertTrue(queue.admits(1, 6.0))
+        self.assertIsNone(queue.enqueue(1, ['c', 'd'], 0.0))
+        self.assertIsNone(queue.enqueue(2, ['e'], 7.0))
+        self.assertIsNotNone(queue.enqueue(2, ['f'], 6.0))
+        self.assertEqual(3, queue.depth)
+        self.assertEqual(2, queue.dropped)
+
+    def test_skip_and_clear(self):
+        """Test skipping the playing request and discarding queued requests."""
+        started = []
+
+        async def play(request):
+            started.append(request)
+            await _wait_for(lambda: request.cancelled)
+
+        async def run_queue():
+            queue = PlaybackQueue(play, 1, 10, 60.0)
+            queue.start()
+            first = queue.enqueue(1, ['a'], 0.0)
+            await asyncio.wait_for(_wait_for(lambda: started), 1)
+            second = queue.enqueue(1, ['b'], 0.0)
+            queued = queue.enqueue(1, ['c'], 0.0)
+
+            self.assertEqual(1, queue.skip())
+            self.assertTrue(first.cancelled)
+            await asyncio.wait_for(_wait_for(lambda: second in started), 1)
+            self.assertEqual(2, queue.clear())
+            self.assertTrue(queued.cancelled)
+            self.assertEqual(0, queue.depth)
+            await queue.stop()
+
+        asyncio.run(run_queue())
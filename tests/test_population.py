@@ -0,0 +1,46 @@
+"""Test the Chumbot channel population index with Unittest."""
+import unittest
+
+from chumbot.backend.population import ChannelPopulation
+
+
+class TestChannelPopulation(unittest.TestCase):
+    """Test the ChannelPopulation class."""
+
+    def setUp(self):
+        """Create an index of three users in two channels."""
+        self._population = ChannelPopulation()
+        self._population.rebuild([{'session': 1, 'channel_id': 0},
+                                  {'session': 2, 'channel_id': 5},
+                                  {'session': 3, 'channel_id': 5}])
+
+    def test_count(self):
+        """Test counting the users in a channel."""
+        self.assertEqual(1, self._population.count(0))
+        self.assertEqual(2, self._population.count(5))
+        self.assertEqual(0, self._population.count(7))
+
+    def test_move(self):
+        """Test moving users between channels."""
+        self.assertEqual(5, self._population.move(2, 0))
+        self.assertIsNone(self._population.move(4, 0))
+        self.assertEqual(3, self._population.count(0))
+        self.assertEqual(0, self._population.most_populous())
+
+    def test_remove(self):
+        """Test removing users from the server."""
+        self.assertEqual(5, self._population.remove(3))
+        self.assertIsNone(self._population.remove(3))
+        self.assertEqual(1, self._population.count(5))
+
+    def test_most_populous(self):
+        """Test the most populous channel follows users as they move and leave."""
+        self.assertEqual(5, self._population.most_populous())
+        self.assertEqual(2, self._population.max_count)
+        self._population.remove(2)
+        self._population.remove(3)
+        self.assertEqual(0, self._population.most_populous())
+        self.assertEqual(1, self._population.max_count)
+        self._population.remove(1)
+        self.assertIsNone(self._population.most_populous())
+        self.assertEqual(0, self._population.max_count)
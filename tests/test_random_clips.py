@@ -0,0 +1,80 @@
+"""Test the Chumbot random clip picker with Unittest."""
+from collections import Counter
+import random
+import unittest
+
+from chumbot.backend.random_clips import ClipPicker, SHUFFLE, UNIFORM, WEIGHTED
+
+_NAMES = ['airhorn', 'bruh', 'horn', 'sad_horn', 'wow']
+
+
+class TestClipPicker(unittest.TestCase):
+    """Test the ClipPicker class."""
+
+    def setUp(self):
+        """Seed the random number generator."""
+        random.seed(0)
+
+    def test_empty(self):
+        """Test an empty picker picks nothing."""
+        for mode in (UNIFORM, SHUFFLE, WEIGHTED):
+            picker = ClipPicker(mode)
+            self.assertIsNone(picker.pick())
+            picker.reset(['bruh'])
+            picker.remove('bruh')
+            self.assertIsNone(picker.pick())
+
+    def test_uniform(self):
+        """Test uniform picks come from the clips."""
+        picker = ClipPicker()
+        picker.reset(_NAMES)
+        self.assertEqual(set(_NAMES), {picker.pick() for _ in range(200)})
+
+    def test_shuffle(self):
+        """Test every clip is picked once before any clip repeats."""
+        picker = ClipPicker(SHUFFLE)
+        picker.reset(_NAMES)
+        for _ in range(3):
+            self.assertEqual(sorted(_NAMES), sorted(picker.pick() for _ in _NAMES))
+
+    def test_shuffle_add_remove(self):
+        """Test clips added or removed during a round of the shuffle join or leave the round."""
+        picker = ClipPicker(SHUFFLE)
+        picker.reset(_NAMES)
+        picked = [picker.pick(), picker.pick()]
+        unplayed = [name for name in _NAMES if name not in picked]
+        picker.remove(unplayed.pop())
+        picker.remove(picked[0])
+        picker.add('ahh')
+        picker.add(picked[1])
+        self.assertEqual(sorted(unplayed + ['ahh']), sorted(picker.pick() for _ in range(len(unplayed) + 1)))
+        self.assertEqual(len(_NAMES) - 1, len(picker))
+
+    def test_weighted(self):
+        """Test clips are picked in proportion to their weights."""
+        picker = ClipPicker(WEIGHTED, {'airhorn': 3, 'wow': 0})
+        picker.reset(['airhorn', 'bruh', 'wow'])
+        counts = Counter(picker.pick() for _ in range(4000))
+        self.assertNotIn('wow', counts)
+        self.assertAlmostEqual(3, counts['airhorn'] / counts['bruh'], delta=0.4)
+
+    def test_weighted_remove(self):
+        """Test removing clips keeps the remaining weights."""
+        picker = ClipPicker(WEIGHTED, {'wow': 0})
+        picker.reset(_NAMES)
+        for name in ('airhorn', 'bruh', 'horn'):
+            picker.remove(name)
+        self.assertEqual({'sad_horn'}, {picker.pick() for _ in range(50)})
+        picker.remove('sad_horn')
+        self.assertEqual('wow', picker.pick())
+
+    def test_played(self):
+        """Test requested clips gain weight."""
+        picker = ClipPicker(WEIGHTED, {'bruh': 0, 'wow': 0}, play_weight=1)
+        picker.reset(['bruh', 'wow'])
+        picker.played('wow')
+        self.assertEqual({'wow'}, {picker.pick() for _ in range(50)})
+
+
+if __name__ == '__main__':
+    unittest.main()
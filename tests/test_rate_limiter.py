@@ -0,0 +1,25 @@
+"""Test the Chumbot rate limiter with Unittest."""
+import unittest
+from unittest.mock import patch
+
+from chumbot.backend.rate_limiter import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test the RateLimiter class."""
+
+    @patch('chumbot.backend.rate_limiter.monotonic')
+    def test_token_bucket(self, monotonic):
+        """Test a user can take a burst of tokens, then tokens at the refill rate."""
+        monotonic.return_value = 100.0
+        limiter = RateLimiter(0.5, 4)
+        self.assertEqual(3, limiter.acquire('a', 3))
+        self.assertEqual(1, limiter.acquire('a', 3))
+        self.assertEqual(0, limiter.acquire('a', 1))
+        self.assertEqual(4, limiter.acquire('b', 4))
+        self.assertEqual(2, limiter.limited)
+
+        monotonic.return_value = 103.0
+        self.assertEqual(1, limiter.acquire('a', 2))
+        monotonic.return_value = 200.0
+        self.assertEqual(4, limiter.acquire('a', 10))
@@ -0,0 +1,72 @@
+"""Test the Chumbot text message sender with Unittest."""
+import asyncio
+import unittest
+
+from chumbot.backend.text_sender import TextSender, pack_lines
+
+
+async def _wait_for(condition):
+    """Wait until a condition is true."""
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+class TestPackLines(unittest.TestCase):
+    """Test the pack_lines function."""
+
+    def test_pack(self):
+        """Test lines are packed into messages within the length limit."""
+        messages = pack_lines(['aaaa', 'bbbb', 'cccc'], 20)
+        self.assertEqual(['<br/>aaaa<br/>bbbb', '<br/>cccc'], messages)
+        self.assertTrue(all(len(message) <= 20 for message in messages))
+
+    def test_bytes(self):
+        """Test the length limit counts UTF-8 bytes rather than characters."""
+        self.assertEqual(['<br/>éé', '<br/>éé'], pack_lines(['éé', 'éé'], 15))
+
+    def test_long_line(self):
+        """Test a line longer than the limit is sent on its own."""
+        self.assertEqual(['<br/>a', '<br/>' + 'b' * 30, '<br/>c'], pack_lines(['a', 'b' * 30, 'c'], 20))
+
+    def test_empty(self):
+        """Test no messages are packed from no lines."""
+        self.assertEqual([], pack_lines([], 20))
+
+
+class TestTextSender(unittest.TestCase):
+    """Test the TextSender class."""
+
+    def test_pacing(self):
+        """Test messages beyond the burst are sent at the send rate."""
+        sent = []
+
+        async def run_sender():
+            sender = TextSender(sent.append, lambda: 5000, 20.0, 2)
+            for message in 'abcd':
+                sender.send(message)
+            await asyncio.sleep(0)
+            burst = list(sent)
+            await asyncio.wait_for(_wait_for(lambda: len(sent) == 4), 1)
+            return burst, sender.sent
+
+        burst, count = asyncio.run(run_sender())
+        self.assertEqual(['a', 'b'], burst)
+        self.assertEqual(['a', 'b', 'c', 'd'], sent)
+        self.assertEqual(4, count)
+
+    def test_coalesce(self):
+        """Test a request is dropped while an earlier request with the same key is being sent."""
+        sent = []
+
+        async def run_sender():
+            sender = TextSender(sent.append, lambda: 12, 20.0, 1)
+            self.assertTrue(sender.send_lines(['aa', 'bb', 'cc'], 'list'))
+            self.assertFalse(sender.send_lines(['aa', 'bb', 'cc'], 'list'))
+            self.assertTrue(sender.send_lines(['dd']))
+            await asyncio.wait_for(_wait_for(lambda: not sender.depth), 1)
+            self.assertTrue(sender.send_lines(['ee'], 'list'))
+            await asyncio.wait_for(_wait_for(lambda: not sender.depth), 1)
+            return sender.coalesced
+
+        self.assertEqual(1, asyncio.run(run_sender()))
+        self.assertEqual(['<br/>aa', '<br/>bb', '<br/>cc', '<br/>dd', '<br/>ee'], sent)